@@ -0,0 +1,82 @@
+"""Ціна антиспаму на одне повідомлення: колишнє ковзне вікно зі списком проти SpamGuard.
+
+Запуск з кореня репозиторію:
+    python -m benchmarks.bench_antispam
+"""
+import random
+import time
+import timeit
+
+from utils.ratelimit import SpamGuard, ALLOW
+
+RATE = 3
+COOLDOWN = 5.0
+
+
+# --- Колишня логіка (без задач-нагадувань, лише перевірка) ---
+class LegacyLimiter:
+    def __init__(self) -> None:
+        self._recent = {}
+        self._cooldown_until = {}
+
+    def hit(self, user_id: int, now: float) -> bool:
+        if now < self._cooldown_until.get(user_id, 0):
+            self._cooldown_until[user_id] = now + COOLDOWN
+            return False
+        buf = self._recent.setdefault(user_id, [])
+        buf = [t for t in buf if now - t <= 1.0]
+        buf.append(now)
+        self._recent[user_id] = buf
+        if len(buf) > RATE:
+            self._cooldown_until[user_id] = now + COOLDOWN
+            return False
+        return True
+
+
+def traffic(users: int, messages: int, seconds: float) -> list:
+    """Рівномірний потік: повідомлення випадкових користувачів протягом `seconds`."""
+    rnd = random.Random(42)
+    step = seconds / messages
+    return [(rnd.randrange(users), i * step) for i in range(messages)]
+
+
+def bench(messages: int = 100_000) -> None:
+    print(f"{'users':>8} {'legacy, ns':>11} {'guard, ns':>10} {'legacy keys':>12} {'guard keys':>11}")
+    for users in (100, 10_000, 100_000):
+        events = traffic(users, messages, seconds=600.0)
+
+        def run_legacy():
+            lim = LegacyLimiter()
+            for uid, now in events:
+                lim.hit(uid, now)
+            return lim
+
+        def run_guard():
+            guard = SpamGuard(RATE, COOLDOWN, idle=60.0)
+            for uid, now in events:
+                guard.hit(uid, now)
+                if uid == 0:
+                    guard.sweep(now)  # прибиральник прокидається рідко
+            guard.sweep(events[-1][1])
+            return guard
+
+        legacy = min(timeit.repeat(run_legacy, number=1, repeat=3)) / messages
+        guard = min(timeit.repeat(run_guard, number=1, repeat=3)) / messages
+        print(f"{users:>8} {legacy * 1e9:>11.0f} {guard * 1e9:>10.0f} "
+              f"{len(run_legacy()._recent):>12} {len(run_guard()):>11}")
+
+
+def check_limits() -> None:
+    guard = SpamGuard(RATE, COOLDOWN, idle=60.0)
+    now = time.monotonic()
+    assert [guard.hit(1, now) == ALLOW for _ in range(RATE + 1)] == [True] * RATE + [False]
+    assert guard.hit(1, now + COOLDOWN - 0.1) != ALLOW  # продовжує кулдаун
+    assert guard.hit(1, now + 2 * COOLDOWN) == ALLOW
+    guard.sweep(now + 2 * COOLDOWN + 61)
+    assert len(guard) == 0
+
+
+if __name__ == "__main__":
+    check_limits()
+    print("OK: limits and eviction behave as expected")
+    bench()
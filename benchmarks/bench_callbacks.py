@@ -0,0 +1,134 @@
+"""Ціна маршрутизації натискання inline-кнопки до хендлера.
+
+Порівнює на типовій суміші кнопок гри:
+  legacy - колишній ланцюжок F.data.startswith(...) фільтрів у порядку
+           реєстрації (як їх перебирає роутер) + розбір через split(":")
+           у самому хендлері, з payload у старому форматі;
+  codec  - utils.callbacks.decode (один split) + пошук хендлера в dict.
+
+Також перевіряє, що всі payload-и вкладаються в 64 байти Telegram.
+
+Запуск з кореня репозиторію:
+    python -m benchmarks.bench_callbacks
+"""
+import os
+import random
+import timeit
+
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK-fake-token")
+os.environ.setdefault("ADMIN_ID", "1")
+
+from config import LOCATIONS
+from utils import callbacks
+from utils.callbacks import decode, encode
+
+try:
+    from magic_filter import F  # те, що реально перевіряв роутер
+except ImportError:
+    F = None
+
+TOKEN = "K3F9QZ"
+VOTER = 5_123_456_789
+TELEGRAM_LIMIT = 64
+
+# Порядок як у handlers/game.py до переходу на кодек
+LEGACY_PREFIXES = ("add_bot_btn:", "start_game:", "early_vote_", "vote:", "guess:")
+
+
+def _legacy_filters():
+    if F is not None:
+        return [(F.data.startswith(p), i) for i, p in enumerate(LEGACY_PREFIXES)]
+    return None
+
+
+def legacy_route(data: str, filters) -> tuple:
+    if filters is not None:
+        event = _Event(data)
+        index = next(i for flt, i in filters if flt.resolve(event))
+    else:
+        index = next(i for i, p in enumerate(LEGACY_PREFIXES) if data.startswith(p))
+    # Розбір, як його робили хендлери
+    token = data.split(":")[1]
+    if index == 2:
+        return token, "yes" in data
+    if index in (3, 4):
+        return token, data.split(":")[2]
+    return token, None
+
+
+class _Event:
+    __slots__ = ("data",)
+
+    def __init__(self, data: str) -> None:
+        self.data = data
+
+
+def _noop(payload):
+    return payload.token
+
+
+HANDLERS = {action: _noop for action in callbacks.ACTION_NAMES}
+
+
+def codec_route(data: str):
+    payload = decode(data)
+    return HANDLERS[payload.action](payload)
+
+
+def workload(n: int = 1000):
+    """Суміш, схожа на реальну гру: голоси і дострокове голосування переважають."""
+    rnd = random.Random(42)
+    legacy, compact = [], []
+    for _ in range(n):
+        kind = rnd.choices(["vote", "early", "guess", "start", "bot"], weights=[50, 30, 10, 7, 3])[0]
+        if kind == "vote":
+            legacy.append(f"vote:{TOKEN}:{VOTER}")
+            compact.append(encode(callbacks.VOTE, TOKEN, VOTER))
+        elif kind == "early":
+            legacy.append(f"early_vote_yes:{TOKEN}")
+            compact.append(encode(callbacks.EARLY_YES, TOKEN))
+        elif kind == "guess":
+            i = rnd.randrange(len(LOCATIONS))
+            legacy.append(f"guess:{TOKEN}:{LOCATIONS[i]}")
+            compact.append(encode(callbacks.GUESS, TOKEN, i))
+        elif kind == "start":
+            legacy.append(f"start_game:{TOKEN}")
+            compact.append(encode(callbacks.START_GAME, TOKEN))
+        else:
+            legacy.append(f"add_bot_btn:{TOKEN}")
+            compact.append(encode(callbacks.ADD_BOT, TOKEN))
+    return legacy, compact
+
+
+def check_payloads() -> None:
+    legacy = [f"guess:{TOKEN}:{loc}" for loc in LOCATIONS] + [f"vote:{TOKEN}:{VOTER}", f"early_vote_yes:{TOKEN}"]
+    compact = [encode(callbacks.GUESS, TOKEN, i) for i in range(len(LOCATIONS))]
+    compact += [encode(callbacks.VOTE, TOKEN, VOTER), encode(callbacks.EARLY_YES, TOKEN)]
+    longest_legacy = max(len(d.encode()) for d in legacy)
+    longest = max(len(d.encode()) for d in compact)
+    assert longest <= TELEGRAM_LIMIT, longest
+    # Старі кнопки в уже надісланих повідомленнях мають і далі працювати
+    for old, new in zip(legacy, compact):
+        assert decode(old) == decode(new), (old, new)
+    assert decode("guess:K3F9QZ:Марс") is None and decode("v:K3F9QZ:x") is None and decode("junk") is None
+    print(f"payload bytes, max: legacy {longest_legacy}, codec {longest} (limit {TELEGRAM_LIMIT})")
+
+
+def bench() -> None:
+    legacy, compact = workload()
+    filters = _legacy_filters()
+    print(f"legacy filters: {'magic_filter' if filters is not None else 'str.startswith (magic_filter not installed)'}")
+    rows = [
+        ("legacy", lambda: [legacy_route(d, filters) for d in legacy]),
+        ("codec", lambda: [codec_route(d) for d in compact]),
+        ("encode", lambda: [encode(callbacks.VOTE, TOKEN, VOTER) for _ in compact]),
+    ]
+    print(f"{'':<8} {'ns/callback':>12}")
+    for name, fn in rows:
+        best = min(timeit.repeat(fn, number=20, repeat=5)) / 20 / len(compact)
+        print(f"{name:<8} {best * 1e9:>12.0f}")
+
+
+if __name__ == "__main__":
+    check_payloads()
+    bench()
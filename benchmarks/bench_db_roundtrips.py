@@ -0,0 +1,104 @@
+"""Скільки запитів до PostgreSQL і часу коштують /start, /stats і /ban.
+
+Порівнює колишні шляхи crud (SELECT -> INSERT ... ON CONFLICT DO NOTHING ->
+SELECT, окремий UPDATE для бану) з поточними (один підготовлений
+INSERT ... ON CONFLICT ... RETURNING). Запити рахуються query-логером asyncpg:
+кожен - окремий обмін з сервером.
+
+Потрібна PostgreSQL, напр.:
+    docker compose up -d db
+    DB_HOST=localhost python -m benchmarks.bench_db_roundtrips
+Гравці створюються з ID від USER_ID_BASE і видаляються після запуску.
+"""
+import asyncio
+import os
+import time
+from collections import Counter
+
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK-fake-token")
+os.environ.setdefault("ADMIN_ID", "1")
+
+from database import crud
+from database.models import Player
+
+USER_ID_BASE = 9_000_000_000
+QUERIES = Counter()
+
+
+def _count_query(record) -> None:
+    QUERIES["total"] += 1
+
+
+# --- Колишні реалізації ---
+async def legacy_get_player(user_id: int):
+    async with crud.pool.acquire() as conn:
+        row = await conn.fetchrow("SELECT * FROM players WHERE user_id = $1", user_id)
+        if row:
+            return Player(
+                user_id=row['user_id'], username=row['username'], total_xp=row['total_xp'], level=row['level'],
+                games_played=row['games_played'], spy_wins=row['spy_wins'],
+                civilian_wins=row['civilian_wins'], banned_until=row['banned_until']
+            )
+        return None
+
+
+async def legacy_get_or_create_player(user_id: int, username: str = ""):
+    player = await legacy_get_player(user_id)
+    if player:
+        return player
+    async with crud.pool.acquire() as conn:
+        await conn.execute(
+            "INSERT INTO players (user_id, username, level) VALUES ($1, $2, 1) ON CONFLICT (user_id) DO NOTHING",
+            user_id, username
+        )
+    return await legacy_get_player(user_id)
+
+
+async def legacy_ban(user_id: int, until: int):
+    await legacy_get_or_create_player(user_id)
+    await crud.update_player(user_id, banned_until=until)
+
+
+# --- Сценарії: (назва, колишній, поточний); кожен отримує свіжий user_id ---
+SCENARIOS = [
+    ("/start, new player", legacy_get_or_create_player, crud.get_or_create_player, False),
+    ("/start, known player", legacy_get_or_create_player, crud.get_or_create_player, True),
+    ("/stats, known player", legacy_get_player, crud.get_player, True),
+    ("/ban, unknown id", lambda uid: legacy_ban(uid, -1), lambda uid: crud.set_banned_until(uid, -1), False),
+]
+
+
+async def measure(fn, ids, known: bool):
+    if known:
+        for uid in ids:
+            await crud.get_or_create_player(uid, "bench")
+    QUERIES.clear()
+    start = time.perf_counter()
+    for uid in ids:
+        await fn(uid)
+    elapsed = time.perf_counter() - start
+    return QUERIES["total"] / len(ids), elapsed / len(ids)
+
+
+async def main(calls: int = 500) -> None:
+    crud._log_query = _count_query  # _init_connection бере логер під час відкриття з'єднання
+    await crud.init_db()
+    next_id = USER_ID_BASE
+    try:
+        print(f"{'scenario':<22} {'legacy q':>9} {'legacy ms':>10} {'now q':>7} {'now ms':>8}")
+        for name, legacy, current, known in SCENARIOS:
+            rows = []
+            for fn in (legacy, current):
+                ids = range(next_id, next_id + calls)
+                next_id += calls
+                rows.append(await measure(fn, ids, known))
+            (lq, lt), (cq, ct) = rows
+            print(f"{name:<22} {lq:>9.1f} {lt * 1e3:>10.2f} {cq:>7.1f} {ct * 1e3:>8.2f}")
+    finally:
+        async with crud.pool.acquire() as conn:
+            await conn.execute("DELETE FROM players WHERE user_id >= $1", USER_ID_BASE)
+        await crud.pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
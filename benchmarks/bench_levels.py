@@ -0,0 +1,54 @@
+"""Порівняння таблиці рівнів з колишнім рекурсивним розрахунком.
+
+Запуск з кореня репозиторію:
+    python -m benchmarks.bench_levels
+"""
+import timeit
+
+from database.models import calculate_xp_for_level, get_level_from_xp
+
+
+# --- Колишня реалізація (еталон для перевірки і порівняння) ---
+def legacy_calculate_xp_for_level(level: int) -> int:
+    if level < 1: return 0
+    if level == 1: return 20
+    coef = max(1.2, 1.48 - (level - 2) * 0.02)
+    return int(legacy_calculate_xp_for_level(level - 1) * coef)
+
+def legacy_get_level_from_xp(total_xp: int) -> tuple[int, int, int]:
+    level = 1
+    xp_needed = legacy_calculate_xp_for_level(level)
+    while total_xp >= xp_needed:
+        total_xp -= xp_needed
+        level += 1
+        xp_needed = legacy_calculate_xp_for_level(level)
+    return level, total_xp, xp_needed
+
+
+def check_equivalence() -> None:
+    for level in range(-2, 300):
+        assert calculate_xp_for_level(level) == legacy_calculate_xp_for_level(level), level
+    for xp in range(-5, 50_000):
+        assert get_level_from_xp(xp) == legacy_get_level_from_xp(xp), xp
+    # Межі рівнів і великі значення
+    total = 0
+    for level in range(1, 120):
+        total += legacy_calculate_xp_for_level(level)
+        for xp in (total - 1, total, total + 1):
+            assert get_level_from_xp(xp) == legacy_get_level_from_xp(xp), xp
+
+
+def bench(number: int = 2000) -> None:
+    print(f"{'level':>6} {'total_xp':>14} {'legacy, us':>12} {'table, us':>12} {'speedup':>9}")
+    for target_level in (1, 5, 10, 20, 40, 60):
+        xp = sum(legacy_calculate_xp_for_level(lvl) for lvl in range(1, target_level)) + 1
+        n = max(10, number // target_level)
+        legacy = min(timeit.repeat(lambda: legacy_get_level_from_xp(xp), number=n, repeat=3)) / n
+        table = min(timeit.repeat(lambda: get_level_from_xp(xp), number=number, repeat=3)) / number
+        print(f"{target_level:>6} {xp:>14} {legacy * 1e6:>12.2f} {table * 1e6:>12.3f} {legacy / table:>8.1f}x")
+
+
+if __name__ == "__main__":
+    check_equivalence()
+    print("OK: results match the legacy implementation")
+    bench()
@@ -0,0 +1,84 @@
+"""Скільки коштує розбір апдейта вебхука до того, як спрацює хоч один хендлер.
+
+Порівнює на записаних апдейтах (benchmarks/payloads/updates.jsonl):
+  legacy   - json.loads + model_validate, потім перемонтування в feed_update
+             (model_dump + model_validate з context bot), як було раніше;
+  stdlib   - json.loads + model_validate з context bot;
+  orjson   - orjson.loads + model_validate з context bot (якщо встановлено);
+  pydantic - Update.model_validate_json з context bot;
+  decode_update - те, що реально використовує вебхук.
+
+Запуск з кореня репозиторію:
+    python -m benchmarks.bench_webhook_decode
+"""
+import json
+import os
+import timeit
+
+from aiogram import Bot
+from aiogram.types import Update
+
+from utils.update_codec import decode_update, orjson
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), "payloads", "updates.jsonl")
+
+
+def load_payloads() -> list[bytes]:
+    with open(PAYLOADS, "rb") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def strategies(bot: Bot) -> dict:
+    def legacy(raw):
+        update = Update.model_validate(json.loads(raw))
+        return Update.model_validate(update.model_dump(), context={"bot": bot})
+
+    result = {
+        "legacy": legacy,
+        "stdlib": lambda raw: Update.model_validate(json.loads(raw), context={"bot": bot}),
+        "pydantic": lambda raw: Update.model_validate_json(raw, context={"bot": bot}),
+        "decode_update": lambda raw: decode_update(raw, bot),
+    }
+    if orjson:
+        result["orjson"] = lambda raw: Update.model_validate(orjson.loads(raw), context={"bot": bot})
+    return result
+
+
+def check_equivalence(bot: Bot, payloads: list[bytes]) -> None:
+    for raw in payloads:
+        expected = Update.model_validate(json.loads(raw), context={"bot": bot})
+        for name, fn in strategies(bot).items():
+            assert fn(raw) == expected, (name, raw[:60])
+
+
+def kind(raw: bytes) -> str:
+    data = json.loads(raw)
+    return next(k for k in data if k != "update_id")
+
+
+def bench(bot: Bot, payloads: list[bytes], number: int = 2000) -> None:
+    funcs = strategies(bot)
+    names = list(funcs)
+    print(f"{'update':<16} {'bytes':>6} " + " ".join(f"{n + ', us':>16}" for n in names))
+    for raw in payloads:
+        cells = []
+        for name in names:
+            fn = funcs[name]
+            t = min(timeit.repeat(lambda: fn(raw), number=number, repeat=3)) / number
+            cells.append(f"{t * 1e6:>16.1f}")
+        print(f"{kind(raw):<16} {len(raw):>6} " + " ".join(cells))
+    # Лише JSON, без валідації - яка частка часу йде на сам парсер
+    json_only = {"json.loads": json.loads}
+    if orjson:
+        json_only["orjson.loads"] = orjson.loads
+    for name, fn in json_only.items():
+        t = min(timeit.repeat(lambda: [fn(raw) for raw in payloads], number=number, repeat=3)) / number / len(payloads)
+        print(f"{name:<16} {t * 1e6:>8.2f} us/update")
+
+
+if __name__ == "__main__":
+    bot = Bot("42:BENCHMARK-TOKEN")
+    payloads = load_payloads()
+    check_equivalence(bot, payloads)
+    print(f"OK: {len(payloads)} payloads decode identically (orjson: {'yes' if orjson else 'no'})")
+    bench(bot, payloads)
@@ -0,0 +1,91 @@
+"""Локальна заміна Telegram Bot API для навантажувальних тестів.
+
+Приймає запити aiogram (POST /bot<token>/<method>, multipart або JSON),
+відповідає правдоподібними об'єктами і складає все, що бот "надіслав",
+у вхідні черги чатів - так симульовані гравці бачать повідомлення і кнопки.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+# Методи, на які може прийти 429 (як і в справжньому API - ті, що щось надсилають)
+THROTTLED_METHODS = {"sendMessage", "editMessageText", "sendDocument", "deleteMessage"}
+# Методи, результат яких симульований гравець має побачити
+VISIBLE_METHODS = {"sendMessage", "editMessageText", "sendDocument"}
+
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Spy Game (fake)", "username": "fake_spy_bot"}
+
+
+class FakeTelegramAPI:
+    def __init__(self, latency: float = 0.03, jitter: float = 0.02, p429: float = 0.0, retry_after: int = 1) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.p429 = p429
+        self.retry_after = retry_after
+        self.calls: Counter = Counter()
+        self.throttled = 0
+        self.inboxes: Dict[int, asyncio.Queue] = defaultdict(asyncio.Queue)
+        self._message_ids = itertools.count(1000)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        return app
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        if self.p429 and method in THROTTLED_METHODS and random.random() < self.p429:
+            self.throttled += 1
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        return web.json_response({"ok": True, "result": self._result(method, params)})
+
+    def _result(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == "getMe":
+            return BOT_USER
+        if method not in VISIBLE_METHODS:
+            return True
+        chat_id = int(params["chat_id"])
+        message_id = int(params.get("message_id") or next(self._message_ids))
+        text = params.get("text") or params.get("caption") or ""
+        markup = _json_field(params.get("reply_markup"))
+        self.inboxes[chat_id].put_nowait({"method": method, "text": text, "markup": markup, "message_id": message_id})
+        message = {
+            "message_id": message_id, "date": int(time.time()), "from": BOT_USER,
+            "chat": {"id": chat_id, "type": "private"}, "text": text,
+        }
+        if markup and "inline_keyboard" in markup:
+            message["reply_markup"] = markup
+        return message
+
+
+def _json_field(value: Any) -> Optional[dict]:
+    if value is None or isinstance(value, dict):
+        return value
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def callback_buttons(markup: Optional[dict]) -> list:
+    """callback_data всіх inline-кнопок повідомлення."""
+    if not markup:
+        return []
+    return [b["callback_data"] for row in markup.get("inline_keyboard", []) for b in row if "callback_data" in b]
@@ -0,0 +1,251 @@
+"""Навантажувальний тест: скільки одночасних гравців витримує один інстанс.
+
+Піднімає локальну заміну Bot API (benchmarks/fake_telegram.py), спрямовує
+на неї `bot`, запускає справжній aiohttp-застосунок з main.create_app() і
+шле в /webhook апдейти від тисяч симульованих гравців. Кожен гравець
+проходить справжній сценарій: /start -> пошук гри -> старт лобі -> чат ->
+дострокове голосування -> голос за шпигуна -> вгадування локації.
+
+Потрібна PostgreSQL (статистика гравців), напр.:
+    docker compose up -d db
+    DB_HOST=localhost python -m benchmarks.loadtest --users 600 --ramp 30
+
+За замовчуванням ліміти Telegram у sender піднято, щоб міряти сам бот;
+--real-limits залишає справжні (30 повідомлень/с на бота).
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+# Налаштування мають бути в оточенні до імпорту config/bot
+os.environ.setdefault("BOT_TOKEN", "123456:LOADTEST-fake-token")
+os.environ.setdefault("ADMIN_ID", "1")
+os.environ["USE_POLLING"] = "false"
+
+import aiohttp
+from aiohttp import web
+
+import config
+from benchmarks.fake_telegram import FakeTelegramAPI, callback_buttons
+from utils import callbacks
+
+USER_ID_BASE = 10_000_000
+TOKEN_RE = re.compile(r"<code>(\w+)</code>")
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.api = FakeTelegramAPI(args.api_latency / 1000, args.api_jitter / 1000, args.p429)
+        self._update_ids = itertools.count(1)
+        self._callback_ids = itertools.count(1)
+        self.sent_at: Dict[int, float] = {}
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.spies: Dict[str, int] = {}
+        self.games = set()
+        self.finished_users = 0
+        self.failures: Counter = Counter()
+        self.http: Optional[aiohttp.ClientSession] = None
+        self.webhook_url = ""
+
+    # --- Апдейти від гравців ---
+    def _user(self, uid: int) -> dict:
+        return {"id": uid, "is_bot": False, "first_name": f"Load{uid - USER_ID_BASE}"}
+
+    async def _post(self, payload: dict) -> None:
+        update_id = payload["update_id"]
+        self.sent_at[update_id] = time.perf_counter()
+        while True:
+            async with self.http.post(self.webhook_url, json=payload) as resp:
+                if resp.status != 503:
+                    return
+            self.failures["webhook_503"] += 1
+            await asyncio.sleep(1)  # як Telegram: повторна доставка пізніше
+
+    async def send_text(self, uid: int, text: str) -> None:
+        await self._post({
+            "update_id": next(self._update_ids),
+            "message": {
+                "message_id": random.randrange(1, 2**31), "date": int(time.time()),
+                "from": self._user(uid), "chat": {"id": uid, "type": "private"}, "text": text,
+            },
+        })
+
+    async def click(self, uid: int, data: str, message_id: int) -> None:
+        await self._post({
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._callback_ids)), "from": self._user(uid), "chat_instance": str(uid), "data": data,
+                "message": {"message_id": message_id, "date": int(time.time()), "chat": {"id": uid, "type": "private"}, "text": "."},
+            },
+        })
+
+    async def expect(self, uid: int, predicate, timeout: float) -> dict:
+        """Чекає на повідомлення бота цьому гравцю, що задовольняє predicate."""
+        inbox = self.api.inboxes[uid]
+        deadline = time.monotonic() + timeout
+        while True:
+            msg = await asyncio.wait_for(inbox.get(), max(0.01, deadline - time.monotonic()))
+            if predicate(msg):
+                return msg
+
+    # --- Сценарій одного гравця ---
+    async def player(self, uid: int) -> None:
+        try:
+            await self.send_text(uid, "/start")
+            await self.send_text(uid, "🎮 Знайти Гру")
+            found = await self.expect(uid, lambda m: "Гру знайдено" in m["text"], self.args.match_timeout)
+            token = TOKEN_RE.search(found["text"]).group(1)
+            menu = await self.expect(uid, lambda m: m["text"] == "Меню:", 30)
+            start = [d for d in callback_buttons(menu["markup"]) if callbacks.decode(d).action == callbacks.START_GAME]
+            is_room_admin = bool(start)
+            if is_room_admin:
+                await self.click(uid, start[0], menu["message_id"])
+            role = await self.expect(uid, lambda m: "ШПИГУН!" in m["text"] or "МИРНИЙ" in m["text"], 60)
+            is_spy = "ШПИГУН!" in role["text"]
+            if is_spy:
+                self.spies[token] = uid
+            chat = asyncio.create_task(self._chat(uid, is_room_admin))
+            try:
+                await self._play(uid, token, is_spy)
+            finally:
+                chat.cancel()
+            self.games.add(token)
+            self.finished_users += 1
+        except asyncio.TimeoutError:
+            self.failures["player_timeout"] += 1
+        except Exception as e:
+            self.failures[type(e).__name__] += 1
+
+    async def _chat(self, uid: int, is_room_admin: bool) -> None:
+        for i in range(self.args.chat_messages):
+            # Не частіше 1 повідомлення/с, щоб не впертися в антиспам
+            await asyncio.sleep(random.uniform(1.1, 3.0))
+            await self.send_text(uid, f"повідомлення {i} від {uid}")
+        if is_room_admin:
+            await self.send_text(uid, "🗳️ Достр. Голосування")
+
+    async def _play(self, uid: int, token: str, is_spy: bool) -> None:
+        while True:
+            msg = await self.expect(uid, lambda m: True, self.args.game_timeout)
+            if "ГРУ ЗАВЕРШЕНО" in msg["text"]:
+                return
+            buttons = callback_buttons(msg["markup"])
+            if not buttons:
+                continue
+            payloads = {b: callbacks.decode(b) for b in buttons}
+            action = payloads[buttons[0]].action
+            if action in (callbacks.EARLY_YES, callbacks.EARLY_NO):
+                await self.click(uid, next(b for b, p in payloads.items() if p.action == callbacks.EARLY_YES), msg["message_id"])
+            elif action == callbacks.VOTE:
+                target = None if is_spy else self.spies.get(token)
+                choice = next((b for b, p in payloads.items() if p.arg == target), random.choice(buttons))
+                await self.click(uid, choice, msg["message_id"])
+            elif action == callbacks.GUESS and is_spy:
+                await self.click(uid, random.choice(buttons), msg["message_id"])
+
+    # --- Запуск ---
+    async def run(self) -> None:
+        args = self.args
+        if not args.real_limits:
+            config.TG_GLOBAL_MSG_PER_SEC = config.TG_CHAT_MSG_PER_SEC = config.TG_CHAT_BURST = 1_000_000
+        # Імпорт тут: sender читає ліміти з config під час імпорту
+        from aiogram.client.session.aiohttp import AiohttpSession
+        from aiogram.client.telegram import TelegramAPIServer
+        from bot import bot, dp
+        import main as bot_main
+
+        api_runner = web.AppRunner(self.api.app())
+        await api_runner.setup()
+        await web.TCPSite(api_runner, "127.0.0.1", args.api_port).start()
+        bot.session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{args.api_port}"))
+
+        # Кінець обробки апдейта = вихід з dp.feed_update у воркері черги
+        feed_update = dp.feed_update
+
+        async def timed_feed_update(bot_, update, **kwargs):
+            try:
+                return await feed_update(bot_, update, **kwargs)
+            finally:
+                started = self.sent_at.pop(update.update_id, None)
+                if started is not None:
+                    self.latency[update.event_type].append(time.perf_counter() - started)
+
+        dp.feed_update = timed_feed_update
+
+        app_runner = web.AppRunner(bot_main.create_app())
+        await app_runner.setup()
+        await web.TCPSite(app_runner, "127.0.0.1", args.bot_port).start()
+        self.webhook_url = f"http://127.0.0.1:{args.bot_port}{config.WEBHOOK_PATH}"
+        self.api.calls.clear()
+
+        connector = aiohttp.TCPConnector(limit=args.connections)
+        async with aiohttp.ClientSession(connector=connector) as self.http:
+            started = time.perf_counter()
+            tasks = []
+            for i in range(args.users):
+                tasks.append(asyncio.create_task(self.player(USER_ID_BASE + i)))
+                await asyncio.sleep(args.ramp / args.users)
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+
+        from utils.update_queue import update_queue
+        queue = update_queue.stats()
+        await app_runner.cleanup()
+        await api_runner.cleanup()
+        await bot.session.close()
+        self.report(elapsed, queue)
+
+    def report(self, elapsed: float, queue: dict) -> None:
+        games = len(self.games)
+        all_latency = [v for values in self.latency.values() for v in values]
+        api_total = sum(self.api.calls.values())
+        print(f"\nUsers: {self.args.users}, finished: {self.finished_users}, games: {games}, elapsed: {elapsed:.1f}s")
+        if self.failures:
+            print("Failures: " + ", ".join(f"{k}={v}" for k, v in self.failures.items()))
+        print(f"Updates: {len(all_latency)} processed, {len(all_latency) / elapsed:.1f}/s")
+        print(f"{'update':<16} {'count':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for kind, values in [("all", all_latency)] + sorted(self.latency.items()):
+            if values:
+                print(f"{kind:<16} {len(values):>7} {percentile(values, 50) * 1e3:>8.1f} {percentile(values, 90) * 1e3:>8.1f} "
+                      f"{percentile(values, 99) * 1e3:>8.1f} {max(values) * 1e3:>8.1f}")
+        print(f"API calls: {api_total} ({api_total / elapsed:.1f}/s), 429 answered: {self.api.throttled}")
+        if games:
+            print(f"API calls per game: {api_total / games:.1f}")
+            for method, count in self.api.calls.most_common():
+                print(f"  {method:<22} {count:>8} {count / games:>8.1f}/game")
+        print(f"Webhook queue: max wait {queue['wait_max_ms']} ms, avg wait {queue['wait_avg_ms']} ms, rejected {queue['rejected']}")
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--users", type=int, default=300, help="скільки гравців симулювати")
+    p.add_argument("--ramp", type=float, default=20.0, help="за скільки секунд підключаються всі гравці")
+    p.add_argument("--chat-messages", type=int, default=3, help="повідомлень у чат від кожного гравця за гру")
+    p.add_argument("--api-latency", type=float, default=40.0, help="середня затримка фейкового Bot API, мс")
+    p.add_argument("--api-jitter", type=float, default=20.0, help="розкид затримки, мс")
+    p.add_argument("--p429", type=float, default=0.0, help="ймовірність відповіді 429 на надсилання")
+    p.add_argument("--real-limits", action="store_true", help="не піднімати ліміти Telegram у sender")
+    p.add_argument("--match-timeout", type=float, default=180.0)
+    p.add_argument("--game-timeout", type=float, default=120.0, help="макс. пауза між подіями гри")
+    p.add_argument("--connections", type=int, default=200, help="одночасних HTTP-з'єднань до вебхука")
+    p.add_argument("--api-port", type=int, default=8081)
+    p.add_argument("--bot-port", type=int, default=8080)
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(LoadTest(parse_args()).run())
@@ -0,0 +1,259 @@
+"""Набір мікробенчмарків для гарячих шляхів, що виконуються на кожен апдейт або гру.
+
+Результати пишуться в JSON, щоб порівнювати гілки і ловити регресії:
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --output after.json --compare before.json
+
+--compare виходить з кодом 1, якщо якийсь кейс повільніший за поріг (--threshold).
+--filter запускає лише кейси, в назві яких є підрядок.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+from typing import Any, Callable, Dict, List, Optional
+
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK-fake-token")
+os.environ.setdefault("ADMIN_ID", "1")
+
+from config import LOCATIONS
+from database.models import Room, calculate_xp_for_level, get_level_from_xp
+from database.state_backend import MemoryStateBackend
+from keyboards.keyboards import get_early_vote_keyboard, get_in_lobby_keyboard, get_locations_keyboard, get_voting_keyboard
+from utils import callbacks
+from utils.callbacks import decode, encode
+from utils.ratelimit import SpamGuard
+from utils.room_registry import RoomRegistry
+
+# name -> (setup(param) -> callable без аргументів, params)
+CASES: Dict[str, tuple] = {}
+
+
+def case(name: str, params: tuple = (None,)):
+    def register(setup: Callable[[Any], Callable[[], Any]]):
+        CASES[name] = (setup, params)
+        return setup
+    return register
+
+
+def run_sync(coro):
+    """Проганяє корутину, яка ніколи не чекає на I/O (memory backend), без event loop."""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("coroutine suspended")
+
+
+def _xp_for_level(level: int) -> int:
+    return sum(calculate_xp_for_level(lvl) for lvl in range(1, level)) + 1
+
+
+# --- Рівні ---
+@case("levels.get_level_from_xp", params=(1, 20, 60))
+def _(level):
+    xp = _xp_for_level(level)
+    return lambda: get_level_from_xp(xp)
+
+
+@case("levels.calculate_xp_for_level", params=(5, 50))
+def _(level):
+    return lambda: calculate_xp_for_level(level)
+
+
+# --- Антиспам ---
+@case("antispam.hit", params=(100, 10_000))
+def _(users):
+    guard = SpamGuard(3, 5.0, idle=60.0)
+    state = {"now": 0.0, "uid": 0}
+
+    def step():
+        state["now"] += 0.001
+        state["uid"] = (state["uid"] + 7919) % users
+        guard.hit(state["uid"], state["now"])
+    return step
+
+
+# --- Пошук кімнати гравця ---
+def _registry_with_rooms(rooms: int) -> RoomRegistry:
+    registry = RoomRegistry(MemoryStateBackend())
+    for i in range(rooms):
+        run_sync(registry.create_room(i * 6 + 1, {i * 6 + k: f"P{k}" for k in range(1, 7)}))
+    return registry
+
+
+@case("rooms.find_user_room", params=(10, 1000, 10_000))
+def _(rooms):
+    registry = _registry_with_rooms(rooms)
+    uid = (rooms // 2) * 6 + 3
+    return lambda: run_sync(registry.find_user_room(uid))
+
+
+@case("rooms.find_user_room_miss", params=(10, 10_000))
+def _(rooms):
+    registry = _registry_with_rooms(rooms)
+    return lambda: run_sync(registry.find_user_room(-999))
+
+
+# --- Клавіатури ---
+_NAMES = {uid: name for uid, name in zip(range(1, 7), ["Альфа", "Браво", "Чарлі", "Дельта", "Ехо", "Фокстрот"])}
+
+
+@case("keyboards.voting")
+def _(_param):
+    return lambda: get_voting_keyboard("K3F9QZ", _NAMES, 1)
+
+
+@case("keyboards.locations")
+def _(_param):
+    return lambda: get_locations_keyboard("K3F9QZ", LOCATIONS)
+
+
+@case("keyboards.lobby")
+def _(_param):
+    return lambda: get_in_lobby_keyboard(True, "K3F9QZ", True)
+
+
+@case("keyboards.early_vote")
+def _(_param):
+    return lambda: get_early_vote_keyboard("K3F9QZ")
+
+
+# --- Callback-кнопки ---
+@case("callbacks.decode", params=("vote", "guess", "early"))
+def _(kind):
+    data = {"vote": encode(callbacks.VOTE, "K3F9QZ", 5_123_456_789),
+            "guess": encode(callbacks.GUESS, "K3F9QZ", len(LOCATIONS) - 1),
+            "early": encode(callbacks.EARLY_YES, "K3F9QZ")}[kind]
+    return lambda: decode(data)
+
+
+@case("callbacks.encode")
+def _(_param):
+    return lambda: encode(callbacks.VOTE, "K3F9QZ", 5_123_456_789)
+
+
+# --- Кімната ---
+@case("room.construct")
+def _(_param):
+    players = dict(_NAMES)
+    return lambda: Room(token="K3F9QZ", admin_id=1, players=dict(players), last_activity=0)
+
+
+@case("room.to_from_dict")
+def _(_param):
+    room = Room(token="K3F9QZ", admin_id=1, players=dict(_NAMES), player_callsigns=dict(_NAMES),
+                player_roles={uid: "civilian" for uid in _NAMES}, game_started=True)
+    return lambda: Room.from_dict(room.to_dict())
+
+
+# --- Матчмейкінг (потребує event loop: таймери scheduler) ---
+async def _bench_matchmaking(size: int, number: int) -> float:
+    import utils.matchmaking as mm
+    from utils.scheduler import scheduler
+    saved = mm.MM_MIN, mm.MM_MAX
+    # Черга не повинна збиратись у кімнати і чіпати Bot API
+    mm.MM_MIN = mm.MM_MAX = size + 10
+    try:
+        for uid in range(1, size + 1):
+            await mm.enqueue_user(uid, 0)
+        extra = size + 1
+        best = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            for _ in range(number):
+                await mm.enqueue_user(extra, 0)
+                await mm.dequeue_user(extra)
+            best = min(best, (time.perf_counter() - start) / number)
+        for uid in range(1, size + 1):
+            await mm.dequeue_user(uid)
+        return best
+    finally:
+        scheduler.cancel_group("mm")
+        scheduler.cancel(mm._STATUS_TIMER)
+        mm.MM_MIN, mm.MM_MAX = saved
+
+
+ASYNC_CASES = {"matchmaking.enqueue_dequeue": ((0, 100, 1000), _bench_matchmaking)}
+
+
+# --- Запуск ---
+def measure(fn: Callable[[], Any]) -> float:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=5, number=number)) / number
+
+
+def run(filter_: str = "") -> List[Dict[str, Any]]:
+    results = []
+    for name, (setup, params) in CASES.items():
+        if filter_ not in name:
+            continue
+        for param in params:
+            seconds = measure(setup(param))
+            results.append({"name": name, "param": param, "ns_per_op": round(seconds * 1e9, 1)})
+            print(f"{name:<34} {str(param if param is not None else ''):>8} {seconds * 1e9:>12.1f} ns")
+    for name, (params, bench) in ASYNC_CASES.items():
+        if filter_ not in name:
+            continue
+        for param in params:
+            seconds = asyncio.run(bench(param, 2000))
+            results.append({"name": name, "param": param, "ns_per_op": round(seconds * 1e9, 1)})
+            print(f"{name:<34} {param:>8} {seconds * 1e9:>12.1f} ns")
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, threshold: float) -> bool:
+    with open(baseline_path) as f:
+        baseline = {(r["name"], r["param"]): r["ns_per_op"] for r in json.load(f)["results"]}
+    ok = True
+    print(f"\n{'case':<43} {'before ns':>10} {'after ns':>10} {'change':>8}")
+    for r in results:
+        before = baseline.get((r["name"], r["param"]))
+        if not before:
+            continue
+        change = r["ns_per_op"] / before - 1
+        flag = "  REGRESSION" if change > threshold else ""
+        ok &= not flag
+        label = f"{r['name']}[{r['param']}]" if r["param"] is not None else r["name"]
+        print(f"{label:<43} {before:>10.1f} {r['ns_per_op']:>10.1f} {change:>+7.1%}{flag}")
+    return ok
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--output", default="bench_results.json")
+    p.add_argument("--compare", help="JSON попереднього запуску")
+    p.add_argument("--threshold", type=float, default=0.15, help="допустиме сповільнення, частка (0.15 = 15%%)")
+    p.add_argument("--filter", default="")
+    args = p.parse_args()
+
+    results = run(args.filter)
+    with open(args.output, "w") as f:
+        json.dump({
+            "commit": _git_commit(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "results": results,
+        }, f, ensure_ascii=False, indent=1)
+    print(f"\nSaved {len(results)} results to {args.output}")
+    if args.compare and not compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,11 @@
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
-from aiogram.fsm.storage.memory import MemoryStorage
 from config import API_TOKEN
+from database.state_backend import state_backend, BackendFSMStorage
 
 # Лише створюємо об'єкти. Ніяких імпортів хендлерів!
 bot = Bot(token=API_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
-dp = Dispatcher(storage=MemoryStorage())
+# FSM зберігається в тому ж бекенді, що й кімнати (STATE_BACKEND)
+dp = Dispatcher(storage=BackendFSMStorage(state_backend))
 
 __all__ = ["bot", "dp"]
\ No newline at end of file
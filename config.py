@@ -1,4 +1,7 @@
 import os
+import socket
+import time
+import uuid
 from dotenv import load_dotenv
 
 # Завантажуємо змінні з .env
@@ -19,9 +22,23 @@ ADMIN_IDS = [int(admin_id.strip()) for admin_id in ADMIN_IDS_STR.split(',')]
 USE_POLLING = os.getenv('USE_POLLING', 'false').lower() == 'true'
 RENDER_EXTERNAL_HOSTNAME = os.getenv('RENDER_EXTERNAL_HOSTNAME', 'spy-game-bot.onrender.com')
 WEBHOOK_PATH = "/webhook"
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 8))  # скільки апдейтів обробляємо паралельно
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', 2000))  # загальний ліміт черги апдейтів
+WEBHOOK_ENQUEUE_TIMEOUT = float(os.getenv('WEBHOOK_ENQUEUE_TIMEOUT', 5))  # скільки чекаємо місця в черзі перед 503
+# Ідентифікатор процесу для оренди спільних задач (розсилки, таймери кімнат) між воркерами
+WORKER_ID = os.getenv('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
 
 # Налаштування бази даних
 DB_PATH = os.getenv('RENDER_DISK_PATH', '') + '/players.db' if os.getenv('RENDER_DISK_PATH') else 'players.db'
+ROOMS_SNAPSHOT_PATH = os.getenv('RENDER_DISK_PATH', '') + '/rooms.jsonl' if os.getenv('RENDER_DISK_PATH') else 'rooms.jsonl'
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 2))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))  # з запасом на WEBHOOK_WORKERS + фонові задачі
+DB_CONNECT_TIMEOUT = float(os.getenv('DB_CONNECT_TIMEOUT', 10))  # секунд на встановлення з'єднання
+DB_COMMAND_TIMEOUT = float(os.getenv('DB_COMMAND_TIMEOUT', 30))  # секунд на один запит
+DB_MAX_INACTIVE_SECONDS = float(os.getenv('DB_MAX_INACTIVE_SECONDS', 300))  # закриваємо з'єднання, що стільки простоюють
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 100))  # підготовлених запитів на з'єднання (asyncpg)
+PLAYER_CACHE_SIZE = int(os.getenv('PLAYER_CACHE_SIZE', 10_000))  # профілів гравців у пам'яті (LRU)
+PLAYER_CACHE_TTL = float(os.getenv('PLAYER_CACHE_TTL', 60))  # секунд; стільки може бути видно зміни з інших воркерів
 
 # Ігрові константи
 LOCATIONS = [
@@ -46,8 +63,20 @@ XP_CIVILIAN_WIN = 10
 XP_SPY_WIN = 20
 MESSAGE_MAX_LENGTH = 120
 GAME_DURATION_SECONDS = 20 * 60  # 20 хвилин за замовчуванням
-ROOM_EXPIRY = 3600  # 1 година
-SAVE_INTERVAL = 10  # секунд
+ROOM_EXPIRY = 3600  # 1 година: стільки кімната може простояти без дій
+REAP_INTERVAL = 60  # секунд між проходами прибиральника неактивних кімнат і станів
+ROOM_LEASE_SECONDS = 3 * REAP_INTERVAL  # таймери кімнати веде її власник; без продовження оренди кімнату підхоплює інший воркер
+ACTIVE_USER_TTL = 24 * 3600  # скільки користувач вважається активним після /start
+SAVE_INTERVAL = 10  # секунд між знімками змінених кімнат
+SNAPSHOT_COMPACT_MIN = 1000  # не стискаємо журнал знімків, поки в ньому менше рядків
+GAME_LOG_BATCH_SIZE = 200  # скільки завершених ігор пишемо в game_logs одним COPY
+GAME_LOG_FLUSH_INTERVAL = 5  # ... або не рідше ніж раз на стільки секунд
+GAME_LOG_MAX_BUFFER = 10_000  # якщо БД недоступна, старші рядки понад цей ліміт відкидаються
+
+# Таблиці лідерів (/top)
+LEADERBOARD_SIZE = 10
+LEADERBOARD_TTL = 30  # секунд, скільки топ кешується в процесі
+LEADERBOARD_RANK_LIMIT = 1000  # далі місце не рахуємо точно, показуємо "1000+"
 
 # Налаштування адмінської кімнати
 ADMIN_ROOM_TOKEN = "ADMIN"
@@ -59,17 +88,32 @@ BOT_DELAY = (1, 3)  # Затримка дій ботів (секунди)
 # Антиспам та обмеження повідомлень
 MAX_MSG_PER_SEC = 3
 SPAM_COOLDOWN_SECONDS = 5
+SPAM_IDLE_SECONDS = 60  # стан антиспаму користувача видаляється після хвилини тиші
+BAN_REFRESH_INTERVAL = 30  # секунд між перечитуваннями банів з БД (бани, видані на інших воркерах)
 MAX_TEXT_LENGTH = 150
 BLOCK_MEDIA = True  # блокуємо фото/гіф/стікери за замовчуванням
 
+# Ліміти Telegram Bot API для вихідних повідомлень
+TG_GLOBAL_MSG_PER_SEC = 30  # загальний ліміт бота
+TG_CHAT_MSG_PER_SEC = 1  # середній темп в один чат
+TG_CHAT_BURST = 5  # короткий сплеск в один чат
+TG_SEND_RETRIES = 3  # скільки разів повторюємо після RetryAfter
+
+# Розсилки
+BROADCAST_MSG_PER_SEC = 25  # трохи нижче глобального ліміту, щоб лишався запас для ігор
+BROADCAST_BATCH_SIZE = 250  # скільки ID читаємо з БД за раз (і як часто зберігаємо прогрес)
+BROADCAST_LEASE_SECONDS = 120  # якщо воркер стільки не звітував про розсилку, її підхоплює інший
+
+# Профілювання хендлерів
+SLOW_HANDLER_SECONDS = 1.0  # логуємо хендлери, що працюють довше (разом з очікуванням мережі/БД)
+SLOW_HOLD_SECONDS = 0.05  # ... або тримають event loop довше без жодного await
+HANDLER_STATS_TOP_N = 10
+PROFILE_MAX_SECONDS = 60
+
 # Глобальні змінні
 maintenance_mode = False
-active_users = set()
-rooms = {}
-user_message_times = {}
-matchmaking_queue = []
+active_users = {}
 maintenance_timer_task = None
-last_save_time = 0
 
 # Геттери/сеттери для режиму обслуговування
 def set_maintenance_mode(value: bool) -> None:
@@ -87,12 +131,19 @@ def set_maintenance_task(task) -> None:
 def get_maintenance_task():
     return maintenance_timer_task
 
-# Управління активними користувачами для розсилок
+# Управління активними користувачами для розсилок (user_id -> час останньої появи)
 def add_active_user(user_id: int) -> None:
-    active_users.add(int(user_id))
+    active_users[int(user_id)] = time.time()
 
 def remove_active_user(user_id: int) -> None:
-    active_users.discard(int(user_id))
+    active_users.pop(int(user_id), None)
 
 def get_active_users():
     return set(active_users)
+
+def prune_active_users(cutoff: float) -> int:
+    """Забуває тих, хто не з'являвся з `cutoff`. Повертає, скількох прибрано."""
+    stale = [uid for uid, seen in active_users.items() if seen < cutoff]
+    for uid in stale:
+        del active_users[uid]
+    return len(stale)
@@ -2,108 +2,288 @@ import asyncpg
 import logging
 import os
 import asyncio
-from typing import Optional, Dict, Any, List
-from .models import Player, get_level_from_xp
+import time
+from collections import OrderedDict
+from dataclasses import fields
+from typing import Optional, Dict, Any, List, AsyncIterator, Tuple
+from .models import Player, get_level_from_xp, season_keys
+from config import (
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_CONNECT_TIMEOUT, DB_COMMAND_TIMEOUT,
+    DB_MAX_INACTIVE_SECONDS, DB_STATEMENT_CACHE_SIZE, PLAYER_CACHE_SIZE, PLAYER_CACHE_TTL,
+    XP_CIVILIAN_WIN, XP_SPY_WIN
+)
+from utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
 # Глобальний пул з'єднань
 pool: Optional[asyncpg.Pool] = None
 
+async def _collect_pool():
+    if not pool:
+        return []
+    size, idle = pool.get_size(), pool.get_idle_size()
+    return [(("max",), pool.get_max_size()), (("open",), size), (("idle",), idle), (("in_use",), size - idle)]
+
+metrics.gauge("db_pool_connections", "asyncpg pool connections by state", ("state",), collector=_collect_pool)
+_query_latency = metrics.histogram("db_query_seconds", "Query latency by statement kind", ("kind",))
+_query_errors = metrics.counter("db_query_errors_total", "Failed queries by statement kind", ("kind",))
+
+def _log_query(record) -> None:
+    # Викликається asyncpg після кожного запиту; мітка - перше слово (SELECT, INSERT, ...)
+    kind = record.query.lstrip().split(None, 1)[0].upper() if record.query.strip() else "?"
+    _query_latency.observe(record.elapsed, kind)
+    if record.exception is not None:
+        _query_errors.inc(kind)
+
+class _PlayerCache:
+    """LRU з TTL для профілів гравців: повторні /stats і /whois не йдуть у БД.
+
+    Кожен запис у players у цьому модулі скидає кеш для своїх гравців. Зміни
+    з інших процесів (кілька воркерів) стають видимими не пізніше ніж за ttl.
+    Закешовані Player спільні для всіх викликів - їх не можна змінювати.
+    """
+
+    def __init__(self, size: int, ttl: float) -> None:
+        self.size = size
+        self.ttl = ttl
+        self._items: "OrderedDict[int, Tuple[float, Player]]" = OrderedDict()
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[Player]:
+        item = self._items.get(user_id)
+        if item is not None and time.monotonic() - item[0] < self.ttl:
+            self._items.move_to_end(user_id)
+            self.hits += 1
+            return item[1]
+        if item is not None:
+            del self._items[user_id]
+        self.misses += 1
+        return None
+
+    def version(self) -> int:
+        return self._version
+
+    def put(self, player: Player, version: int) -> None:
+        # Якщо поки йшло читання з БД хтось записав, прочитане могло вже застаріти
+        if version != self._version:
+            return
+        self._items[player.user_id] = (time.monotonic(), player)
+        self._items.move_to_end(player.user_id)
+        if len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def invalidate(self, user_ids) -> None:
+        self._version += 1
+        for uid in user_ids:
+            self._items.pop(uid, None)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+player_cache = _PlayerCache(PLAYER_CACHE_SIZE, PLAYER_CACHE_TTL)
+
+async def _collect_cache_requests():
+    return [(("hit",), player_cache.hits), (("miss",), player_cache.misses)]
+
+async def _collect_cache_size():
+    return [((), len(player_cache))]
+
+metrics.counter("player_cache_requests_total", "Player profile cache lookups", ("result",), collector=_collect_cache_requests)
+metrics.gauge("player_cache_entries", "Player profiles held in the cache", collector=_collect_cache_size)
+
+_PLAYER_COLUMNS = ", ".join(f.name for f in fields(Player))
+
+# Запити гарячих шляхів: готуються один раз на з'єднання при його відкритті,
+# далі кожен виклик - це лише Bind/Execute без Parse
+_STATEMENTS = {
+    "get_player": f"SELECT {_PLAYER_COLUMNS} FROM players WHERE user_id = $1",
+    # Один запит і для нового, і для наявного гравця; порожній username не затирає збережений
+    "upsert_player": f"""
+        INSERT INTO players (user_id, username, level)
+        VALUES ($1, $2, 1)
+        ON CONFLICT (user_id) DO UPDATE
+            SET username = COALESCE(NULLIF(EXCLUDED.username, ''), players.username)
+        RETURNING {_PLAYER_COLUMNS}
+    """,
+    "set_banned_until": """
+        INSERT INTO players (user_id, username, level, banned_until)
+        VALUES ($1, '', 1, $2)
+        ON CONFLICT (user_id) DO UPDATE SET banned_until = EXCLUDED.banned_until
+    """,
+}
+
+class _Connection(asyncpg.Connection):
+    """З'єднання пулу з підготовленими запитами: conn.stmts[name]."""
+
+async def _init_connection(conn) -> None:
+    conn.add_query_logger(_log_query)
+    conn.stmts = {name: await conn.prepare(sql) for name, sql in _STATEMENTS.items()}
+
+def _connect_params() -> Dict[str, Any]:
+    # Отримуємо налаштування з змінних оточення (які ми прописали в docker-compose)
+    return {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "user": os.getenv("DB_USER", "postgres"),
+        "password": os.getenv("DB_PASSWORD", "supersecretpassword"),
+        "database": os.getenv("DB_NAME", "spygame"),
+    }
+
 async def init_db():
     """Ініціалізація підключення до PostgreSQL та створення таблиць."""
     global pool
-    
-    # Отримуємо налаштування з змінних оточення (які ми прописали в docker-compose)
-    db_host = os.getenv("DB_HOST", "localhost")
-    db_user = os.getenv("DB_USER", "postgres")
-    db_pass = os.getenv("DB_PASSWORD", "supersecretpassword")
-    db_name = os.getenv("DB_NAME", "spygame")
-
-    logger.info(f"Connecting to Postgres at {db_host}...")
+    params = _connect_params()
+    logger.info(f"Connecting to Postgres at {params['host']}...")
 
-    # Чекаємо поки БД прокинеться (важливо для Docker)
+    # Чекаємо поки БД прокинеться (важливо для Docker).
+    # Таблиці створюємо окремим з'єднанням до пулу: пул одразу готує запити до них.
+    conn = None
     for i in range(10):
         try:
-            pool = await asyncpg.create_pool(
-                user=db_user,
-                password=db_pass,
-                database=db_name,
-                host=db_host
-            )
+            conn = await asyncpg.connect(**params, timeout=DB_CONNECT_TIMEOUT)
             break
         except Exception as e:
             logger.warning(f"DB not ready yet, retrying... ({e})")
             await asyncio.sleep(2)
     
-    if not pool:
+    if not conn:
         raise Exception("Could not connect to Database")
 
-    async with pool.acquire() as conn:
-        # Створення таблиць
-        # BIGINT - важливо для Telegram ID
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS players (
-                user_id BIGINT PRIMARY KEY,
-                username TEXT,
-                total_xp INTEGER DEFAULT 0,
-                level INTEGER DEFAULT 1,
-                games_played INTEGER DEFAULT 0,
-                spy_wins INTEGER DEFAULT 0,
-                civilian_wins INTEGER DEFAULT 0,
-                banned_until BIGINT DEFAULT 0
-            )
-        ''')
-        
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS game_logs (
-                id SERIAL PRIMARY KEY,
-                room_token TEXT,
-                location TEXT,
-                spy_id BIGINT,
-                players TEXT,
-                winner TEXT,
-                timestamp BIGINT
-            )
-        ''')
-    
+    try:
+        await _create_tables(conn)
+    finally:
+        await conn.close()
+
+    pool = await asyncpg.create_pool(
+        **params,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        timeout=DB_CONNECT_TIMEOUT,
+        command_timeout=DB_COMMAND_TIMEOUT,
+        max_inactive_connection_lifetime=DB_MAX_INACTIVE_SECONDS,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+        connection_class=_Connection,
+        init=_init_connection
+    )
     logger.info("✅ Database initialized (PostgreSQL).")
 
+async def _create_tables(conn) -> None:
+    # Створення таблиць
+    # BIGINT - важливо для Telegram ID
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS players (
+            user_id BIGINT PRIMARY KEY,
+            username TEXT,
+            total_xp INTEGER DEFAULT 0,
+            level INTEGER DEFAULT 1,
+            games_played INTEGER DEFAULT 0,
+            spy_wins INTEGER DEFAULT 0,
+            civilian_wins INTEGER DEFAULT 0,
+            banned_until BIGINT DEFAULT 0
+        )
+    ''')
+    
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS game_logs (
+            id SERIAL PRIMARY KEY,
+            room_token TEXT,
+            location TEXT,
+            spy_id BIGINT,
+            players BIGINT[] NOT NULL DEFAULT '{}',
+            winner TEXT,
+            timestamp BIGINT
+        )
+    ''')
+    # Старі бази: players був TEXT "id1,id2,..." - переводимо в масив
+    await conn.execute('''
+        DO $$
+        BEGIN
+            IF (SELECT data_type FROM information_schema.columns
+                WHERE table_name = 'game_logs' AND column_name = 'players') = 'text' THEN
+                ALTER TABLE game_logs ALTER COLUMN players DROP DEFAULT;
+                ALTER TABLE game_logs ALTER COLUMN players TYPE BIGINT[]
+                    USING COALESCE(string_to_array(NULLIF(players, ''), ',')::BIGINT[], '{}');
+                ALTER TABLE game_logs ALTER COLUMN players SET DEFAULT '{}';
+            END IF;
+        END $$
+    ''')
+    # Історія читається сторінками від найновіших (keyset по timestamp, id), в т.ч. по гравцю
+    await conn.execute("CREATE INDEX IF NOT EXISTS game_logs_timestamp_idx ON game_logs (timestamp, id)")
+    await conn.execute("CREATE INDEX IF NOT EXISTS game_logs_players_idx ON game_logs USING GIN (players)")
+
+    # Сезонні підсумки (тиждень/місяць), оновлюються разом зі статистикою в record_game_result
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS player_seasons (
+            season TEXT NOT NULL,
+            user_id BIGINT NOT NULL,
+            xp INTEGER NOT NULL DEFAULT 0,
+            games_played INTEGER NOT NULL DEFAULT 0,
+            spy_wins INTEGER NOT NULL DEFAULT 0,
+            civilian_wins INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (season, user_id)
+        )
+    ''')
+
+    # Індекси таблиць лідерів: топ N читається з початку індексу, без скану players
+    await conn.execute("CREATE INDEX IF NOT EXISTS players_total_xp_idx ON players (total_xp DESC, user_id)")
+    await conn.execute("CREATE INDEX IF NOT EXISTS players_spy_wins_idx ON players (spy_wins DESC, user_id)")
+    await conn.execute("CREATE INDEX IF NOT EXISTS player_seasons_xp_idx ON player_seasons (season, xp DESC, user_id)")
+
+    # Фонові розсилки: last_user_id - курсор, з якого продовжуємо після рестарту
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            id SERIAL PRIMARY KEY,
+            text TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            last_user_id BIGINT NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            admin_chat_id BIGINT,
+            status_message_id BIGINT,
+            created_at BIGINT,
+            updated_at BIGINT
+        )
+    ''')
+    # Оренда розсилки: її веде лише воркер owner, поки не минув lease_until
+    await conn.execute("ALTER TABLE broadcast_jobs ADD COLUMN IF NOT EXISTS owner TEXT")
+    await conn.execute("ALTER TABLE broadcast_jobs ADD COLUMN IF NOT EXISTS lease_until BIGINT NOT NULL DEFAULT 0")
+
 async def get_player(user_id: int) -> Optional[Player]:
+    player = player_cache.get(user_id)
+    if player:
+        return player
     if not pool: await init_db()
     
+    version = player_cache.version()
     async with pool.acquire() as conn:
-        row = await conn.fetchrow("SELECT * FROM players WHERE user_id = $1", user_id)
-        
-        if row:
-            return Player(
-                user_id=row['user_id'],
-                username=row['username'],
-                total_xp=row['total_xp'],
-                level=row['level'],
-                games_played=row['games_played'],
-                spy_wins=row['spy_wins'],
-                civilian_wins=row['civilian_wins'],
-                banned_until=row['banned_until']
-            )
+        row = await conn.stmts["get_player"].fetchrow(user_id)
+    if not row:
         return None
+    player = Player(*row)
+    player_cache.put(player, version)
+    return player
 
 async def get_or_create_player(user_id: int, username: str = "") -> Player:
-    player = await get_player(user_id)
-    if player:
-        return player
-    
+    """Повертає гравця, створюючи його за потреби, - один запит до БД."""
+    if not pool: await init_db()
+
+    player_cache.invalidate((user_id,))
+    version = player_cache.version()
     async with pool.acquire() as conn:
-        # ON CONFLICT DO NOTHING - захист від дублікатів
-        await conn.execute(
-            """
-            INSERT INTO players (user_id, username, level) 
-            VALUES ($1, $2, 1)
-            ON CONFLICT (user_id) DO NOTHING
-            """,
-            user_id, username
-        )
-    return await get_player(user_id)
+        row = await conn.stmts["upsert_player"].fetchrow(user_id, username)
+    player = Player(*row)
+    player_cache.put(player, version)
+    return player
+
+async def set_banned_until(user_id: int, until: int) -> None:
+    """Зберігає бан навіть для ID, якого ще немає в базі (0 - розбан)."""
+    async with pool.acquire() as conn:
+        await conn.stmts["set_banned_until"].fetch(user_id, until)
+    player_cache.invalidate((user_id,))
 
 async def update_player(user_id: int, **kwargs) -> None:
     if not kwargs: return
@@ -121,6 +301,7 @@ async def update_player(user_id: int, **kwargs) -> None:
     
     async with pool.acquire() as conn:
         await conn.execute(sql, *values)
+    player_cache.invalidate((user_id,))
 
 async def reset_player_stats(user_id: int) -> None:
     async with pool.acquire() as conn:
@@ -132,59 +313,281 @@ async def reset_player_stats(user_id: int) -> None:
             """, 
             user_id
         )
+    player_cache.invalidate((user_id,))
+
+async def get_banned_users(now: int) -> List[Tuple[int, int]]:
+    """Повертає (user_id, banned_until) для всіх чинних банів (-1 = назавжди)."""
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            "SELECT user_id, banned_until FROM players WHERE banned_until = -1 OR banned_until > $1",
+            now
+        )
+        return [(row['user_id'], row['banned_until']) for row in rows]
+
+async def iter_user_ids(after_user_id: int = 0, batch_size: int = 500) -> AsyncIterator[List[int]]:
+    """Віддає ID гравців пачками по зростанню user_id, починаючи після after_user_id.
+
+    Кожна пачка - окремий короткий запит по первинному ключу, тож з'єднання
+    не тримається на весь час розсилки, а курсор можна зберегти і продовжити.
+    """
+    while True:
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT user_id FROM players WHERE user_id > $1 ORDER BY user_id LIMIT $2",
+                after_user_id, batch_size
+            )
+        if not rows:
+            return
+        batch = [row['user_id'] for row in rows]
+        after_user_id = batch[-1]
+        yield batch
+
+async def count_users() -> int:
+    async with pool.acquire() as conn:
+        return await conn.fetchval("SELECT count(*) FROM players")
+
+async def create_broadcast_job(
+    text: str, admin_chat_id: int, status_message_id: int, total: int, owner: str, lease_until: int
+) -> int:
+    """Створює розсилку, одразу орендовану воркером owner."""
+    now = int(time.time())
+    async with pool.acquire() as conn:
+        return await conn.fetchval(
+            """
+            INSERT INTO broadcast_jobs (text, admin_chat_id, status_message_id, total, created_at, updated_at, owner, lease_until)
+            VALUES ($1, $2, $3, $4, $5, $5, $6, $7)
+            RETURNING id
+            """,
+            text, admin_chat_id, status_message_id, total, now, owner, lease_until
+        )
+
+async def claim_broadcast_jobs(owner: str, lease_until: int) -> List[Dict[str, Any]]:
+    """Забирає активні розсилки без живої оренди (нові після рестарту або покинуті іншим воркером)."""
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            UPDATE broadcast_jobs SET owner = $1, lease_until = $2
+            WHERE status = 'running' AND (owner IS NULL OR owner = $1 OR lease_until < $3)
+            RETURNING *
+            """,
+            owner, lease_until, int(time.time())
+        )
+        return sorted((dict(row) for row in rows), key=lambda job: job['id'])
+
+async def save_broadcast_progress(
+    job_id: int, owner: str, lease_until: int, last_user_id: int, sent: int, failed: int
+) -> bool:
+    """Зберігає курсор і продовжує оренду.
+
+    False - розсилку скасовано або її вже веде інший воркер: треба зупинитись.
+    """
+    async with pool.acquire() as conn:
+        saved = await conn.fetchval(
+            """
+            UPDATE broadcast_jobs
+            SET last_user_id = $4, sent = $5, failed = $6, updated_at = $7, lease_until = $3
+            WHERE id = $1 AND owner = $2 AND status = 'running'
+            RETURNING true
+            """,
+            job_id, owner, lease_until, last_user_id, sent, failed, int(time.time())
+        )
+        return bool(saved)
+
+async def renew_broadcast_lease(job_id: int, owner: str, lease_until: int) -> bool:
+    """Продовжує оренду посеред пачки. False - розсилку скасовано або забрано."""
+    async with pool.acquire() as conn:
+        renewed = await conn.fetchval(
+            """
+            UPDATE broadcast_jobs SET lease_until = $3
+            WHERE id = $1 AND owner = $2 AND status = 'running'
+            RETURNING true
+            """,
+            job_id, owner, lease_until
+        )
+        return bool(renewed)
+
+async def set_broadcast_status(job_id: int, status: str, owner: Optional[str] = None) -> bool:
+    """Переводить розсилку з 'running' у status. False, якщо вона вже не активна
+    (напр. 'done' після скасування) або, з owner, належить іншому воркеру."""
+    async with pool.acquire() as conn:
+        changed = await conn.fetchval(
+            """
+            UPDATE broadcast_jobs SET status = $2, updated_at = $3
+            WHERE id = $1 AND status = 'running' AND ($4::text IS NULL OR owner = $4)
+            RETURNING true
+            """,
+            job_id, status, int(time.time()), owner
+        )
+        return bool(changed)
+
+async def cancel_running_broadcasts() -> List[int]:
+    """Скасовує всі активні розсилки; воркери, що їх ведуть, зупиняться на наступній пачці."""
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            UPDATE broadcast_jobs SET status = 'cancelled', updated_at = $1
+            WHERE status = 'running' RETURNING id
+            """,
+            int(time.time())
+        )
+        return [row['id'] for row in rows]
 
-async def get_all_users() -> List[int]:
+GAME_LOG_COLUMNS = ("room_token", "location", "spy_id", "players", "winner", "timestamp")
+
+async def write_game_logs(rows: List[Tuple[str, str, int, List[int], str, int]]) -> None:
+    """Пише пачку рядків game_logs (у порядку GAME_LOG_COLUMNS) одним COPY."""
     async with pool.acquire() as conn:
-        rows = await conn.fetch("SELECT user_id FROM players")
-        return [row['user_id'] for row in rows]
+        await conn.copy_records_to_table("game_logs", records=rows, columns=GAME_LOG_COLUMNS)
+
+async def get_recent_games(
+    limit: int = 10,
+    user_id: Optional[int] = None,
+    before: Optional[Tuple[int, int]] = None
+) -> List[Dict[str, Any]]:
+    """Ігри від найновіших, за бажанням - лише ті, де грав user_id.
 
-async def get_recent_games(limit: int = 10) -> List[Dict[str, Any]]:
+    before - (timestamp, id) останньої показаної гри: наступна сторінка
+    продовжується з індексу від неї, без OFFSET і без скану таблиці.
+    """
+    conds, args = [], [limit]
+    if user_id is not None:
+        args.append(user_id)
+        conds.append(f"players @> ARRAY[${len(args)}::bigint]")
+    if before is not None:
+        args.extend(before)
+        conds.append(f"(timestamp, id) < (${len(args) - 1}, ${len(args)})")
+    where = f"WHERE {' AND '.join(conds)}" if conds else ""
     async with pool.acquire() as conn:
-        rows = await conn.fetch("SELECT * FROM game_logs ORDER BY timestamp DESC LIMIT $1", limit)
+        rows = await conn.fetch(
+            f"SELECT id, {', '.join(GAME_LOG_COLUMNS)} FROM game_logs {where} ORDER BY timestamp DESC, id DESC LIMIT $1",
+            *args
+        )
         return [dict(row) for row in rows]
 
-async def update_player_stats(user_id: int, is_spy: bool, is_winner: bool) -> tuple[int, int, int]:
-    player = await get_or_create_player(user_id)
-    old_level = player.level
-    
-    xp_gain = 0
-    if is_winner:
-        xp_gain = 20 if is_spy else 10
-        
-    new_total_xp = player.total_xp + xp_gain
-    new_level, current_progress_xp, xp_needed = get_level_from_xp(new_total_xp)
-    
+async def record_game_result(results: List[Tuple[int, bool, bool]]) -> Dict[int, Tuple[int, int, int]]:
+    """Записує статистику гри однією транзакцією.
+
+    results - список (user_id, is_spy, is_winner) для живих гравців.
+    Оновлює статистику всіх гравців одним UPDATE і сезонні підсумки,
+    повертає {user_id: (рівень, поточний_xp, xp_до_наступного)}.
+    Рядок історії пише utils.game_log окремо, пачками.
+    """
+    if not results:
+        return {}
+    results = sorted(results)  # стабільний порядок блокувань рядків між транзакціями
+    user_ids = [uid for uid, _, _ in results]
+
     async with pool.acquire() as conn:
-        sql = """
-            UPDATE players 
-            SET total_xp = $1, 
-                level = $2, 
-                games_played = games_played + 1,
-                spy_wins = spy_wins + CASE WHEN $3 THEN 1 ELSE 0 END,
-                civilian_wins = civilian_wins + CASE WHEN $4 THEN 1 ELSE 0 END
-            WHERE user_id = $5
-        """
-        # Параметри: new_xp, new_lvl, is_spy_win, is_civ_win, uid
-        is_spy_win = (is_winner and is_spy)
-        is_civ_win = (is_winner and not is_spy)
-        
-        await conn.execute(sql, new_total_xp, new_level, is_spy_win, is_civ_win, user_id)
-        
-    return old_level, current_progress_xp, xp_needed
+        async with conn.transaction():
+            # Створюємо відсутніх і одразу блокуємо рядки (DO UPDATE повертає і старі рядки)
+            rows = await conn.fetch(
+                """
+                INSERT INTO players (user_id, username, level)
+                SELECT uid, '', 1 FROM unnest($1::bigint[]) AS uid
+                ON CONFLICT (user_id) DO UPDATE SET user_id = EXCLUDED.user_id
+                RETURNING user_id, total_xp
+                """,
+                user_ids
+            )
+            current_xp = {row['user_id']: row['total_xp'] for row in rows}
 
-async def get_player_stats(user_id: int) -> Optional[Dict[str, Any]]:
-    player = await get_player(user_id)
-    if not player: return None
-    
-    # Авто-фікс рівня
-    calc_level, cur_xp, need = get_level_from_xp(player.total_xp)
-    if calc_level != player.level:
-        await update_player(user_id, level=calc_level)
-        player.level = calc_level
-        lvl, cur, need = calc_level, cur_xp, need
-    else:
-        lvl, cur, need = player.level_info
+            new_xp, new_levels, spy_win_flags, civ_win_flags, xp_gains = [], [], [], [], []
+            level_info = {}
+            for uid, is_spy, is_winner in results:
+                xp_gain = (XP_SPY_WIN if is_spy else XP_CIVILIAN_WIN) if is_winner else 0
+                total_xp = current_xp[uid] + xp_gain
+                level_info[uid] = get_level_from_xp(total_xp)
+                xp_gains.append(xp_gain)
+                new_xp.append(total_xp)
+                new_levels.append(level_info[uid][0])
+                spy_win_flags.append(is_winner and is_spy)
+                civ_win_flags.append(is_winner and not is_spy)
+
+            await conn.execute(
+                """
+                UPDATE players AS p
+                SET total_xp = d.total_xp,
+                    level = d.level,
+                    games_played = p.games_played + 1,
+                    spy_wins = p.spy_wins + d.spy_win::int,
+                    civilian_wins = p.civilian_wins + d.civ_win::int
+                FROM unnest($1::bigint[], $2::int[], $3::int[], $4::bool[], $5::bool[])
+                    AS d(user_id, total_xp, level, spy_win, civ_win)
+                WHERE p.user_id = d.user_id
+                """,
+                user_ids, new_xp, new_levels, spy_win_flags, civ_win_flags
+            )
 
+            # Тижневий і місячний сезон - у тій самій транзакції, тож таблиці лідерів не розходяться зі статистикою
+            await conn.execute(
+                """
+                INSERT INTO player_seasons AS s (season, user_id, xp, games_played, spy_wins, civilian_wins)
+                SELECT season, d.user_id, d.xp, 1, d.spy_win::int, d.civ_win::int
+                FROM unnest($1::text[]) AS season
+                CROSS JOIN unnest($2::bigint[], $3::int[], $4::bool[], $5::bool[]) AS d(user_id, xp, spy_win, civ_win)
+                ON CONFLICT (season, user_id) DO UPDATE
+                SET xp = s.xp + EXCLUDED.xp,
+                    games_played = s.games_played + 1,
+                    spy_wins = s.spy_wins + EXCLUDED.spy_wins,
+                    civilian_wins = s.civilian_wins + EXCLUDED.civilian_wins
+                """,
+                list(season_keys(time.time())), user_ids, xp_gains, spy_win_flags, civ_win_flags
+            )
+
+    player_cache.invalidate(user_ids)
+    return level_info
+
+# Таблиці лідерів: назва -> (таблиця з аліасом, колонка значення, чи сезонна)
+LEADERBOARDS = {
+    "xp": ("players p", "p.total_xp", False),
+    "spy": ("players p", "p.spy_wins", False),
+    "week": ("player_seasons s", "s.xp", True),
+    "month": ("player_seasons s", "s.xp", True),
+}
+
+async def get_leaderboard(board: str, limit: int, season: str = "") -> List[Tuple[int, str, int]]:
+    """Топ `limit` гравців дошки: (user_id, username, значення).
+
+    Читається з початку індексу (значення DESC, user_id), тож коштує O(limit)
+    незалежно від кількості гравців. Гравці з нулем у топ не потрапляють.
+    """
+    source, value, seasonal = LEADERBOARDS[board]
+    if seasonal:
+        source += " JOIN players p USING (user_id)"
+    sql = f"""
+        SELECT p.user_id, p.username, {value} AS value
+        FROM {source}
+        WHERE {"s.season = $2 AND" if seasonal else ""} {value} > 0
+        ORDER BY {value} DESC, p.user_id
+        LIMIT $1
+    """
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(sql, limit, *((season,) if seasonal else ()))
+    return [(row['user_id'], row['username'], row['value']) for row in rows]
+
+async def get_leaderboard_rank(board: str, user_id: int, limit: int, season: str = "") -> Optional[Tuple[int, int]]:
+    """(значення гравця, скільки гравців попереду) або None, якщо гравця на дошці немає.
+
+    Тих, хто попереду, рахуємо по індексу не далі ніж до `limit`, щоб запит
+    гравця з хвоста не проходив увесь індекс.
+    """
+    source, value, seasonal = LEADERBOARDS[board]
+    alias = source.split()[1]
+    season_filter = "s.season = $3 AND" if seasonal else ""
+    sql = f"""
+        SELECT mine.value, (
+            SELECT count(*) FROM (
+                SELECT 1 FROM {source} WHERE {season_filter} {value} > mine.value LIMIT $2
+            ) AS ahead
+        ) AS ahead
+        FROM (SELECT {value} AS value FROM {source} WHERE {season_filter} {alias}.user_id = $1) AS mine
+        WHERE mine.value > 0
+    """
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(sql, user_id, limit, *((season,) if seasonal else ()))
+    return (row['value'], row['ahead']) if row else None
+
+def player_stats(player: Player) -> Dict[str, Any]:
     return {
         'user_id': player.user_id,
         'username': player.username,
@@ -192,6 +595,59 @@ async def get_player_stats(user_id: int) -> Optional[Dict[str, Any]]:
         'spy_wins': player.spy_wins,
         'civilian_wins': player.civilian_wins,
         'total_xp': player.total_xp,
-        'level_info': (lvl, cur, need),
+        'level_info': player.level_info,
         'banned_until': player.banned_until
-    }
\ No newline at end of file
+    }
+
+async def get_player_stats(user_id: int) -> Optional[Dict[str, Any]]:
+    """Статистика гравця (з кешу, якщо є). Лише читає: рівень рахується з XP."""
+    player = await get_player(user_id)
+    return player_stats(player) if player else None
+
+# Ключ advisory lock для repair_player_levels (довільне стале число)
+_LEVEL_REPAIR_LOCK = 0x5b1e7e1
+
+async def repair_player_levels(batch_size: int = 1000) -> int:
+    """Виправляє збережений рівень там, де він не відповідає XP (напр. після зміни формули).
+
+    Раніше це робив get_player_stats на кожному читанні; тепер - один фоновий
+    прохід при старті, пачками по первинному ключу. Advisory lock не дає
+    кільком воркерам, що стартують разом, сканувати таблицю паралельно.
+    Повертає кількість виправлених.
+    """
+    fixed, after = 0, 0
+    try:
+        async with pool.acquire() as conn:
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", _LEVEL_REPAIR_LOCK):
+                logger.info("Level repair is already running on another worker, skipping")
+                return 0
+            try:
+                while True:
+                    rows = await conn.fetch(
+                        "SELECT user_id, total_xp, level FROM players WHERE user_id > $1 ORDER BY user_id LIMIT $2",
+                        after, batch_size
+                    )
+                    if not rows:
+                        break
+                    after = rows[-1]['user_id']
+                    stale = [(row['user_id'], get_level_from_xp(row['total_xp'])[0]) for row in rows]
+                    stale = [(uid, level) for (uid, level), row in zip(stale, rows) if level != row['level']]
+                    if not stale:
+                        continue
+                    await conn.execute(
+                        """
+                        UPDATE players AS p SET level = d.level
+                        FROM unnest($1::bigint[], $2::int[]) AS d(user_id, level)
+                        WHERE p.user_id = d.user_id
+                        """,
+                        [uid for uid, _ in stale], [level for _, level in stale]
+                    )
+                    player_cache.invalidate([uid for uid, _ in stale])
+                    fixed += len(stale)
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", _LEVEL_REPAIR_LOCK)
+    except Exception as e:
+        logger.error(f"Level repair stopped after {fixed} players: {e}")
+    if fixed:
+        logger.info(f"Repaired stored level of {fixed} players")
+    return fixed
@@ -1,27 +1,43 @@
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Set
+from bisect import bisect_right
+from dataclasses import dataclass, fields
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# _XP_FOR_LEVEL[level] - скільки XP треба, щоб пройти рівень level (індекс 0 - заглушка)
+# _LEVEL_START[level - 1] - сумарний XP, з якого починається рівень level
+_XP_FOR_LEVEL: List[int] = [0, 20]
+_LEVEL_START: List[int] = [0, 20]
+
+def _extend_xp_table(max_level: int = 0, max_xp: int = 0) -> None:
+    """Дораховує таблицю до рівня max_level і поки сумарний XP не перевищить max_xp."""
+    while len(_XP_FOR_LEVEL) <= max_level or _LEVEL_START[-1] <= max_xp:
+        level = len(_XP_FOR_LEVEL)
+        coef = max(1.2, 1.48 - (level - 2) * 0.02)
+        xp = int(_XP_FOR_LEVEL[-1] * coef)
+        _XP_FOR_LEVEL.append(xp)
+        _LEVEL_START.append(_LEVEL_START[-1] + xp)
+
+_extend_xp_table(max_level=100)
 
 def calculate_xp_for_level(level: int) -> int:
     """Розраховує необхідний досвід для наступного рівня"""
     if level < 1: return 0
-    if level == 1: return 20 
-    
-    min_coef = 1.2
-    max_coef = 1.48
-    coef = max(min_coef, max_coef - (level - 2) * 0.02)
-    return int(calculate_xp_for_level(level - 1) * coef)
+    if level >= len(_XP_FOR_LEVEL):
+        _extend_xp_table(max_level=level)
+    return _XP_FOR_LEVEL[level]
 
 def get_level_from_xp(total_xp: int) -> tuple[int, int, int]:
     """Повертає (рівень, поточний_xp, xp_до_наступного)"""
-    level = 1
-    xp_needed = calculate_xp_for_level(level)
-    
-    while total_xp >= xp_needed:
-        total_xp -= xp_needed
-        level += 1
-        xp_needed = calculate_xp_for_level(level)
-    
-    return level, total_xp, xp_needed
+    if total_xp >= _LEVEL_START[-1]:
+        _extend_xp_table(max_xp=total_xp)
+    level = bisect_right(_LEVEL_START, total_xp) or 1
+    return level, total_xp - _LEVEL_START[level - 1], _XP_FOR_LEVEL[level]
+
+def season_keys(ts: float) -> Tuple[str, str]:
+    """Ключі сезонів (тиждень ISO, місяць) для моменту ts, за UTC: ('2026-W42', '2026-10')."""
+    day = datetime.fromtimestamp(ts, timezone.utc)
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}", f"{day.year}-{day.month:02d}"
 
 @dataclass
 class UserState:
@@ -40,8 +56,8 @@ class Player:
     
     @property
     def level_info(self):
-        _, current_xp, xp_needed = get_level_from_xp(self.total_xp)
-        return self.level, current_xp, xp_needed
+        """(рівень, поточний_xp, xp_до_наступного) - завжди з total_xp, навіть якщо level у БД застарів."""
+        return get_level_from_xp(self.total_xp)
 
 @dataclass
 class Room:
@@ -64,6 +80,10 @@ class Room:
     spy_guess: str = ""
     game_ended: bool = False
     end_time: int = 0
+    vote_end_time: int = 0
+    vote_forced: bool = False
+    guess_end_time: int = 0
+    early_vote_end_time: int = 0
     last_activity: int = 0
 
     def __post_init__(self):
@@ -73,4 +93,27 @@ class Room:
         if self.player_votes is None: self.player_votes = {}
         if self.early_votes is None: self.early_votes = set()
         if self.votes_yes is None: self.votes_yes = set()
-        if self.votes_no is None: self.votes_no = set()
\ No newline at end of file
+        if self.votes_no is None: self.votes_no = set()
+
+    # Поля з int-ключами/елементами, які в JSON стають рядками/списками
+    _ID_DICTS = ("players", "player_callsigns", "player_roles", "player_votes")
+    _ID_SETS = ("votes_yes", "votes_no", "early_votes")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-сумісне представлення кімнати (для спільного стану і знімків)."""
+        data = {f.name: getattr(self, f.name) for f in fields(self)}
+        for name in self._ID_DICTS:
+            data[name] = {str(k): v for k, v in data[name].items()}
+        for name in self._ID_SETS:
+            data[name] = sorted(data[name])
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Room":
+        known = {f.name for f in fields(cls)}
+        data = {k: v for k, v in data.items() if k in known}
+        for name in cls._ID_DICTS:
+            data[name] = {int(k): v for k, v in (data.get(name) or {}).items()}
+        for name in cls._ID_SETS:
+            data[name] = set(data.get(name) or ())
+        return cls(**data)
\ No newline at end of file
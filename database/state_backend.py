@@ -0,0 +1,790 @@
+"""Спільний стан гри: кімнати, черга матчмейкінгу і FSM.
+
+MemoryStateBackend - стан у пам'яті процесу (один воркер, як раніше).
+PostgresStateBackend - стан у PostgreSQL, щоб кілька воркерів обслуговували
+одного бота. Вибір через змінну оточення STATE_BACKEND=memory|postgres.
+
+Склад кімнати і голоси змінюються лише атомарними операціями (join/leave/vote).
+save_room() записує решту полів кімнати і ці поля не перезаписує, тож
+паралельний вхід гравця не загубиться через збереження фази гри.
+
+Таймери гри живуть у scheduler процесу. Щоб після рестарту їх не відновлював
+кожен воркер, кімнату орендує один власник (claim_rooms); оренду треба
+продовжувати, інакше кімнату з її таймерами підхопить інший воркер.
+Старт і завершення гри - атомарні start_game()/finish_game(), і save_room()
+game_started не пише, тож навіть таймер, що спрацював на двох воркерах,
+завершить гру один раз, а збереження старої копії її не "воскресить".
+"""
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+
+from database import crud
+from database.models import Room
+
+logger = logging.getLogger(__name__)
+
+# Результати join_room
+JOIN_OK = "ok"
+JOIN_MISSING = "missing"
+JOIN_FULL = "full"
+JOIN_STARTED = "started"
+JOIN_ALREADY = "already"
+
+# (user_id, enqueued_at, message_id)
+QueueEntry = Tuple[int, float, int]
+
+PHASES = ("lobby", "playing", "voting", "guessing")
+
+
+def room_phase(room: Room) -> str:
+    if not room.game_started:
+        return "lobby"
+    if room.spy_guessed:
+        return "guessing"
+    return "voting" if room.voting_started else "playing"
+
+
+class StateBackend(ABC):
+    # True - стан переживає рестарт процесу сам, знімки кімнат не потрібні
+    durable = False
+
+    # --- Кімнати ---
+    async def setup(self) -> None:
+        """Створює таблиці тощо. Викликається на старті після init_db()."""
+
+    @abstractmethod
+    async def get_room(self, token: str) -> Optional[Room]: ...
+
+    @abstractmethod
+    async def find_user_room(self, user_id: int) -> Optional[Room]: ...
+
+    @abstractmethod
+    async def create_room(self, room: Room, owner: Optional[str] = None, lease_until: int = 0) -> bool:
+        """Атомарно додає кімнату (одразу орендовану owner). False, якщо токен уже зайнятий."""
+
+    @abstractmethod
+    async def save_room(self, room: Room) -> None: ...
+
+    @abstractmethod
+    async def delete_room(self, token: str) -> Optional[Room]: ...
+
+    @abstractmethod
+    async def list_rooms(self) -> List[Room]: ...
+
+    @abstractmethod
+    async def count_rooms(self) -> int: ...
+
+    @abstractmethod
+    async def count_room_users(self) -> int: ...
+
+    @abstractmethod
+    async def count_rooms_by_phase(self) -> Dict[str, int]:
+        """Кількість кімнат по фазах (PHASES) без читання самих кімнат."""
+
+    async def touch_room(self, token: str, ts: int) -> None:
+        """Фіксує активність у кімнаті без зміни її стану (напр. повідомлення в чаті)."""
+
+    @abstractmethod
+    async def claim_rooms(self, owner: str, lease_until: int, now: float) -> List[Room]:
+        """Продовжує оренду кімнат owner і забирає нічиї або прострочені. Повертає всі його кімнати."""
+
+    # --- Атомарні зміни кімнати (оновлюють і переданий об'єкт room) ---
+    @abstractmethod
+    async def join_room(self, room: Room, user_id: int, name: str, max_players: int) -> str:
+        """Вхід у лобі з перевіркою місць і того, що гра ще не почалась."""
+
+    @abstractmethod
+    async def add_player(self, room: Room, user_id: int, name: str) -> None:
+        """Додає гравця без перевірок (створення кімнати, боти)."""
+
+    @abstractmethod
+    async def remove_player(self, room: Room, user_id: int) -> None: ...
+
+    @abstractmethod
+    async def cast_vote(self, room: Room, voter_id: int, target_id: int) -> None: ...
+
+    @abstractmethod
+    async def reset_votes(self, room: Room) -> None: ...
+
+    @abstractmethod
+    async def cast_early_vote(self, room: Room, user_id: int, yes: bool) -> None: ...
+
+    @abstractmethod
+    async def reset_early_votes(self, room: Room) -> None: ...
+
+    @abstractmethod
+    async def start_game(self, room: Room) -> bool:
+        """Атомарно ставить game_started і зберігає решту полів кімнати. False, якщо гра вже йде."""
+
+    @abstractmethod
+    async def finish_game(self, room: Room) -> bool:
+        """Атомарно знімає game_started. False, якщо гру вже завершили."""
+
+    # --- Черга матчмейкінгу ---
+    @abstractmethod
+    async def queue_push(self, user_id: int, message_id: int, enqueued_at: float) -> bool: ...
+
+    @abstractmethod
+    async def queue_remove(self, user_id: int) -> bool: ...
+
+    @abstractmethod
+    async def queue_take(self, count: int, min_count: int) -> List[int]:
+        """Атомарно забирає до count перших гравців, але лише якщо їх хоча б min_count."""
+
+    @abstractmethod
+    async def queue_contains(self, user_id: int) -> bool: ...
+
+    @abstractmethod
+    async def queue_len(self) -> int: ...
+
+    @abstractmethod
+    async def queue_head(self) -> Optional[QueueEntry]: ...
+
+    @abstractmethod
+    async def queue_entries(self) -> List[QueueEntry]: ...
+
+    # --- FSM ---
+    @abstractmethod
+    async def fsm_get(self, key: str) -> Tuple[Optional[str], Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def fsm_set_state(self, key: str, state: Optional[str]) -> None: ...
+
+    @abstractmethod
+    async def fsm_set_data(self, key: str, data: Dict[str, Any]) -> None: ...
+
+
+class MemoryStateBackend(StateBackend):
+    """Усе в пам'яті; кімнати - живі об'єкти, тож save_room нічого не робить."""
+
+    def __init__(self) -> None:
+        self._rooms: Dict[str, Room] = {}
+        # Зворотний індекс user_id -> token. Боти (від'ємні ID) однакові
+        # в різних кімнатах, тому в індекс не потрапляють.
+        self._user_room: Dict[int, str] = {}
+        self._queue: "OrderedDict[int, Tuple[float, int]]" = OrderedDict()
+        self._fsm: Dict[str, Tuple[Optional[str], Dict[str, Any]]] = {}
+        # token -> (власник, оренда до)
+        self._leases: Dict[str, Tuple[Optional[str], int]] = {}
+
+    async def get_room(self, token: str) -> Optional[Room]:
+        return self._rooms.get(token)
+
+    async def find_user_room(self, user_id: int) -> Optional[Room]:
+        token = self._user_room.get(user_id)
+        return self._rooms.get(token) if token is not None else None
+
+    async def create_room(self, room: Room, owner: Optional[str] = None, lease_until: int = 0) -> bool:
+        if room.token in self._rooms:
+            return False
+        self._rooms[room.token] = room
+        self._leases[room.token] = (owner, lease_until)
+        for uid in room.players:
+            self._index(uid, room.token)
+        return True
+
+    async def save_room(self, room: Room) -> None:
+        pass
+
+    async def delete_room(self, token: str) -> Optional[Room]:
+        room = self._rooms.pop(token, None)
+        self._leases.pop(token, None)
+        if room:
+            for uid in room.players:
+                if self._user_room.get(uid) == token:
+                    del self._user_room[uid]
+        return room
+
+    async def list_rooms(self) -> List[Room]:
+        return list(self._rooms.values())
+
+    async def count_rooms(self) -> int:
+        return len(self._rooms)
+
+    async def count_room_users(self) -> int:
+        return len(self._user_room)
+
+    async def count_rooms_by_phase(self) -> Dict[str, int]:
+        counts = dict.fromkeys(PHASES, 0)
+        for room in self._rooms.values():
+            counts[room_phase(room)] += 1
+        return counts
+
+    async def claim_rooms(self, owner: str, lease_until: int, now: float) -> List[Room]:
+        claimed = []
+        for token, room in self._rooms.items():
+            holder, until = self._leases.get(token, (None, 0))
+            if holder is None or holder == owner or until < now:
+                self._leases[token] = (owner, lease_until)
+                claimed.append(room)
+        return claimed
+
+    def _index(self, user_id: int, token: str) -> None:
+        if user_id > 0:
+            self._user_room[user_id] = token
+
+    async def join_room(self, room: Room, user_id: int, name: str, max_players: int) -> str:
+        if self._rooms.get(room.token) is not room:
+            return JOIN_MISSING
+        if user_id in room.players:
+            return JOIN_ALREADY
+        if len(room.players) >= max_players:
+            return JOIN_FULL
+        if room.game_started:
+            return JOIN_STARTED
+        await self.add_player(room, user_id, name)
+        return JOIN_OK
+
+    async def add_player(self, room: Room, user_id: int, name: str) -> None:
+        room.players[user_id] = name
+        self._index(user_id, room.token)
+
+    async def remove_player(self, room: Room, user_id: int) -> None:
+        room.players.pop(user_id, None)
+        if self._user_room.get(user_id) == room.token:
+            del self._user_room[user_id]
+
+    async def cast_vote(self, room: Room, voter_id: int, target_id: int) -> None:
+        room.player_votes[voter_id] = target_id
+
+    async def reset_votes(self, room: Room) -> None:
+        room.player_votes = {}
+
+    async def cast_early_vote(self, room: Room, user_id: int, yes: bool) -> None:
+        (room.votes_yes if yes else room.votes_no).add(user_id)
+
+    async def reset_early_votes(self, room: Room) -> None:
+        room.votes_yes = set()
+        room.votes_no = set()
+
+    async def start_game(self, room: Room) -> bool:
+        if room.game_started:
+            return False
+        room.game_started = True
+        return True
+
+    async def finish_game(self, room: Room) -> bool:
+        # Без await між перевіркою і записом - атомарно в межах event loop
+        if not room.game_started:
+            return False
+        room.game_started = False
+        return True
+
+    async def queue_push(self, user_id: int, message_id: int, enqueued_at: float) -> bool:
+        if user_id in self._queue:
+            return False
+        self._queue[user_id] = (enqueued_at, message_id)
+        return True
+
+    async def queue_remove(self, user_id: int) -> bool:
+        return self._queue.pop(user_id, None) is not None
+
+    async def queue_take(self, count: int, min_count: int) -> List[int]:
+        if len(self._queue) < min_count:
+            return []
+        players = []
+        while self._queue and len(players) < count:
+            uid, _ = self._queue.popitem(last=False)
+            players.append(uid)
+        return players
+
+    async def queue_contains(self, user_id: int) -> bool:
+        return user_id in self._queue
+
+    async def queue_len(self) -> int:
+        return len(self._queue)
+
+    async def queue_head(self) -> Optional[QueueEntry]:
+        for uid, (enqueued_at, message_id) in self._queue.items():
+            return uid, enqueued_at, message_id
+        return None
+
+    async def queue_entries(self) -> List[QueueEntry]:
+        return [(uid, ts, msg_id) for uid, (ts, msg_id) in self._queue.items()]
+
+    async def fsm_get(self, key: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        state, data = self._fsm.get(key, (None, {}))
+        return state, dict(data)
+
+    async def fsm_set_state(self, key: str, state: Optional[str]) -> None:
+        _, data = self._fsm.get(key, (None, {}))
+        self._set_fsm(key, state, data)
+
+    async def fsm_set_data(self, key: str, data: Dict[str, Any]) -> None:
+        state, _ = self._fsm.get(key, (None, {}))
+        self._set_fsm(key, state, dict(data))
+
+    def _set_fsm(self, key: str, state: Optional[str], data: Dict[str, Any]) -> None:
+        # Порожні записи не тримаємо, щоб словник не ріс з кожним користувачем
+        if state is None and not data:
+            self._fsm.pop(key, None)
+        else:
+            self._fsm[key] = (state, data)
+
+
+def _players_from_json(raw) -> Dict[int, Any]:
+    return {int(k): v for k, v in json.loads(raw).items()}
+
+
+def _room_from_row(row) -> Room:
+    # Атомарні операції і touch_room не переписують документ, лише updated_at
+    room = Room.from_dict(json.loads(row['data']))
+    room.last_activity = max(room.last_activity, row['updated_at'] or 0)
+    return room
+
+
+class PostgresStateBackend(StateBackend):
+    """Спільний стан у PostgreSQL (той самий пул, що й database.crud).
+
+    Кімната - JSONB-документ у state_rooms; state_room_members - індекс
+    user_id -> token; черга - state_queue; FSM - state_fsm.
+    Оренда кімнати - колонки owner/lease_until поруч із документом.
+    updated_at оновлює кожна зміна кімнати, тож остання активність видна всім воркерам.
+    """
+
+    durable = True
+
+    # Поля, які змінюють лише атомарні операції; save_room бере їх з БД
+    _ATOMIC_FIELDS = ("players", "player_votes", "votes_yes", "votes_no", "game_started")
+
+    async def setup(self) -> None:
+        async with crud.pool.acquire() as conn:
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS state_rooms (
+                    token TEXT PRIMARY KEY,
+                    data JSONB NOT NULL,
+                    updated_at BIGINT
+                );
+                CREATE TABLE IF NOT EXISTS state_room_members (
+                    user_id BIGINT PRIMARY KEY,
+                    token TEXT NOT NULL REFERENCES state_rooms (token) ON DELETE CASCADE
+                );
+                ALTER TABLE state_rooms ADD COLUMN IF NOT EXISTS owner TEXT;
+                ALTER TABLE state_rooms ADD COLUMN IF NOT EXISTS lease_until BIGINT NOT NULL DEFAULT 0;
+                CREATE INDEX IF NOT EXISTS state_room_members_token ON state_room_members (token);
+                CREATE TABLE IF NOT EXISTS state_queue (
+                    user_id BIGINT PRIMARY KEY,
+                    message_id BIGINT,
+                    enqueued_at DOUBLE PRECISION NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS state_queue_order ON state_queue (enqueued_at);
+                CREATE TABLE IF NOT EXISTS state_fsm (
+                    key TEXT PRIMARY KEY,
+                    state TEXT,
+                    data JSONB NOT NULL DEFAULT '{}'
+                );
+            ''')
+        logger.info("✅ Shared state backend: PostgreSQL")
+
+    # --- Кімнати ---
+    async def get_room(self, token: str) -> Optional[Room]:
+        async with crud.pool.acquire() as conn:
+            row = await conn.fetchrow("SELECT data, updated_at FROM state_rooms WHERE token = $1", token)
+        return _room_from_row(row) if row else None
+
+    async def find_user_room(self, user_id: int) -> Optional[Room]:
+        async with crud.pool.acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                SELECT r.data, r.updated_at FROM state_room_members m JOIN state_rooms r USING (token)
+                WHERE m.user_id = $1
+                """,
+                user_id
+            )
+        return _room_from_row(row) if row else None
+
+    async def create_room(self, room: Room, owner: Optional[str] = None, lease_until: int = 0) -> bool:
+        async with crud.pool.acquire() as conn:
+            async with conn.transaction():
+                created = await conn.fetchval(
+                    """
+                    INSERT INTO state_rooms (token, data, updated_at, owner, lease_until) VALUES ($1, $2::jsonb, $3, $4, $5)
+                    ON CONFLICT (token) DO NOTHING RETURNING true
+                    """,
+                    room.token, json.dumps(room.to_dict()), int(time.time()), owner, lease_until
+                )
+                if not created:
+                    return False
+                humans = [uid for uid in room.players if uid > 0]
+                if humans:
+                    await conn.execute(
+                        """
+                        INSERT INTO state_room_members (user_id, token) SELECT unnest($1::bigint[]), $2
+                        ON CONFLICT (user_id) DO UPDATE SET token = EXCLUDED.token
+                        """,
+                        humans, room.token
+                    )
+        return True
+
+    def _plain_fields(self, room: Room) -> str:
+        data = room.to_dict()
+        for name in self._ATOMIC_FIELDS:
+            data.pop(name)
+        return json.dumps(data)
+
+    async def save_room(self, room: Room) -> None:
+        async with crud.pool.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE state_rooms
+                SET data = data || $2::jsonb, updated_at = $3
+                WHERE token = $1
+                """,
+                room.token, self._plain_fields(room), int(time.time())
+            )
+
+    async def delete_room(self, token: str) -> Optional[Room]:
+        async with crud.pool.acquire() as conn:
+            raw = await conn.fetchval("DELETE FROM state_rooms WHERE token = $1 RETURNING data", token)
+        return Room.from_dict(json.loads(raw)) if raw else None
+
+    async def list_rooms(self) -> List[Room]:
+        async with crud.pool.acquire() as conn:
+            rows = await conn.fetch("SELECT data, updated_at FROM state_rooms")
+        return [_room_from_row(row) for row in rows]
+
+    async def count_rooms(self) -> int:
+        async with crud.pool.acquire() as conn:
+            return await conn.fetchval("SELECT count(*) FROM state_rooms")
+
+    async def count_room_users(self) -> int:
+        async with crud.pool.acquire() as conn:
+            return await conn.fetchval("SELECT count(*) FROM state_room_members")
+
+    async def count_rooms_by_phase(self) -> Dict[str, int]:
+        # Те саме, що room_phase(), але агрегатом у БД: документи кімнат не передаються
+        async with crud.pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT CASE
+                    WHEN NOT coalesce((data->>'game_started')::boolean, false) THEN 'lobby'
+                    WHEN coalesce((data->>'spy_guessed')::boolean, false) THEN 'guessing'
+                    WHEN coalesce((data->>'voting_started')::boolean, false) THEN 'voting'
+                    ELSE 'playing'
+                END AS phase, count(*) AS n
+                FROM state_rooms GROUP BY 1
+                """
+            )
+        counts = dict.fromkeys(PHASES, 0)
+        counts.update((row['phase'], row['n']) for row in rows)
+        return counts
+
+    async def claim_rooms(self, owner: str, lease_until: int, now: float) -> List[Room]:
+        async with crud.pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                UPDATE state_rooms SET owner = $1, lease_until = $2
+                WHERE owner IS NULL OR owner = $1 OR lease_until < $3
+                RETURNING data, updated_at
+                """,
+                owner, lease_until, now
+            )
+        return [_room_from_row(row) for row in rows]
+
+    async def touch_room(self, token: str, ts: int) -> None:
+        async with crud.pool.acquire() as conn:
+            await conn.execute(
+                "UPDATE state_rooms SET updated_at = GREATEST(updated_at, $2) WHERE token = $1", token, ts
+            )
+
+    # --- Атомарні зміни ---
+    async def join_room(self, room: Room, user_id: int, name: str, max_players: int) -> str:
+        async with crud.pool.acquire() as conn:
+            async with conn.transaction():
+                row = await conn.fetchrow(
+                    """
+                    SELECT data->'players' AS players, (data->>'game_started')::boolean AS started
+                    FROM state_rooms WHERE token = $1 FOR UPDATE
+                    """,
+                    room.token
+                )
+                if row is None:
+                    return JOIN_MISSING
+                room.players = _players_from_json(row['players'])
+                if user_id in room.players:
+                    return JOIN_ALREADY
+                if len(room.players) >= max_players:
+                    return JOIN_FULL
+                if row['started']:
+                    return JOIN_STARTED
+                await self._add_player(conn, room, user_id, name)
+        return JOIN_OK
+
+    async def add_player(self, room: Room, user_id: int, name: str) -> None:
+        async with crud.pool.acquire() as conn:
+            async with conn.transaction():
+                await self._add_player(conn, room, user_id, name)
+
+    async def _add_player(self, conn, room: Room, user_id: int, name: str) -> None:
+        raw = await conn.fetchval(
+            """
+            UPDATE state_rooms
+            SET updated_at = extract(epoch FROM now())::bigint,
+                data = jsonb_set(data, ARRAY['players', $2::text], to_jsonb($3::text))
+            WHERE token = $1 RETURNING data->'players'
+            """,
+            room.token, str(user_id), name
+        )
+        if raw is not None:
+            room.players = _players_from_json(raw)
+        if user_id > 0:
+            await conn.execute(
+                """
+                INSERT INTO state_room_members (user_id, token) VALUES ($1, $2)
+                ON CONFLICT (user_id) DO UPDATE SET token = EXCLUDED.token
+                """,
+                user_id, room.token
+            )
+
+    async def remove_player(self, room: Room, user_id: int) -> None:
+        async with crud.pool.acquire() as conn:
+            async with conn.transaction():
+                raw = await conn.fetchval(
+                    """
+                    UPDATE state_rooms
+                    SET updated_at = extract(epoch FROM now())::bigint,
+                        data = jsonb_set(data, '{players}', (data->'players') - $2::text)
+                    WHERE token = $1 RETURNING data->'players'
+                    """,
+                    room.token, str(user_id)
+                )
+                await conn.execute(
+                    "DELETE FROM state_room_members WHERE user_id = $1 AND token = $2",
+                    user_id, room.token
+                )
+        room.players = _players_from_json(raw) if raw is not None else {
+            uid: name for uid, name in room.players.items() if uid != user_id
+        }
+
+    async def cast_vote(self, room: Room, voter_id: int, target_id: int) -> None:
+        async with crud.pool.acquire() as conn:
+            raw = await conn.fetchval(
+                """
+                UPDATE state_rooms
+                SET updated_at = extract(epoch FROM now())::bigint,
+                    data = jsonb_set(data, ARRAY['player_votes', $2::text], to_jsonb($3::bigint))
+                WHERE token = $1 RETURNING data->'player_votes'
+                """,
+                room.token, str(voter_id), target_id
+            )
+        if raw is not None:
+            room.player_votes = _players_from_json(raw)
+
+    async def reset_votes(self, room: Room) -> None:
+        async with crud.pool.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE state_rooms
+                SET updated_at = extract(epoch FROM now())::bigint,
+                    data = jsonb_set(data, '{player_votes}', '{}'::jsonb)
+                WHERE token = $1
+                """,
+                room.token
+            )
+        room.player_votes = {}
+
+    async def cast_early_vote(self, room: Room, user_id: int, yes: bool) -> None:
+        field = "votes_yes" if yes else "votes_no"
+        async with crud.pool.acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                UPDATE state_rooms
+                SET updated_at = extract(epoch FROM now())::bigint,
+                    data = jsonb_set(
+                        data, ARRAY[$2::text],
+                        CASE WHEN data->$2 @> to_jsonb($3::bigint) THEN data->$2
+                             ELSE coalesce(data->$2, '[]'::jsonb) || to_jsonb($3::bigint) END
+                    )
+                WHERE token = $1 RETURNING data->'votes_yes' AS yes, data->'votes_no' AS no
+                """,
+                room.token, field, user_id
+            )
+        if row is not None:
+            room.votes_yes = set(json.loads(row['yes']))
+            room.votes_no = set(json.loads(row['no']))
+
+    async def reset_early_votes(self, room: Room) -> None:
+        async with crud.pool.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE state_rooms
+                SET updated_at = extract(epoch FROM now())::bigint,
+                    data = data || '{"votes_yes": [], "votes_no": []}'::jsonb
+                WHERE token = $1
+                """,
+                room.token
+            )
+        room.votes_yes = set()
+        room.votes_no = set()
+
+    async def start_game(self, room: Room) -> bool:
+        async with crud.pool.acquire() as conn:
+            started = await conn.fetchval(
+                """
+                UPDATE state_rooms
+                SET updated_at = extract(epoch FROM now())::bigint,
+                    data = data || $2::jsonb || '{"game_started": true}'::jsonb
+                WHERE token = $1 AND NOT coalesce((data->>'game_started')::boolean, false)
+                RETURNING true
+                """,
+                room.token, self._plain_fields(room)
+            )
+        if started:
+            room.game_started = True
+        return bool(started)
+
+    async def finish_game(self, room: Room) -> bool:
+        async with crud.pool.acquire() as conn:
+            finished = await conn.fetchval(
+                """
+                UPDATE state_rooms
+                SET updated_at = extract(epoch FROM now())::bigint,
+                    data = data || '{"game_started": false}'::jsonb
+                WHERE token = $1 AND (data->>'game_started')::boolean
+                RETURNING true
+                """,
+                room.token
+            )
+        room.game_started = False
+        return bool(finished)
+
+    # --- Черга ---
+    async def queue_push(self, user_id: int, message_id: int, enqueued_at: float) -> bool:
+        async with crud.pool.acquire() as conn:
+            added = await conn.fetchval(
+                """
+                INSERT INTO state_queue (user_id, message_id, enqueued_at) VALUES ($1, $2, $3)
+                ON CONFLICT (user_id) DO NOTHING RETURNING true
+                """,
+                user_id, message_id, enqueued_at
+            )
+        return bool(added)
+
+    async def queue_remove(self, user_id: int) -> bool:
+        async with crud.pool.acquire() as conn:
+            removed = await conn.fetchval("DELETE FROM state_queue WHERE user_id = $1 RETURNING true", user_id)
+        return bool(removed)
+
+    async def queue_take(self, count: int, min_count: int) -> List[int]:
+        async with crud.pool.acquire() as conn:
+            async with conn.transaction():
+                # SKIP LOCKED: два воркери не заберуть тих самих гравців
+                rows = await conn.fetch(
+                    """
+                    SELECT user_id FROM state_queue ORDER BY enqueued_at
+                    LIMIT $1 FOR UPDATE SKIP LOCKED
+                    """,
+                    count
+                )
+                if len(rows) < min_count:
+                    return []
+                players = [row['user_id'] for row in rows]
+                await conn.execute("DELETE FROM state_queue WHERE user_id = ANY($1::bigint[])", players)
+        return players
+
+    async def queue_contains(self, user_id: int) -> bool:
+        async with crud.pool.acquire() as conn:
+            return bool(await conn.fetchval("SELECT true FROM state_queue WHERE user_id = $1", user_id))
+
+    async def queue_len(self) -> int:
+        async with crud.pool.acquire() as conn:
+            return await conn.fetchval("SELECT count(*) FROM state_queue")
+
+    async def queue_head(self) -> Optional[QueueEntry]:
+        async with crud.pool.acquire() as conn:
+            row = await conn.fetchrow(
+                "SELECT user_id, enqueued_at, message_id FROM state_queue ORDER BY enqueued_at LIMIT 1"
+            )
+        return (row['user_id'], row['enqueued_at'], row['message_id']) if row else None
+
+    async def queue_entries(self) -> List[QueueEntry]:
+        async with crud.pool.acquire() as conn:
+            rows = await conn.fetch("SELECT user_id, enqueued_at, message_id FROM state_queue ORDER BY enqueued_at")
+        return [(row['user_id'], row['enqueued_at'], row['message_id']) for row in rows]
+
+    # --- FSM ---
+    async def fsm_get(self, key: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        async with crud.pool.acquire() as conn:
+            row = await conn.fetchrow("SELECT state, data FROM state_fsm WHERE key = $1", key)
+        if row is None:
+            return None, {}
+        return row['state'], json.loads(row['data'])
+
+    async def fsm_set_state(self, key: str, state: Optional[str]) -> None:
+        async with crud.pool.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO state_fsm (key, state) VALUES ($1, $2)
+                ON CONFLICT (key) DO UPDATE SET state = EXCLUDED.state
+                """,
+                key, state
+            )
+            if state is None:
+                await self._drop_empty_fsm(conn, key)
+
+    async def fsm_set_data(self, key: str, data: Dict[str, Any]) -> None:
+        async with crud.pool.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO state_fsm (key, data) VALUES ($1, $2::jsonb)
+                ON CONFLICT (key) DO UPDATE SET data = EXCLUDED.data
+                """,
+                key, json.dumps(data)
+            )
+            if not data:
+                await self._drop_empty_fsm(conn, key)
+
+    @staticmethod
+    async def _drop_empty_fsm(conn, key: str) -> None:
+        # Як і в пам'яті: порожні записи не тримаємо, щоб таблиця не росла з кожним користувачем
+        await conn.execute("DELETE FROM state_fsm WHERE key = $1 AND state IS NULL AND data = '{}'::jsonb", key)
+
+
+class BackendFSMStorage(BaseStorage):
+    """FSM-сховище aiogram поверх StateBackend."""
+
+    def __init__(self, backend: StateBackend) -> None:
+        self.backend = backend
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return ":".join(str(part) for part in (
+            key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny
+        ))
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self.backend.fsm_set_state(self._key(key), state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self.backend.fsm_get(self._key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self.backend.fsm_set_data(self._key(key), data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self.backend.fsm_get(self._key(key))
+        return data
+
+    async def close(self) -> None:
+        pass
+
+
+def create_state_backend() -> StateBackend:
+    kind = os.getenv("STATE_BACKEND", "memory").lower()
+    if kind == "postgres":
+        return PostgresStateBackend()
+    if kind != "memory":
+        raise ValueError(f"Unknown STATE_BACKEND: {kind}")
+    return MemoryStateBackend()
+
+
+state_backend = create_state_backend()
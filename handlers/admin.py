@@ -1,25 +1,37 @@
 import logging
-import asyncio
 import os
+import time
+from datetime import datetime
+from typing import Optional
 from aiogram import Router, types, F
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import FSInputFile
+from aiogram.types import BufferedInputFile, FSInputFile
 
 from config import (
     set_maintenance_mode,
     is_maintenance_mode,
     DB_PATH,
-    rooms,
-    ADMIN_IDS
+    ADMIN_IDS,
+    PROFILE_MAX_SECONDS,
+    WORKER_ID,
+    BROADCAST_LEASE_SECONDS
 )
 from utils.helpers import is_admin, parse_ban_time, compute_ban_until
-from database.crud import update_player, get_player, get_recent_games, get_player_stats, reset_player_stats, get_all_users
-from bot import bot
+from utils.room_registry import room_registry
+from utils.bans import ban_index, PERMANENT
+from database.crud import (
+    get_player, set_banned_until, get_recent_games, get_player_stats, reset_player_stats,
+    count_users, create_broadcast_job
+)
+from utils.broadcast import start_broadcast_job, cancel_broadcast_jobs
+from utils.profiling import SamplingProfiler
+from middlewares.timing import handler_stats
 
 router = Router()
 logger = logging.getLogger(__name__)
+profiler = SamplingProfiler()
 
 # --- СТАНИ ДЛЯ АДМІНКИ ---
 class AdminStates(StatesGroup):
@@ -61,11 +73,7 @@ async def peek_cmd(message: types.Message, state: FSMContext):
     await state.clear()
     
     # Знаходимо кімнату адміна
-    found_room = None
-    for room in rooms.values():
-        if message.from_user.id in room.players:
-            found_room = room
-            break
+    _, found_room = await room_registry.find_user_room(message.from_user.id)
     
     if not found_room or not found_room.game_started:
         await message.answer("❌ Ви не в активній грі.")
@@ -90,6 +98,16 @@ async def broadcast_start(message: types.Message, state: FSMContext):
     await message.answer("✍️ Напишіть текст повідомлення для розсилки (або /cancel):")
     await state.set_state(AdminStates.waiting_for_broadcast)
 
+@router.message(Command("broadcast_cancel"))
+async def broadcast_cancel(message: types.Message, state: FSMContext):
+    if not _admin_only(message): return
+    await state.clear()
+    cancelled = await cancel_broadcast_jobs()
+    if cancelled:
+        await message.answer(f"🛑 Скасовано розсилок: {cancelled}")
+    else:
+        await message.answer("ℹ️ Активних розсилок немає.")
+
 @router.message(AdminStates.waiting_for_broadcast)
 async def broadcast_process(message: types.Message, state: FSMContext):
     if message.text.startswith("/"): 
@@ -97,49 +115,68 @@ async def broadcast_process(message: types.Message, state: FSMContext):
         await message.answer("❌ Скасовано (введено команду).")
         return
 
-    text = message.text
-    users = await get_all_users()
-    count = 0
-    
-    status_msg = await message.answer(f"🚀 Розсилка на {len(users)} користувачів...")
-    
-    for user_id in users:
-        try:
-            await bot.send_message(user_id, f"📢 <b>ОГОЛОШЕННЯ:</b>\n\n{text}", parse_mode="HTML")
-            count += 1
-            await asyncio.sleep(0.05) 
-        except Exception:
-            pass
-            
-    await status_msg.edit_text(f"✅ Розсилку завершено. Отримали: {count}")
+    # Розсилка йде у фоні і зберігає прогрес у БД, тож переживе рестарт
+    total = await count_users()
+    status_msg = await message.answer(f"🚀 Розсилка на {total} користувачів...")
+    job_id = await create_broadcast_job(
+        message.text, message.chat.id, status_msg.message_id, total, WORKER_ID, int(time.time()) + BROADCAST_LEASE_SECONDS
+    )
+    start_broadcast_job({
+        'id': job_id, 'text': message.text, 'last_user_id': 0, 'sent': 0, 'failed': 0, 'total': total,
+        'admin_chat_id': message.chat.id, 'status_message_id': status_msg.message_id
+    })
     await state.clear()
 
 # --- 4. БАН (BAN) ---
+def _ban_until(time_str: str) -> Optional[int]:
+    """'' або 'perm' -> -1 (назавжди), '30m'/'2h'/'7d' -> timestamp, інакше None."""
+    if not time_str:
+        return PERMANENT
+    duration = parse_ban_time(time_str)
+    if duration is None:
+        return None
+    return PERMANENT if duration == -1 else compute_ban_until(duration)
+
+async def _apply_ban(message: types.Message, target_id: int, until: int) -> None:
+    await set_banned_until(target_id, until)
+    ban_index.ban(target_id, until)
+    if until == PERMANENT:
+        await message.answer(f"🚫 Користувача {target_id} забанено назавжди.")
+    else:
+        await message.answer(f"🚫 Користувача {target_id} забанено до <code>{datetime.fromtimestamp(until):%Y-%m-%d %H:%M}</code>.", parse_mode="HTML")
+
 @router.message(Command("ban"))
 async def ban_start(message: types.Message, state: FSMContext):
     if not _admin_only(message): return
     await state.clear()
     
-    # Якщо це реплаєм
+    # Якщо це реплаєм: /ban або /ban 2h
     if message.reply_to_message:
-        target_id = message.reply_to_message.from_user.id
-        await update_player(target_id, banned_until=-1) # Перманент
-        await message.answer(f"🚫 Користувача {target_id} забанено.")
+        parts = message.text.split(maxsplit=1)
+        until = _ban_until(parts[1] if len(parts) > 1 else "")
+        if until is None:
+            await message.answer("❌ Невірний час. Приклади: 30m, 2h, 7d, perm.")
+            return
+        await _apply_ban(message, message.reply_to_message.from_user.id, until)
         return
 
-    await message.answer("✍️ Введіть ID користувача для бану:")
+    await message.answer("✍️ Введіть ID користувача для бану (і час, напр. <code>123 2h</code>; без часу - назавжди):", parse_mode="HTML")
     await state.set_state(AdminStates.waiting_for_ban_id)
 
 @router.message(AdminStates.waiting_for_ban_id)
 async def ban_process(message: types.Message, state: FSMContext):
-    if not message.text.isdigit():
+    parts = (message.text or "").split(maxsplit=1)
+    if not parts or not parts[0].isdigit():
         await message.answer("❌ Це не ID. Скасовано.")
         await state.clear()
         return
+    until = _ban_until(parts[1] if len(parts) > 1 else "")
+    if until is None:
+        await message.answer("❌ Невірний час. Приклади: 30m, 2h, 7d, perm. Скасовано.")
+        await state.clear()
+        return
         
-    target_id = int(message.text)
-    await update_player(target_id, banned_until=-1) # -1 = назавжди
-    await message.answer(f"🚫 Користувача {target_id} забанено назавжди.")
+    await _apply_ban(message, int(parts[0]), until)
     await state.clear()
 
 # --- 5. РОЗБАН (UNBAN) ---
@@ -158,7 +195,8 @@ async def unban_process(message: types.Message, state: FSMContext):
         return
         
     target_id = int(message.text)
-    await update_player(target_id, banned_until=0)
+    await set_banned_until(target_id, 0)
+    ban_index.unban(target_id)
     await message.answer(f"✅ Користувача {target_id} розбанено.")
     await state.clear()
 
@@ -224,9 +262,69 @@ async def get_logs_file(message: types.Message, state: FSMContext):
     await state.clear()
     
     # Оскільки Render пише логи в консоль, ми створимо текстовий файл зі звітом
-    log_content = "Logs are stored in Render Dashboard (Events/Logs tab).\nCurrently active rooms: " + str(len(rooms))
+    log_content = "Logs are stored in Render Dashboard (Events/Logs tab).\nCurrently active rooms: " + str(await room_registry.count())
     
     with open("bot_status.txt", "w") as f:
         f.write(log_content)
         
-    await message.answer_document(FSInputFile("bot_status.txt"))
\ No newline at end of file
+    await message.answer_document(FSInputFile("bot_status.txt"))
+
+# --- 9. ПРОФІЛЮВАННЯ ---
+@router.message(Command("handler_stats"))
+async def handler_stats_cmd(message: types.Message, state: FSMContext):
+    if not _admin_only(message): return
+    await state.clear()
+    args = message.text.split()
+    report = handler_stats.render()
+    if len(args) > 1 and args[1] == "reset":
+        handler_stats.reset()
+        report += "\n\n(статистику скинуто)"
+    await message.answer_document(BufferedInputFile(report.encode(), filename=f"handler_stats_{int(time.time())}.txt"))
+
+@router.message(Command("profile"))
+async def profile_cmd(message: types.Message, state: FSMContext):
+    if not _admin_only(message): return
+    await state.clear()
+    args = message.text.split()
+    seconds = int(args[1]) if len(args) > 1 and args[1].isdigit() else 10
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+    if profiler.running:
+        await message.answer("⏳ Профайлер уже працює.")
+        return
+    await message.answer(f"🔬 Профілюю {seconds} с...")
+    try:
+        stacks, samples = await profiler.profile(seconds)
+    except RuntimeError as e:
+        await message.answer(f"❌ {e}")
+        return
+    report = SamplingProfiler.report(stacks, samples, seconds)
+    await message.answer_document(BufferedInputFile(report.encode(), filename=f"profile_{int(time.time())}.txt"))
+
+# --- 10. ІСТОРІЯ ІГОР ---
+@router.message(Command("games"))
+async def games_cmd(message: types.Message, state: FSMContext):
+    """/games [user_id] [курсор] - останні ігри, за бажанням лише з цим гравцем."""
+    if not _admin_only(message): return
+    await state.clear()
+    args = message.text.split()[1:]
+    user_id = int(args[0]) if args and args[0].isdigit() and int(args[0]) else None  # 0 - усі гравці
+    before = None
+    if len(args) > 1:
+        try:
+            ts, game_id = args[1].split("-")
+            before = (int(ts), int(game_id))
+        except ValueError:
+            await message.answer("❌ Невірний курсор.")
+            return
+    games = await get_recent_games(10, user_id, before)
+    if not games:
+        await message.answer("📭 Ігор не знайдено.")
+        return
+    lines = [
+        f"<code>{g['room_token']}</code> {datetime.fromtimestamp(g['timestamp']):%d.%m %H:%M} · {g['location']} · "
+        f"шпигун {g['spy_id']} · {'🕵️' if g['winner'] == 'spy' else '👥'} · {len(g['players'])} гравців"
+        for g in games
+    ]
+    last = games[-1]
+    lines.append(f"\nДалі: <code>/games {user_id or 0} {last['timestamp']}-{last['id']}</code>")
+    await message.answer("\n".join(lines), parse_mode="HTML")
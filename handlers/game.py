@@ -1,5 +1,4 @@
 import logging
-import asyncio
 import random
 import time
 from datetime import datetime
@@ -8,20 +7,26 @@ from aiogram import Router, types, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 
-from bot import bot
 from config import (
-    matchmaking_queue,  # <-- ВАЖЛИВО: імпортуємо чергу, щоб знати довжину
     add_active_user, 
-    rooms, 
     LOCATIONS, 
     GAME_DURATION_SECONDS, 
     BOT_IDS, 
-    BOT_AVATARS
+    BOT_AVATARS,
+    ROOM_LEASE_SECONDS
 )
-from utils.helpers import maintenance_blocked, generate_room_token, is_admin
-from utils.matchmaking import enqueue_user, dequeue_user, is_in_queue
+from utils.helpers import maintenance_blocked, is_admin
+from utils.matchmaking import enqueue_user, dequeue_user, is_in_queue, queue_size
 from utils.states import PlayerState
-from database.crud import update_player_stats, get_or_create_player, get_player_stats
+from utils.room_registry import room_registry
+from database.state_backend import JOIN_MISSING, JOIN_FULL, JOIN_STARTED, JOIN_ALREADY
+from utils.sender import sender
+from utils.scheduler import scheduler
+from utils.reaper import reaper
+from utils.game_log import game_log
+from utils import callbacks
+from utils.callbacks import GameCallback, GameCallbackFilter
+from database.crud import record_game_result, get_or_create_player, get_player_stats, player_stats
 from database.models import Room, UserState
 from keyboards.keyboards import (
     in_queue_menu, in_lobby_menu, main_menu, in_game_menu, 
@@ -42,8 +47,7 @@ async def cmd_stats(message: types.Message):
     user = message.from_user
     stats = await get_player_stats(user.id)
     if not stats:
-        await get_or_create_player(user.id, user.username)
-        stats = await get_player_stats(user.id)
+        stats = player_stats(await get_or_create_player(user.id, user.username))
     
     games = stats['games_played']
     wins = stats['spy_wins'] + stats['civilian_wins']
@@ -69,12 +73,12 @@ async def find_match(message: types.Message):
     user_id = message.from_user.id
     add_active_user(user_id)
     
-    if is_in_queue(user_id):
+    if await is_in_queue(user_id):
         await message.answer("Ви вже в черзі.", reply_markup=in_queue_menu)
         return
 
     # Рахуємо, скільки буде людей разом з тобою
-    current_count = len(matchmaking_queue) + 1
+    current_count = await queue_size() + 1
     
     status_text = "⏳ Чекаємо інших гравців..."
     if current_count >= 3: status_text = "🚀 Скоро старт!"
@@ -90,8 +94,7 @@ async def find_match(message: types.Message):
 
 @router.message(F.text == "❌ Скасувати Пошук")
 async def cancel_search(message: types.Message):
-    if is_in_queue(message.from_user.id):
-        dequeue_user(message.from_user.id)
+    if await dequeue_user(message.from_user.id):
         await message.answer("❌ Скасовано.", reply_markup=main_menu)
     else:
         await message.answer("ℹ️ Не в черзі.", reply_markup=main_menu)
@@ -101,20 +104,13 @@ async def cancel_search(message: types.Message):
 @router.message(F.text == "🚪 Створити Кімнату")
 async def create_room_cmd(message: types.Message):
     if maintenance_blocked(message.from_user.id): return
-    for r in rooms.values():
-        if message.from_user.id in r.players:
-            await message.answer("❌ Ви вже в кімнаті.", reply_markup=in_lobby_menu)
-            return
+    _, current = await room_registry.find_user_room(message.from_user.id)
+    if current:
+        await message.answer("❌ Ви вже в кімнаті.", reply_markup=in_lobby_menu)
+        return
 
-    token = generate_room_token()
-    room = Room(
-        token=token, admin_id=message.from_user.id, players={message.from_user.id: message.from_user.full_name},
-        player_roles={}, player_votes={}, early_votes=set()
-    )
-    room.player_callsigns = {}
-    room.votes_yes = set()
-    room.votes_no = set()
-    rooms[token] = room
+    room = await room_registry.create_room(message.from_user.id, {message.from_user.id: message.from_user.full_name})
+    token = room.token
     
     if message.from_user.id not in user_states: user_states[message.from_user.id] = UserState()
     user_states[message.from_user.id].current_room = token
@@ -137,28 +133,29 @@ async def join_room_ask(message: types.Message, state: FSMContext):
 async def _process_join_room(message: types.Message, token: str, state: FSMContext):
     user = message.from_user
     token = token.upper().strip()
-    if token not in rooms:
+    room = await room_registry.get(token)
+    result = JOIN_MISSING
+    if room:
+        # Перевірка місць і старту гри робиться атомарно разом із входом
+        result = await room_registry.join(room, user.id, user.full_name or (user.username or str(user.id)), max_players=6)
+    if result == JOIN_MISSING:
         if len(token) in [4,5] and token.isalnum(): await message.answer("❌ Не знайдено.", reply_markup=main_menu)
         else: await message.answer("❌ Невірний код.", reply_markup=main_menu)
         return
-    room = rooms[token]
-    if len(room.players) >= 6:
+    if result == JOIN_FULL:
         await message.answer("❌ Повна.", reply_markup=main_menu)
         return
-    if room.game_started:
+    if result == JOIN_STARTED:
         await message.answer("❌ Гра йде.", reply_markup=main_menu)
         return
-    if user.id in room.players:
+    if result == JOIN_ALREADY:
         await message.answer("ℹ️ Вже тут.", reply_markup=in_lobby_menu)
     else:
-        room.players[user.id] = user.full_name or (user.username or str(user.id))
         if user.id not in user_states: user_states[user.id] = UserState()
         user_states[user.id].current_room = token
         
-        for pid in room.players:
-            if pid == user.id: continue
-            try: await bot.send_message(pid, f"➕ {user.full_name} зайшов! ({len(room.players)}/6)")
-            except: pass
+        others = [pid for pid in room.players if pid != user.id]
+        await sender.send_many(others, f"➕ {user.full_name} зайшов! ({len(room.players)}/6)")
             
         await message.answer(f"✅ Ви в кімнаті <code>{token}</code>", parse_mode="HTML", reply_markup=in_lobby_menu)
         is_room_admin = (user.id == room.admin_id)
@@ -174,57 +171,50 @@ async def quick_join(message: types.Message, state: FSMContext):
     current_state = await state.get_state()
     if current_state in [PlayerState.in_game, PlayerState.in_lobby]: return
     token = message.text.upper().strip()
-    if token in rooms: await _process_join_room(message, token, state)
+    if await room_registry.get(token): await _process_join_room(message, token, state)
 
 @router.message(F.text == "🚪 Покинути Лобі")
 @router.message(F.text == "🚪 Покинути Гру")
 async def leave_lobby(message: types.Message, state: FSMContext):
     user = message.from_user
-    target_token = None
-    for t, r in rooms.items():
-        if user.id in r.players:
-            target_token = t
-            break
-    if not target_token:
+    target_token, room = await room_registry.find_user_room(user.id)
+    if not room:
         await message.answer("ℹ️ Ви не в кімнаті.", reply_markup=main_menu)
         await state.clear()
         return
-    room = rooms[target_token]
-    if user.id in room.players: del room.players[user.id]
+    await room_registry.remove_player(room, user.id)
     if user.id in user_states: del user_states[user.id]
-    if hasattr(room, 'player_callsigns') and user.id in room.player_callsigns: del room.player_callsigns[user.id]
+    if user.id in room.player_callsigns:
+        del room.player_callsigns[user.id]
+        await room_registry.save(room)
     
     if room.game_started:
          if len(room.players) < 3:
              await end_game(target_token, True, "👥 Недостатньо гравців.")
              return
     if not room.players:
-        del rooms[target_token]
+        await room_registry.delete_room(target_token)
         await message.answer("🚪 Ви вийшли.", reply_markup=main_menu)
         return
     if user.id == room.admin_id:
         humans = [p for p in room.players if p > 0]
         if humans:
             room.admin_id = humans[0]
+            await room_registry.save(room)
             new_adm_show_bot = is_admin(humans[0])
-            try: await bot.send_message(room.admin_id, "👑 Ви адмін.", reply_markup=get_in_lobby_keyboard(True, target_token, new_adm_show_bot))
-            except: pass
+            await sender.send(room.admin_id, "👑 Ви адмін.", reply_markup=get_in_lobby_keyboard(True, target_token, new_adm_show_bot))
         else:
-            del rooms[target_token]
+            await room_registry.delete_room(target_token)
             return
-    for pid in room.players:
-        try: await bot.send_message(pid, f"🚪 {user.full_name} вийшов.")
-        except: pass
+    await sender.send_many(room.players, f"🚪 {user.full_name} вийшов.")
     await message.answer("✅ Ви вийшли.", reply_markup=main_menu)
     await state.clear()
 
-@router.callback_query(F.data.startswith("add_bot_btn:"))
-async def on_add_bot_click(callback: types.CallbackQuery):
+async def on_add_bot_click(callback: types.CallbackQuery, payload: GameCallback):
     if not is_admin(callback.from_user.id):
          await callback.answer("Доступ заборонено", show_alert=True)
          return
-    token = callback.data.split(":")[1]
-    room = rooms.get(token)
+    room = await room_registry.get(payload.token)
     if not room or callback.from_user.id != room.admin_id: return
     
     bot_id = None
@@ -237,27 +227,26 @@ async def on_add_bot_click(callback: types.CallbackQuery):
         return
     
     bot_name = f"{BOT_AVATARS[abs(bot_id) % len(BOT_AVATARS)]} Бот-{abs(bot_id)}"
-    room.players[bot_id] = bot_name
+    await room_registry.add_player(room, bot_id, bot_name)
     await callback.answer(f"✅ {bot_name} додано!")
     
-    for pid in room.players:
-        try: await bot.send_message(pid, f"🤖 Додано бота: {bot_name} ({len(room.players)}/6)")
-        except: pass
-
-@router.callback_query(F.data.startswith("start_game:"))
-async def on_start_click(callback: types.CallbackQuery):
-    token = callback.data.split(":")[1]
-    room = rooms.get(token)
+    await sender.send_many(room.players, f"🤖 Додано бота: {bot_name} ({len(room.players)}/6)")
+
+async def on_start_click(callback: types.CallbackQuery, payload: GameCallback):
+    room = await room_registry.get(payload.token)
     if not room or callback.from_user.id != room.admin_id: return
     if len(room.players) < 3:
         await callback.answer("Мін 3 гравці.", show_alert=True)
         return
-    await start_game(room)
+    if not await start_game(room):
+        await callback.answer("Гра вже йде.")
+        return
     try: await callback.message.delete() 
     except: pass
     await callback.message.answer("🎮 Почали!")
 
-async def start_game(room: Room):
+async def start_game(room: Room) -> bool:
+    if room.game_started: return False
     players = list(room.players.keys())
     av_calls = GAME_CALLSIGNS.copy()
     random.shuffle(av_calls)
@@ -269,206 +258,267 @@ async def start_game(room: Room):
     spy_id = random.choice(humans)
     room.spy_id = spy_id
     room.location = random.choice(LOCATIONS)
-    room.game_started = True
     room.voting_started = False
     room.spy_guessed = False
-    room.votes_yes = set()
-    room.votes_no = set()
+    room.end_time = int(time.time()) + GAME_DURATION_SECONDS
     
+    role_messages = []
     for pid in players:
         role = "spy" if pid == spy_id else "civilian"
         room.player_roles[pid] = role
         callsign = room.player_callsigns[pid]
         txt = f"🕵️ ТИ — ШПИГУН!\nПозивний: <b>{callsign}</b>\nВгадай локацію." if role == "spy" else f"👥 МИРНИЙ.\nПозивний: <b>{callsign}</b>\n📍 Локація: <b>{room.location}</b>"
-        try: 
-            if pid > 0: await bot.send_message(pid, txt, parse_mode="HTML", reply_markup=in_game_menu)
-        except: pass
+        role_messages.append((pid, txt, {"parse_mode": "HTML", "reply_markup": in_game_menu}))
+    # Подвійне натискання "Почати" (або на двох воркерах) запускає гру один раз
+    if not await room_registry.start_game(room): return False
+    await room_registry.reset_early_votes(room)
+    await sender.send_each(role_messages)
     
-    room.end_time = int(time.time()) + GAME_DURATION_SECONDS
-    room._timer_task = asyncio.create_task(_game_timer(room.token))
-    for bid in BOT_IDS:
-        if bid in room.players: asyncio.create_task(_bot_behavior(bid, room))
+    # Таймер прокидається лише на останні 5 секунд відліку
+    scheduler.schedule((room.token, "game"), room.end_time - 5, _game_tick, room.token, group=room.token)
+    _schedule_bots(room)
+    return True
 
-async def _game_timer(token: str):
+def _schedule_bots(room: Room):
+    for bid in BOT_IDS:
+        if bid in room.players:
+            scheduler.schedule((room.token, "bot", bid), time.time() + random.uniform(5, 15), _bot_tick, room.token, bid, group=room.token)
+
+def resume_room_timers(room: Room):
+    """Відновлює таймери гри з дедлайнів, збережених у кімнаті (після рестарту).
+
+    Прострочені дедлайни спрацюють одразу: тики самі доведуть фазу до кінця.
+    """
+    if not room.game_started: return
+    token = room.token
+    if room.spy_guessed:
+        scheduler.schedule((token, "guess"), room.guess_end_time - 5, _guess_tick, token, group=token)
+    elif room.voting_started:
+        scheduler.schedule((token, "vote"), room.vote_end_time - 5, _vote_tick, token, room.vote_forced, group=token)
+    # Після примусового голосування і під час вгадування відлік гри вже не потрібен
+    if not room.spy_guessed and not (room.voting_started and room.vote_forced):
+        scheduler.schedule((token, "game"), room.end_time - 5, _game_tick, token, group=token)
+    if room.early_vote_end_time > time.time():
+        scheduler.schedule((token, "early_vote"), room.early_vote_end_time, _finalize_early_vote, token, group=token)
+    _schedule_bots(room)
+
+async def claim_room_timers(now: float) -> int:
+    """Веде таймери лише орендованих кімнат: відновлює їх для щойно підхоплених
+    (рестарт, покинуті іншим воркером) і знімає з тих, що відійшли іншому."""
+    gained, lost = await room_registry.claim(now)
+    for token in lost:
+        scheduler.cancel_group(token)
+    for room in gained:
+        resume_room_timers(room)
+    return len(gained)
+
+_LEASE_TIMER = ("leases", "rooms")
+
+def start_room_leases() -> None:
+    """Окремий таймер продовження оренди: повільний прохід прибиральника не дасть їй протухнути."""
+    scheduler.schedule(_LEASE_TIMER, time.time() + ROOM_LEASE_SECONDS / 3, _renew_room_leases)
+
+async def _renew_room_leases():
     try:
-        room = rooms.get(token)
-        if not room: return
-        while True:
-            now = int(time.time())
-            rem = room.end_time - now
-            if rem <= 0: break
-            if rem <= 5 and room.game_started and not room.voting_started:
-                 for uid in room.players:
-                     if uid > 0:
-                         try: await bot.send_message(uid, f"⏰ {rem}...")
-                         except: pass
-            await asyncio.sleep(1)
-            if token not in rooms or not rooms[token].game_started: return
-        if room and room.game_started:
-            for uid in room.players:
-                if uid > 0: await bot.send_message(uid, "⏰ ЧАС! Голосуємо!")
-            await start_vote_procedure(token, forced=True)
-    except asyncio.CancelledError: pass
+        await claim_room_timers(time.time())
+    except Exception as e:
+        logger.error(f"Room lease renewal failed: {e}")
+    return time.time() + ROOM_LEASE_SECONDS / 3
+
+def _seconds_left(deadline: int) -> int:
+    return round(deadline - time.time())
+
+async def _game_tick(token: str):
+    room = await room_registry.get(token)
+    if not room or not room.game_started: return None
+    rem = _seconds_left(room.end_time)
+    if rem > 0:
+        if not room.voting_started:
+            await sender.send_many(room.players, f"⏰ {rem}...")
+        return room.end_time - rem + 1
+    await sender.send_many(room.players, "⏰ ЧАС! Голосуємо!")
+    await start_vote_procedure(token, forced=True)
+    return None
 
 async def end_game(token: str, spy_won: bool, reason: str, grant_xp: bool = True):
-    room = rooms.get(token)
-    if not room: return
-    for t in ["_timer_task", "_voting_task", "_early_vote_task"]:
-        tk = getattr(room, t, None)
-        if tk: tk.cancel()
-    room.game_started = False
+    room = await room_registry.get(token)
+    # Таймер міг спрацювати на кількох воркерах: підсумки підбиває лише той, хто завершив гру
+    if not room or not await room_registry.finish_game(room): return
+    scheduler.cancel_group(token)
+    await room_registry.save(room)
     
     players = list(room.players.keys())
     spy_real = room.players.get(room.spy_id, "Bot")
     spy_call = room.player_callsigns.get(room.spy_id, "???")
     res_text = f"🏁 <b>ГРУ ЗАВЕРШЕНО!</b>\n{reason}\n\n🕵️ Шпигун: <b>{spy_call}</b> ({spy_real})\n📍 Локація: <b>{room.location}</b>"
     
-    for uid in players:
-        try: await bot.send_message(uid, res_text, parse_mode="HTML", reply_markup=main_menu)
-        except: pass
+    await sender.send_many(players, res_text, parse_mode="HTML", reply_markup=main_menu)
         
     if grant_xp:
+        results = []
         for uid in players:
             if uid < 0: continue
             is_spy = (uid == room.spy_id)
-            is_winner = (spy_won and is_spy) or (not spy_won and not is_spy)
-            try:
-                lvl_old, _, _ = await update_player_stats(uid, is_spy, is_winner)
-            except: pass
+            results.append((uid, is_spy, is_spy == spy_won))
+        game_log.add(token, room.location, room.spy_id, [uid for uid, _, _ in results], "spy" if spy_won else "civilians")
+        try:
+            await record_game_result(results)
+        except Exception as e:
+            logger.error(f"Stats commit failed for room {token}: {e}")
             
     if room.admin_id > 0 and room.admin_id in room.players:
         show_bot = is_admin(room.admin_id)
-        try: await bot.send_message(room.admin_id, "⚙️ Меню:", reply_markup=get_in_lobby_keyboard(True, token, show_bot))
-        except: pass
+        await sender.send(room.admin_id, "⚙️ Меню:", reply_markup=get_in_lobby_keyboard(True, token, show_bot))
 
 @router.message(F.text == "🗳️ Достр. Голосування")
 async def early_vote_req(message: types.Message):
-    token, room = _find_user_room(message.from_user.id)
+    token, room = await _find_user_room(message.from_user.id)
     if not room or not room.game_started: return
-    room.votes_yes = set()
-    room.votes_no = set()
-    for uid in room.players:
-        if uid > 0: await bot.send_message(uid, "🗳️ Завершити гру?", reply_markup=get_early_vote_keyboard(token))
+    await room_registry.reset_early_votes(room)
+    room.early_vote_end_time = int(time.time()) + 30
+    await room_registry.save(room)
+    await sender.send_many(room.players, "🗳️ Завершити гру?", reply_markup=get_early_vote_keyboard(token))
     
-    room._early_vote_task = asyncio.create_task(_finalize_early_vote(token))
+    scheduler.schedule((token, "early_vote"), room.early_vote_end_time, _finalize_early_vote, token, group=token)
 
 async def _finalize_early_vote(token: str):
-    await asyncio.sleep(30)
-    room = rooms.get(token)
+    room = await room_registry.get(token)
     if not room or not room.game_started: return
-    for uid in room.players:
-        if uid > 0: await bot.send_message(uid, "⏰ Час вийшов. Граємо далі.")
+    room.early_vote_end_time = 0
+    await room_registry.save(room)
+    await sender.send_many(room.players, "⏰ Час вийшов. Граємо далі.")
 
-@router.callback_query(F.data.startswith("early_vote_"))
-async def early_vote_cb(cb: types.CallbackQuery):
-    token = cb.data.split(":")[1]
-    room = rooms.get(token)
+async def early_vote_cb(cb: types.CallbackQuery, payload: GameCallback):
+    token = payload.token
+    room = await room_registry.get(token)
     if not room or not room.game_started: return
     uid = cb.from_user.id
-    choice = "yes" if "yes" in cb.data else "no"
-    if choice == "yes": room.votes_yes.add(uid)
-    else: room.votes_no.add(uid)
+    await room_registry.cast_early_vote(room, uid, payload.action == callbacks.EARLY_YES)
     await cb.answer("OK")
     try: await cb.message.delete()
     except: pass
     
     total = len(room.players)
     if len(room.votes_yes) > total / 2:
-        if hasattr(room, "_early_vote_task"): room._early_vote_task.cancel()
-        for u in room.players: 
-            if u > 0: await bot.send_message(u, "✅ Більшість ЗА.")
+        await _close_early_vote(room)
+        await sender.send_many(room.players, "✅ Більшість ЗА.")
         await start_vote_procedure(token, forced=False)
     elif len(room.votes_no) >= total / 2:
-        if hasattr(room, "_early_vote_task"): room._early_vote_task.cancel()
-        for u in room.players:
-            if u > 0: await bot.send_message(u, "❌ Відхилено.")
+        await _close_early_vote(room)
+        await sender.send_many(room.players, "❌ Відхилено.")
+
+async def _close_early_vote(room: Room):
+    scheduler.cancel((room.token, "early_vote"))
+    room.early_vote_end_time = 0
+    await room_registry.save(room)
 
 async def start_vote_procedure(token: str, forced: bool = False):
-    room = rooms.get(token)
+    room = await room_registry.get(token)
     if not room: return
-    room.player_votes = {}
+    await room_registry.reset_votes(room)
     room.voting_started = True
-    for uid in room.players:
-        if uid > 0: await bot.send_message(uid, "☠️ ХТО ШПИГУН?", reply_markup=get_voting_keyboard(token, room.player_callsigns, uid))
-    room._voting_task = asyncio.create_task(_finalize_suspect_vote(token, forced))
-
-@router.callback_query(F.data.startswith("vote:"))
-async def vote_cb(cb: types.CallbackQuery):
-    token = cb.data.split(":")[1]
-    target = int(cb.data.split(":")[2])
-    room = rooms.get(token)
+    room.vote_forced = forced
+    room.vote_end_time = int(time.time()) + 45
+    await room_registry.save(room)
+    await sender.send_each(
+        (uid, "☠️ ХТО ШПИГУН?", {"reply_markup": get_voting_keyboard(token, room.player_callsigns, uid)})
+        for uid in room.players if uid > 0
+    )
+    scheduler.schedule((token, "vote"), room.vote_end_time - 5, _vote_tick, token, forced, group=token)
+
+async def vote_cb(cb: types.CallbackQuery, payload: GameCallback):
+    room = await room_registry.get(payload.token)
     if room:
-        room.player_votes[cb.from_user.id] = target
+        await room_registry.cast_vote(room, cb.from_user.id, payload.arg)
         await cb.answer("Голос прийнято")
 
+async def _vote_tick(token: str, forced: bool):
+    room = await room_registry.get(token)
+    if not room: return None
+    rem = _seconds_left(room.vote_end_time)
+    if rem > 0:
+        await sender.send_many(room.players, f"⏳ {rem}...")
+        return room.vote_end_time - rem + 1
+    await _finalize_suspect_vote(token, forced)
+    return None
+
 async def _finalize_suspect_vote(token: str, forced: bool):
-    for i in range(45, 0, -1):
-        if i <= 5 and rooms.get(token):
-             for uid in rooms[token].players:
-                 if uid > 0: 
-                     try: await bot.send_message(uid, f"⏳ {i}...")
-                     except: pass
-        await asyncio.sleep(1)
-    room = rooms.get(token)
+    room = await room_registry.get(token)
     if not room or not room.game_started: return
     room.voting_started = False
+    await room_registry.save(room)
     tally = {}
     for v in room.player_votes.values(): tally[v] = tally.get(v, 0) + 1
     if not tally:
         if forced: await end_game(token, True, "⏰ Ніхто не голосував. Шпигун переміг!")
         else: 
-             for uid in room.players:
-                 if uid > 0: await bot.send_message(uid, "ℹ️ Пропуск.")
+             await sender.send_many(room.players, "ℹ️ Пропуск.")
         return
     max_v = max(tally.values())
     top = [p for p, c in tally.items() if c == max_v]
     if len(top) != 1:
         if forced: await end_game(token, True, "⚖️ Нічия. Шпигун переміг!")
         else:
-             for uid in room.players:
-                 if uid > 0: await bot.send_message(uid, "⚖️ Нічия. Граємо далі.")
+             await sender.send_many(room.players, "⚖️ Нічия. Граємо далі.")
         return
     target = top[0]
     t_call = room.player_callsigns.get(target, "Unknown")
-    for uid in room.players:
-        if uid > 0: await bot.send_message(uid, f"👉 Вигнано: <b>{t_call}</b>", parse_mode="HTML")
+    await sender.send_many(room.players, f"👉 Вигнано: <b>{t_call}</b>", parse_mode="HTML")
     
     if target == room.spy_id:
         room.spy_guessed = True
+        room.guess_end_time = int(time.time()) + 30
+        await room_registry.save(room)
         spy_id = room.spy_id
-        if spy_id > 0: await bot.send_message(spy_id, "😱 ТЕБЕ ВИКРИЛИ! 30с на вгадування!", reply_markup=get_locations_keyboard(token, LOCATIONS))
-        
-        for i in range(30, 0, -1):
-             if rooms.get(token) and not rooms[token].game_started: return # Шпигун вже вгадав
-             if i <= 5:
-                 try: await bot.send_message(spy_id, f"⏳ {i}...")
-                 except: pass
-             await asyncio.sleep(1)
-
-        if rooms.get(token) and rooms[token].game_started: await end_game(token, False, "⏳ Шпигун не встиг.")
+        if spy_id > 0: await sender.send(spy_id, "😱 ТЕБЕ ВИКРИЛИ! 30с на вгадування!", reply_markup=get_locations_keyboard(token, LOCATIONS))
+        # Якщо шпигун вгадає раніше, end_game скасує цей таймер
+        scheduler.schedule((token, "guess"), room.guess_end_time - 5, _guess_tick, token, group=token)
     else:
-        room.players.pop(target, None)
+        await room_registry.remove_player(room, target)
         if len(room.players) < 3: await end_game(token, True, "👥 Мало гравців.")
 
+async def _guess_tick(token: str):
+    room = await room_registry.get(token)
+    if not room or not room.game_started: return None
+    rem = _seconds_left(room.guess_end_time)
+    if rem > 0:
+        await sender.send_many([room.spy_id], f"⏳ {rem}...")
+        return room.guess_end_time - rem + 1
+    await end_game(token, False, "⏳ Шпигун не встиг.")
+    return None
+
 @router.message(Command("spy_guess"))
 async def spy_guess_cmd(message: types.Message):
-    token, room = _find_user_room(message.from_user.id)
+    token, room = await _find_user_room(message.from_user.id)
     if room and message.from_user.id == room.spy_id:
         await message.answer("Локація:", reply_markup=get_locations_keyboard(token, LOCATIONS))
 
-@router.callback_query(F.data.startswith("guess:"))
-async def on_location_guess(cb: types.CallbackQuery):
-    token = cb.data.split(":")[1]
-    loc = cb.data.split(":")[2]
-    room = rooms.get(token)
+async def on_location_guess(cb: types.CallbackQuery, payload: GameCallback):
+    token = payload.token
+    loc = LOCATIONS[payload.arg]  # індекс уже перевірено в decode
+    room = await room_registry.get(token)
     if not room or not room.game_started: return
     if cb.from_user.id != room.spy_id: return
     if loc.lower() == room.location.lower(): await end_game(token, True, f"🗺️ Шпигун вгадав ({loc})!")
     else: await end_game(token, False, f"❌ Помилка ({loc}).")
 
+_CALLBACK_HANDLERS = {
+    callbacks.START_GAME: on_start_click,
+    callbacks.ADD_BOT: on_add_bot_click,
+    callbacks.EARLY_YES: early_vote_cb,
+    callbacks.EARLY_NO: early_vote_cb,
+    callbacks.VOTE: vote_cb,
+    callbacks.GUESS: on_location_guess,
+}
+
+@router.callback_query(GameCallbackFilter())
+async def on_game_callback(callback: types.CallbackQuery, payload: GameCallback):
+    # Один розбір payload і один пошук у dict замість перебору startswith-фільтрів
+    await _CALLBACK_HANDLERS[payload.action](callback, payload)
+
 @router.message(F.text == "❓ Моя роль")
 async def my_role(message: types.Message):
-    token, room = _find_user_room(message.from_user.id)
+    token, room = await _find_user_room(message.from_user.id)
     if room and room.game_started:
         role = room.player_roles.get(message.from_user.id)
         callsign = room.player_callsigns.get(message.from_user.id)
@@ -477,8 +527,9 @@ async def my_role(message: types.Message):
 
 @router.message(F.text & ~F.text.startswith("/"))
 async def room_chat(message: types.Message):
-    token, room = _find_user_room(message.from_user.id)
+    token, room = await _find_user_room(message.from_user.id)
     if not room: return 
+    await room_registry.touch(room)
     uid = message.from_user.id
     if room.game_started:
         name = room.player_callsigns.get(uid, "Unknown")
@@ -486,23 +537,31 @@ async def room_chat(message: types.Message):
     else:
         name = room.players.get(uid, message.from_user.first_name)
         txt = f"👤 <b>{name}:</b> {message.text}"
-    for pid in room.players:
-        if pid != uid and pid > 0:
-            try: await bot.send_message(pid, txt, parse_mode="HTML")
-            except: pass
-
-def _find_user_room(user_id: int):
-    for t, r in rooms.items():
-        if user_id in r.players: return t, r
-    return None, None
-
-async def _bot_behavior(bot_id, room):
-    while room.game_started:
-        await asyncio.sleep(random.uniform(5, 15))
-        if room.voting_started and bot_id not in room.player_votes:
-             cands = [u for u in room.players if u != bot_id]
-             if cands: room.player_votes[bot_id] = random.choice(cands)
-        if room.early_votes:
-            if bot_id not in room.votes_yes and bot_id not in room.votes_no:
-                if random.random() < 0.3: room.votes_yes.add(bot_id)
-                else: room.votes_no.add(bot_id)
\ No newline at end of file
+    await sender.send_many((pid for pid in room.players if pid != uid), txt, parse_mode="HTML")
+
+async def _find_user_room(user_id: int):
+    return await room_registry.find_user_room(user_id)
+
+async def _prune_user_states(now: float) -> int:
+    """Прибирає user_states гравців, яких уже немає в їхній кімнаті."""
+    stale = []
+    for uid, st in list(user_states.items()):
+        room = await room_registry.get(st.current_room)
+        if not room or uid not in room.players:
+            stale.append(uid)
+    for uid in stale:
+        user_states.pop(uid, None)
+    return len(stale)
+
+reaper.register("user_states", _prune_user_states)
+
+async def _bot_tick(token: str, bot_id: int):
+    room = await room_registry.get(token)
+    if not room or not room.game_started or bot_id not in room.players: return None
+    if room.voting_started and bot_id not in room.player_votes:
+         cands = [u for u in room.players if u != bot_id]
+         if cands: await room_registry.cast_vote(room, bot_id, random.choice(cands))
+    if room.early_votes:
+        if bot_id not in room.votes_yes and bot_id not in room.votes_no:
+            await room_registry.cast_early_vote(room, bot_id, random.random() < 0.3)
+    return time.time() + random.uniform(5, 15)
\ No newline at end of file
@@ -1,11 +1,13 @@
+import html
 import logging
 from aiogram import Router, types, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 
 from keyboards.keyboards import main_menu, get_admin_keyboard
-from database.crud import get_or_create_player, get_player_stats
+from database.crud import get_or_create_player
 from utils.helpers import maintenance_blocked, is_admin
+from utils.leaderboard import leaderboards, BOARDS
 from config import add_active_user
 
 router = Router()
@@ -40,37 +42,42 @@ async def back_to_main(message: types.Message, state: FSMContext):
     await state.clear()
     await message.answer("🏠 Головне меню", reply_markup=main_menu)
 
-@router.message(F.text == "📊 Моя Статистика")
-@router.message(Command("stats"))
-async def cmd_stats(message: types.Message):
+_BOARD_TITLES = {
+    "xp": "⭐ Топ за XP",
+    "spy": "🕵️ Топ шпигунів",
+    "week": "📅 Топ тижня (XP)",
+    "month": "🗓 Топ місяця (XP)",
+}
+_BOARD_ALIASES = {"тиждень": "week", "місяць": "month", "шпигун": "spy"}
+
+@router.message(Command("top"))
+async def cmd_top(message: types.Message, command: CommandObject):
     if maintenance_blocked(message.from_user.id):
-        await message.answer("🟠 Режим обслуговування. Спробуйте пізніше.")
         return
-    user = message.from_user
-    stats = await get_player_stats(user.id)
-    if not stats:
-        await get_or_create_player(user.id, user.username)
-        stats = {'games_played': 0, 'spy_wins': 0, 'civilian_wins': 0, 'total_xp': 0}
-    
-    games = stats.get('games_played', 0)
-    wins = stats.get('spy_wins', 0) + stats.get('civilian_wins', 0)
-    total_xp = stats.get('total_xp', 0)
-    
-    # Розрахунок рівня
-    level, current_xp, xp_for_next = stats.get('level_info', (1, 0, 20))
-    
-    await message.answer(
-        (
-            f"📊 <b>Ваша статистика:</b>\n\n"
-            f"⭐ Рівень: <b>{level}</b>\n"
-            f"📈 XP: {current_xp}/{xp_for_next}\n"
-            f"🎮 Ігор зіграно: {games}\n"
-            f"🏆 Перемог: {wins}\n"
-            f"🕵️ За шпигуна: {stats.get('spy_wins', 0)}\n"
-            f"👥 За мирного: {stats.get('civilian_wins', 0)}"
-        ),
-        parse_mode="HTML"
-    )
+    arg = (command.args or "xp").strip().lower()
+    board = _BOARD_ALIASES.get(arg, arg)
+    if board not in BOARDS:
+        await message.answer("❓ Доступні таблиці: /top xp, /top spy, /top week, /top month")
+        return
+
+    rows = await leaderboards.top(board)
+    lines = [f"<b>{_BOARD_TITLES[board]}</b>", ""]
+    for place, (uid, username, value) in enumerate(rows, start=1):
+        name = html.escape(f"@{username}" if username else f"Гравець {place}")
+        lines.append(f"{place}. {name} — <b>{value}</b>")
+    if not rows:
+        lines.append("Поки що порожньо.")
+
+    mine = await leaderboards.rank(board, message.from_user.id)
+    lines.append("")
+    if mine is None:
+        lines.append("Вас ще немає в цій таблиці.")
+    else:
+        place, value = mine
+        shown = f"{leaderboards.rank_limit}+" if place > leaderboards.rank_limit else str(place)
+        lines.append(f"📍 Ваше місце: <b>{shown}</b> ({value})")
+    lines.append("\nІнші: " + ", ".join(f"/top {b}" for b in BOARDS if b != board))
+    await message.answer("\n".join(lines), parse_mode="HTML")
 
 @router.message(F.text == "❓ Допомога")
 @router.message(Command("help"))
@@ -80,7 +87,8 @@ async def cmd_help(message: types.Message):
         "1. Гравці опиняються в одній локації (наприклад, Банк), але Шпигун не знає, де він.\n"
         "2. <b>Завдання мирних:</b> вичислити шпигуна, ставлячи питання один одному.\n"
         "3. <b>Завдання шпигуна:</b> зрозуміти, що це за локація, і не видати себе.\n\n"
-        "Ви можете створити власну кімнату і запросити друзів за кодом, або знайти випадкову гру."
+        "Ви можете створити власну кімнату і запросити друзів за кодом, або знайти випадкову гру.\n"
+        "🏆 Таблиці лідерів: /top"
     )
     await message.answer(text, parse_mode="HTML")
 
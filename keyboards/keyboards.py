@@ -1,7 +1,9 @@
-from typing import Dict, List
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from utils.callbacks import ADD_BOT, EARLY_NO, EARLY_YES, GUESS, LOCATION_INDEX, START_GAME, VOTE, encode
+
 # --- Reply Keyboards ---
 # Видаляємо зайві кнопки, залишаємо мінімум для зручності
 main_menu = ReplyKeyboardMarkup(
@@ -25,49 +27,121 @@ in_game_menu = ReplyKeyboardMarkup(
 
 # --- Inline Keyboards ---
 
-def get_in_lobby_keyboard(is_room_admin: bool, room_token: str, show_add_bot: bool = False) -> InlineKeyboardMarkup:
+class KeyboardCache:
+    """Готові inline-клавіатури по кімнатах.
+
+    Клавіатура будується один раз на ключ, а відправки лише посилаються на
+    готовий об'єкт. Для клавіатур, що залежать від стану кімнати (склад
+    гравців у голосуванні), get_versioned() тримає один запис на ключ і
+    перебудовує його, коли змінилась версія. Записи кімнати прибираються
+    через invalidate(token), коли кімнату видаляють, а кімнати, видалені
+    іншим воркером, - через prune() з прибиральника.
+    """
+
+    def __init__(self) -> None:
+        self._rooms: Dict[str, Dict[Hashable, Any]] = {}
+
+    def get(self, token: str, key: Hashable, build: Callable[[], Any]) -> Any:
+        room = self._rooms.get(token)
+        if room is None:
+            room = self._rooms[token] = {}
+        markup = room.get(key)
+        if markup is None:
+            markup = room[key] = build()
+        return markup
+
+    def get_versioned(self, token: str, key: Hashable, version: Hashable, build: Callable[[], Any]) -> Any:
+        room = self._rooms.get(token)
+        if room is None:
+            room = self._rooms[token] = {}
+        entry = room.get(key)
+        if entry is None or entry[0] != version:
+            entry = room[key] = (version, build())
+        return entry[1]
+
+    def invalidate(self, token: str) -> None:
+        self._rooms.pop(token, None)
+
+    def prune(self, live_tokens: Set[str]) -> int:
+        """Прибирає кімнати, яких уже немає. Повертає кількість прибраних."""
+        stale = [token for token in self._rooms if token not in live_tokens]
+        for token in stale:
+            del self._rooms[token]
+        return len(stale)
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+
+keyboard_cache = KeyboardCache()
+_EMPTY_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[])
+
+def _build_lobby_keyboard(is_room_admin: bool, room_token: str, show_add_bot: bool) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     if is_room_admin and room_token:
-        builder.button(text="🚀 Почати Гру", callback_data=f"start_game:{room_token}")
+        builder.button(text="🚀 Почати Гру", callback_data=encode(START_GAME, room_token))
         # Кнопка додавання бота - тільки якщо дозволено
         if show_add_bot:
-            builder.button(text="🤖 Додати Бота", callback_data=f"add_bot_btn:{room_token}")
+            builder.button(text="🤖 Додати Бота", callback_data=encode(ADD_BOT, room_token))
     builder.adjust(1)
     return builder.as_markup()
 
+def get_in_lobby_keyboard(is_room_admin: bool, room_token: str, show_add_bot: bool = False) -> InlineKeyboardMarkup:
+    if not (is_room_admin and room_token):
+        return _EMPTY_KEYBOARD
+    return keyboard_cache.get(room_token, ("lobby", show_add_bot), lambda: _build_lobby_keyboard(True, room_token, show_add_bot))
+
+def _build_voting_keyboards(room_token: str, roster: Tuple[Tuple[int, str], ...]) -> Dict[Optional[int], InlineKeyboardMarkup]:
+    """Клавіатури для всіх виборців одразу: кожному - усі, крім нього самого."""
+    buttons = [(pid, InlineKeyboardButton(text=f"👉 {name}", callback_data=encode(VOTE, room_token, pid))) for pid, name in roster]
+
+    def markup(exclude: Optional[int]) -> InlineKeyboardMarkup:
+        row = [button for pid, button in buttons if pid != exclude]
+        return InlineKeyboardMarkup(inline_keyboard=[row[i:i + 2] for i in range(0, len(row), 2)])
+
+    result: Dict[Optional[int], InlineKeyboardMarkup] = {pid: markup(pid) for pid, _ in roster}
+    result[None] = markup(None)  # для того, хто не в списку
+    return result
+
 def get_voting_keyboard(room_token: str, names_dict: Dict[int, str], voter_id: int) -> InlineKeyboardMarkup:
-    builder = InlineKeyboardBuilder()
-    for player_id, name in names_dict.items():
-        if player_id != voter_id:
-            builder.button(text=f"👉 {name}", callback_data=f"vote:{room_token}:{player_id}")
-    builder.adjust(2)
-    return builder.as_markup()
+    roster = tuple(names_dict.items())
+    keyboards = keyboard_cache.get_versioned(room_token, "vote", roster, lambda: _build_voting_keyboards(room_token, roster))
+    return keyboards.get(voter_id) or keyboards[None]
 
-def get_locations_keyboard(room_token: str, locations: List[str], columns: int = 3) -> InlineKeyboardMarkup:
+def _build_locations_keyboard(room_token: str, locations: Tuple[str, ...], columns: int) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
+    # У payload - індекс у LOCATIONS: кирилична назва займала до ~40 з 64 байт
     for location in locations:
-        builder.button(text=location, callback_data=f"guess:{room_token}:{location}")
+        builder.button(text=location, callback_data=encode(GUESS, room_token, LOCATION_INDEX[location]))
     builder.adjust(columns)
     return builder.as_markup()
 
-def get_early_vote_keyboard(room_token: str) -> InlineKeyboardMarkup:
+def get_locations_keyboard(room_token: str, locations: List[str], columns: int = 3) -> InlineKeyboardMarkup:
+    locations = tuple(locations)
+    return keyboard_cache.get(room_token, ("guess", locations, columns), lambda: _build_locations_keyboard(room_token, locations, columns))
+
+def _build_early_vote_keyboard(room_token: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    builder.button(text="✅ Так", callback_data=f"early_vote_yes:{room_token}")
-    builder.button(text="❌ Ні", callback_data=f"early_vote_no:{room_token}")
+    builder.button(text="✅ Так", callback_data=encode(EARLY_YES, room_token))
+    builder.button(text="❌ Ні", callback_data=encode(EARLY_NO, room_token))
     builder.adjust(2)
     return builder.as_markup()
 
+def get_early_vote_keyboard(room_token: str) -> InlineKeyboardMarkup:
+    return keyboard_cache.get(room_token, "early_vote", lambda: _build_early_vote_keyboard(room_token))
+
 def get_admin_keyboard() -> ReplyKeyboardMarkup:
     """Розширена адмінка"""
     return ReplyKeyboardMarkup(
         keyboard=[
             [KeyboardButton(text="/reset_me"), KeyboardButton(text="/peek")],
-            [KeyboardButton(text="/broadcast")],
+            [KeyboardButton(text="/broadcast"), KeyboardButton(text="/broadcast_cancel")],
             [KeyboardButton(text="/maintenance_on"), KeyboardButton(text="/maintenance_off")],
             [KeyboardButton(text="/ban"), KeyboardButton(text="/unban")],
             [KeyboardButton(text="/stats"), KeyboardButton(text="/whois")],
             [KeyboardButton(text="/get_db"), KeyboardButton(text="/get_logs")],
-            [KeyboardButton(text="/main_menu")]
+            [KeyboardButton(text="/profile"), KeyboardButton(text="/handler_stats")],
+            [KeyboardButton(text="/games"), KeyboardButton(text="/main_menu")]
         ],
         resize_keyboard=True
     )
\ No newline at end of file
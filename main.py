@@ -1,25 +1,56 @@
 import asyncio
 import logging
 import os
+import time
+from typing import Optional
 
 from bot import bot, dp
 from handlers import setup_handlers
 from config import USE_POLLING, RENDER_EXTERNAL_HOSTNAME, WEBHOOK_PATH
-from database.crud import init_db
-from utils.matchmaking import start_matchmaking_processor
+from database.crud import init_db, repair_player_levels
+from database.state_backend import state_backend
+from utils.snapshots import room_snapshots
+from handlers.game import claim_room_timers, start_room_leases
+from utils.broadcast import resume_broadcast_jobs
+from utils.bans import ban_index
+from utils.reaper import reaper
+from utils.game_log import game_log
+from utils.update_queue import update_queue
+from utils.update_codec import decode_update
 from middlewares.antispam import AntiSpamMiddleware
 from middlewares.ban import BanMiddleware
+from middlewares.timing import TimingMiddleware
+from middlewares.metrics import UpdateMetricsMiddleware, TelegramApiMetricsMiddleware
+from utils.metrics import metrics
 from aiohttp import web
-from aiogram.types import Update
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+# Посилання на фонову задачу, щоб її не зібрав GC до завершення
+_level_repair: Optional[asyncio.Task] = None
+
 async def on_startup(app):
+    global _level_repair
     await init_db()
+    _level_repair = asyncio.create_task(repair_player_levels())  # разовий прохід, не блокує старт
+    await state_backend.setup()
+    if not state_backend.durable:
+        await room_snapshots.restore()
+        room_snapshots.start()
+    await claim_room_timers(time.time())
+    start_room_leases()
+    reaper.start()
+    game_log.start()
+    await ban_index.load()
     setup_handlers(dp)
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    bot.session.middleware(TelegramApiMetricsMiddleware())
     dp.message.middleware(AntiSpamMiddleware())
     dp.message.middleware(BanMiddleware())
-    start_matchmaking_processor()
+    # Останнім, щоб міряти лише сам хендлер, без антиспаму і банів
+    dp.message.middleware(TimingMiddleware())
+    dp.callback_query.middleware(TimingMiddleware())
+    await resume_broadcast_jobs()
     
     # ВИДАЛЯЄМО КНОПКУ МЕНЮ (ТРИ СМУЖКИ)
     await bot.delete_my_commands()
@@ -28,32 +59,54 @@ async def on_startup(app):
         await bot.delete_webhook(drop_pending_updates=True)
         asyncio.create_task(dp.start_polling(bot))
     else:
+        update_queue.start(bot, dp)
         webhook_url = f"https://{RENDER_EXTERNAL_HOSTNAME}{WEBHOOK_PATH}"
         await bot.set_webhook(webhook_url)
 
+async def on_shutdown(app):
+    if _level_repair and not _level_repair.done():
+        _level_repair.cancel()
+    await update_queue.stop()
+    await game_log.stop()
+    if not state_backend.durable:
+        await room_snapshots.stop()
+
 async def handle_webhook(request):
+    # Лише перевіряємо і ставимо в чергу: обробка йде у воркерах, Telegram не чекає
     try:
-        data = await request.json()
-        update = Update.model_validate(data)
-        await dp.feed_update(bot, update)
-        return web.Response(text="ok")
-    except:
+        update = decode_update(await request.read(), bot)
+    except Exception:
         return web.Response(text="error", status=400)
+    if not await update_queue.put(update):
+        return web.Response(text="busy", status=503)  # Telegram повторить доставку
+    return web.Response(text="ok")
+
+async def queue_stats(request):
+    return web.json_response(update_queue.stats())
+
+async def metrics_handler(request):
+    body = (await metrics.render()).encode()
+    return web.Response(body=body, headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
 
 async def health_check(request):
     return web.Response(text="I am alive!")
 
-def main():
+def create_app() -> web.Application:
     app = web.Application()
     app.router.add_get("/", health_check)
     app.router.add_get("/health", health_check)
+    app.router.add_get("/metrics", metrics_handler)
     if not USE_POLLING:
         app.router.add_post(WEBHOOK_PATH, handle_webhook)
+        app.router.add_get("/stats/updates", queue_stats)
     
     app.on_startup.append(on_startup)
-    
+    app.on_shutdown.append(on_shutdown)
+    return app
+
+def main():
     port = int(os.getenv("PORT", 10000))
-    web.run_app(app, host="0.0.0.0", port=port)
+    web.run_app(create_app(), host="0.0.0.0", port=port)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,7 +1,6 @@
-import time
 from aiogram import BaseMiddleware
 from aiogram.types import Message
-from database.crud import get_player
+from utils.bans import ban_index, PERMANENT
 
 class BanMiddleware(BaseMiddleware):
     async def __call__(self, handler, event: Message, data):
@@ -9,12 +8,12 @@ class BanMiddleware(BaseMiddleware):
             return await handler(event, data)
         if not event.from_user:
             return await handler(event, data)
-        user_id = event.from_user.id
-        player = await get_player(user_id)
-        if player and getattr(player, 'banned_until', 0) and int(player.banned_until) > int(time.time()):
-            remaining = int(player.banned_until) - int(time.time())
+        # Лише словник у пам'яті - ніяких запитів до БД на кожне повідомлення
+        remaining = ban_index.remaining(event.from_user.id)
+        if remaining is not None:
+            text = "🚫 Ви заблоковані назавжди." if remaining == PERMANENT else f"🚫 Ви заблоковані. Залишилось: ~{remaining} сек."
             try:
-                await event.answer(f"🚫 Ви заблоковані. Залишилось: ~{remaining} сек.")
+                await event.answer(text)
             except Exception:
                 pass
             return  # drop event
@@ -0,0 +1,44 @@
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import Update
+
+from utils.metrics import metrics
+
+updates_total = metrics.counter("bot_updates_total", "Processed updates by type and outcome", ("type", "status"))
+update_latency = metrics.histogram("bot_update_handling_seconds", "Time to handle an update, middlewares included", ("type",))
+api_latency = metrics.histogram("telegram_api_request_seconds", "Telegram Bot API call latency", ("method",))
+api_errors = metrics.counter("telegram_api_errors_total", "Failed Telegram Bot API calls", ("method", "error"))
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer-middleware на dp.update: кількість і час обробки апдейтів за типом."""
+
+    async def __call__(self, handler, event: Update, data):
+        kind = event.event_type
+        status = "ok"
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            update_latency.observe(time.perf_counter() - start, kind)
+            updates_total.inc(kind, status)
+
+
+class TelegramApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сесії бота: латентність і помилки кожного методу Bot API."""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            api_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            api_latency.observe(time.perf_counter() - start, name)
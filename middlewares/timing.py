@@ -0,0 +1,46 @@
+import logging
+import time
+
+from aiogram import BaseMiddleware
+
+from config import SLOW_HANDLER_SECONDS, SLOW_HOLD_SECONDS, HANDLER_STATS_TOP_N
+from utils.callbacks import ACTION_NAMES
+from utils.metrics import metrics
+from utils.profiling import HoldTimer, HandlerStats
+
+logger = logging.getLogger(__name__)
+
+handler_stats = HandlerStats(HANDLER_STATS_TOP_N)
+_wall = metrics.histogram("bot_handler_seconds", "Handler wall time", ("handler",))
+_hold = metrics.histogram("bot_handler_loop_hold_seconds", "Time a handler held the event loop", ("handler",))
+
+
+class TimingMiddleware(BaseMiddleware):
+    """Час кожного хендлера: загальний і скільки він тримав event loop.
+
+    Реєструється як inner-middleware (dp.message / dp.callback_query), бо
+    лише там відомо, який хендлер пройшов фільтри (data["handler"]).
+    """
+
+    async def __call__(self, handler, event, data):
+        handler_obj = data.get("handler")
+        name = getattr(getattr(handler_obj, "callback", None), "__name__", type(event).__name__)
+        payload = data.get("payload")
+        if payload is not None:
+            # Усі ігрові кнопки йдуть через один диспетчер - розрізняємо за дією
+            name = f"{name}:{ACTION_NAMES.get(payload.action, payload.action)}"
+        timer = HoldTimer(handler(event, data))
+        failed = False
+        start = time.perf_counter()
+        try:
+            return await timer
+        except Exception:
+            failed = True
+            raise
+        finally:
+            wall = time.perf_counter() - start
+            handler_stats.record(name, wall, timer.hold, failed)
+            _wall.observe(wall, name)
+            _hold.observe(timer.hold, name)
+            if wall > SLOW_HANDLER_SECONDS or timer.hold > SLOW_HOLD_SECONDS:
+                logger.warning(f"Slow handler {name}: wall {wall * 1e3:.0f} ms, loop hold {timer.hold * 1e3:.1f} ms")
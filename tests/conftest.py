@@ -0,0 +1,27 @@
+"""Спільне для тестів: мінімальне оточення для config і запуск async-тестів без плагінів."""
+import asyncio
+import inspect
+import os
+
+import pytest
+
+os.environ.setdefault("BOT_TOKEN", "123456:test")
+os.environ.setdefault("ADMIN_ID", "1")
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    # Один цикл на всю сесію: пул asyncpg прив'язаний до циклу, в якому створений
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    loop = pyfuncitem._request.getfixturevalue("event_loop")
+    kwargs = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    loop.run_until_complete(pyfuncitem.obj(**kwargs))
+    return True
@@ -0,0 +1,52 @@
+"""Формат callback_data: кодування, розбір і кнопки старого формату."""
+import pytest
+
+from config import LOCATIONS
+from utils.callbacks import (
+    GameCallback, encode, decode, LOCATION_INDEX,
+    START_GAME, ADD_BOT, EARLY_YES, EARLY_NO, VOTE, GUESS
+)
+
+
+@pytest.mark.parametrize("action", [START_GAME, ADD_BOT, EARLY_YES, EARLY_NO])
+def test_round_trip_without_arg(action):
+    data = encode(action, "K3F9QZ")
+    assert data == f"{action}:K3F9QZ"
+    assert decode(data) == GameCallback(action, "K3F9QZ")
+
+
+def test_vote_carries_user_id():
+    data = encode(VOTE, "K3F9QZ", 123456789)
+    assert decode(data) == GameCallback(VOTE, "K3F9QZ", 123456789)
+    assert decode(encode(VOTE, "K3F9QZ", -1)).arg == -1  # бот
+
+
+def test_guess_carries_location_index():
+    last = len(LOCATIONS) - 1
+    assert decode(encode(GUESS, "K3F9QZ", last)) == GameCallback(GUESS, "K3F9QZ", last)
+    assert decode(encode(GUESS, "K3F9QZ", len(LOCATIONS))) is None
+    assert decode(encode(GUESS, "K3F9QZ", -1)) is None
+
+
+def test_payload_fits_telegram_limit():
+    longest = max(len(encode(VOTE, "K3F9QZ", -(2**63))), len(encode(GUESS, "K3F9QZ", len(LOCATIONS) - 1)))
+    assert longest <= 64
+
+
+def test_legacy_buttons_after_deploy():
+    # Кнопки, надіслані до оновлення, мають і далі працювати
+    location = LOCATIONS[0]
+    assert decode("start_game:K3F9QZ") == GameCallback(START_GAME, "K3F9QZ")
+    assert decode("add_bot_btn:K3F9QZ") == GameCallback(ADD_BOT, "K3F9QZ")
+    assert decode("early_vote_yes:K3F9QZ") == GameCallback(EARLY_YES, "K3F9QZ")
+    assert decode("early_vote_no:K3F9QZ") == GameCallback(EARLY_NO, "K3F9QZ")
+    assert decode("vote:K3F9QZ:42") == GameCallback(VOTE, "K3F9QZ", 42)
+    assert decode(f"guess:K3F9QZ:{location}") == GameCallback(GUESS, "K3F9QZ", LOCATION_INDEX[location])
+    assert decode("guess:K3F9QZ:Нема такої локації") is None
+
+
+@pytest.mark.parametrize("data", [
+    None, "", "find_match", "v:K3F9QZ", "v:K3F9QZ:abc", "s:K3F9QZ:1", "s", "g:K3F9QZ:1:2",
+])
+def test_foreign_or_broken_payload(data):
+    assert decode(data) is None
@@ -0,0 +1,43 @@
+"""Leaderboards.rank: рівні значення ділять місце в топі і поза ним."""
+import pytest
+
+from utils import leaderboard
+from utils.leaderboard import Leaderboards
+
+_TOP = [(1, "a", 50), (2, "b", 40), (3, "c", 40), (4, "d", 30)]
+
+
+@pytest.fixture
+def boards(monkeypatch):
+    calls = {"top": 0, "rank": []}
+
+    async def get_leaderboard(board, size, season):
+        calls["top"] += 1
+        return _TOP[:size]
+
+    async def get_leaderboard_rank(board, user_id, limit, season):
+        calls["rank"].append(user_id)
+        # (значення, скільки гравців мають строго більше), не більше limit
+        return {5: (40, 1), 6: (10, limit)}.get(user_id)
+
+    monkeypatch.setattr(leaderboard, "get_leaderboard", get_leaderboard)
+    monkeypatch.setattr(leaderboard, "get_leaderboard_rank", get_leaderboard_rank)
+    boards = Leaderboards(size=4, ttl=60, rank_limit=1000)
+    boards.calls = calls
+    return boards
+
+
+async def test_ties_share_rank_in_top(boards):
+    assert await boards.rank("xp", 1, now=0) == (1, 50)
+    assert await boards.rank("xp", 2, now=0) == (2, 40)
+    assert await boards.rank("xp", 3, now=0) == (2, 40)
+    assert await boards.rank("xp", 4, now=0) == (4, 30)
+    assert boards.calls == {"top": 1, "rank": []}
+
+
+async def test_rank_outside_top_matches_top(boards):
+    # Гравець поза кешованим топом з тим самим значенням, що й 2-3 місця
+    assert await boards.rank("xp", 5, now=0) == (2, 40)
+    assert await boards.rank("xp", 6, now=0) == (1001, 10)
+    assert await boards.rank("xp", 7, now=0) is None
+    assert boards.calls["rank"] == [5, 6, 7]
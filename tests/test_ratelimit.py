@@ -0,0 +1,51 @@
+"""SpamGuard і TokenBucket з явним часом: без циклу подій і без sleep."""
+from utils.ratelimit import SpamGuard, TokenBucket, ALLOW, BLOCK, COOLDOWN
+
+
+def test_spam_guard_blocks_then_cools_down():
+    guard = SpamGuard(rate=2, cooldown=10)
+    assert [guard.hit(1, now=0.0) for _ in range(2)] == [ALLOW, ALLOW]
+    assert guard.hit(1, now=0.0) == BLOCK
+    assert guard.hit(1, now=1.0) == COOLDOWN
+    assert guard.hit(2, now=1.0) == ALLOW  # інших не зачіпає
+
+
+def test_spam_guard_extends_cooldown_while_spamming():
+    guard = SpamGuard(rate=1, cooldown=10)
+    guard.hit(1, now=0.0)
+    assert guard.hit(1, now=0.0) == BLOCK
+    assert guard.hit(1, now=9.0) == COOLDOWN  # кулдаун тепер до 19
+    assert guard.sweep(now=12.0) is not None
+    assert guard.hit(1, now=12.0) == COOLDOWN
+
+
+def test_spam_guard_releases_and_forgets():
+    released = []
+    guard = SpamGuard(rate=1, cooldown=5, idle=30, on_release=released.append)
+    guard.hit(1, now=0.0)
+    assert guard.hit(1, now=0.0) == BLOCK
+    assert guard.sweep(now=4.0) == 1.0
+    assert released == []
+    guard.sweep(now=5.0)
+    assert released == [1]
+    assert guard.hit(1, now=6.0) == ALLOW
+    assert guard.sweep(now=36.0) is None
+    assert len(guard) == 0
+
+
+def test_spam_guard_refills_at_rate():
+    guard = SpamGuard(rate=2, cooldown=10)
+    assert [guard.hit(1, now=0.0) for _ in range(2)] == [ALLOW, ALLOW]
+    assert guard.hit(1, now=0.5) == ALLOW  # за півсекунди набігає один токен
+    assert guard.hit(1, now=0.5) == BLOCK
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, capacity=2)
+    t = bucket._updated
+    assert bucket.try_take(now=t)
+    assert bucket.reserve(now=t) == 0.0
+    assert not bucket.try_take(now=t)
+    assert abs(bucket.reserve(now=t) - 0.1) < 1e-9  # у борг
+    assert not bucket.is_full(now=t + 0.2)
+    assert bucket.is_full(now=t + 0.3)
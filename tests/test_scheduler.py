@@ -0,0 +1,88 @@
+"""Scheduler: порядок спрацювання, перезапуск, скасування і чистка heap."""
+import asyncio
+import time
+
+import pytest
+
+from utils.scheduler import Scheduler, _PURGE_MIN
+
+
+@pytest.fixture
+def scheduler(event_loop):
+    scheduler = Scheduler()
+    yield scheduler
+    if scheduler._task:
+        scheduler._task.cancel()
+        event_loop.run_until_complete(asyncio.gather(scheduler._task, return_exceptions=True))
+
+
+async def test_fires_in_deadline_order(scheduler):
+    fired = []
+
+    async def record(name):
+        fired.append(name)
+
+    now = time.time()
+    scheduler.schedule("b", now + 0.02, record, "b")
+    scheduler.schedule("a", now + 0.01, record, "a")
+    await asyncio.sleep(0.05)
+    assert fired == ["a", "b"]
+    assert len(scheduler) == 0
+
+
+async def test_callback_rearms_by_returning_deadline(scheduler):
+    ticks = []
+
+    async def tick():
+        ticks.append(time.time())
+        return time.time() + 0.01 if len(ticks) < 3 else None
+
+    scheduler.schedule("tick", time.time(), tick)
+    await asyncio.sleep(0.1)
+    assert len(ticks) == 3
+    assert scheduler.deadline("tick") is None
+
+
+async def test_schedule_replaces_and_cancel_group(scheduler):
+    fired = []
+
+    async def record(name):
+        fired.append(name)
+
+    now = time.time()
+    scheduler.schedule("x", now + 0.01, record, "old")
+    scheduler.schedule("x", now + 0.02, record, "new")
+    scheduler.schedule(("room", 1), now + 0.01, record, "r1", group="room")
+    scheduler.schedule(("room", 2), now + 0.01, record, "r2", group="room")
+    assert scheduler.cancel_group("room") == 2
+    await asyncio.sleep(0.05)
+    assert fired == ["new"]
+
+
+async def test_running_callbacks_are_referenced(scheduler):
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await release.wait()
+
+    scheduler.schedule("slow", time.time(), slow)
+    await started.wait()
+    assert len(scheduler._running) == 1
+    release.set()
+    await asyncio.sleep(0.01)
+    assert not scheduler._running
+
+
+async def test_cancelled_entries_are_purged(scheduler):
+    async def noop():
+        pass
+
+    later = time.time() + 3600
+    for i in range(_PURGE_MIN * 4):
+        scheduler.schedule(i, later, noop)
+    for i in range(_PURGE_MIN * 4 - 10):
+        scheduler.cancel(i)
+    assert len(scheduler) == 10
+    assert len(scheduler._heap) <= max(_PURGE_MIN, 2 * len(scheduler))
@@ -0,0 +1,231 @@
+"""Контракт StateBackend: ті самі сценарії для пам'яті і для PostgreSQL.
+
+Postgres-варіант запускається, лише якщо задано DB_HOST і база відповідає.
+Він очищає таблиці state_*, тож вказуйте окрему тестову базу (DB_NAME).
+"""
+import asyncio
+import os
+import time
+import uuid
+
+import pytest
+
+from database.models import Room
+from database.state_backend import (
+    MemoryStateBackend, PostgresStateBackend,
+    JOIN_OK, JOIN_MISSING, JOIN_FULL, JOIN_STARTED, JOIN_ALREADY
+)
+from utils.room_registry import RoomRegistry
+
+
+async def _postgres_backend():
+    import asyncpg
+    from database import crud
+
+    params = crud._connect_params()
+    try:
+        conn = await asyncpg.connect(**params, timeout=2)
+    except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+        pytest.skip(f"PostgreSQL at {params['host']} is not reachable: {e}")
+    await conn.close()
+    if crud.pool is None:
+        await crud.init_db()
+    backend = PostgresStateBackend()
+    await backend.setup()
+    async with crud.pool.acquire() as conn:
+        await conn.execute("TRUNCATE state_rooms, state_room_members, state_queue, state_fsm")
+    return backend
+
+
+@pytest.fixture(params=["memory", "postgres"])
+def backend(request, event_loop):
+    if request.param == "memory":
+        return MemoryStateBackend()
+    if not os.getenv("DB_HOST"):
+        pytest.skip("DB_HOST is not set")
+    return event_loop.run_until_complete(_postgres_backend())
+
+
+def _room(*players: int, **fields) -> Room:
+    fields.setdefault("last_activity", int(time.time()))
+    return Room(token=uuid.uuid4().hex[:8], admin_id=players[0], players={uid: f"P{uid}" for uid in players}, **fields)
+
+
+async def _created(backend, *players: int, **fields) -> Room:
+    room = _room(*players, **fields)
+    assert await backend.create_room(room)
+    return await backend.get_room(room.token)
+
+
+# --- Кімнати ---
+async def test_create_and_find(backend):
+    room = _room(1, 2, -1)
+    assert await backend.create_room(room)
+    assert not await backend.create_room(Room(token=room.token, admin_id=3))
+    found = await backend.find_user_room(2)
+    assert found.token == room.token and set(found.players) == {1, 2, -1}
+    assert await backend.find_user_room(-1) is None  # боти не індексуються
+    assert await backend.count_rooms() == 1
+    assert await backend.count_room_users() == 2
+
+
+async def test_join_room_results(backend):
+    room = await _created(backend, 1, 2)
+    assert await backend.join_room(room, 3, "P3", max_players=3) == JOIN_OK
+    assert set(room.players) == {1, 2, 3}
+    assert await backend.join_room(room, 3, "P3", max_players=4) == JOIN_ALREADY
+    assert await backend.join_room(room, 4, "P4", max_players=3) == JOIN_FULL
+
+    started = await _created(backend, 5, game_started=True)
+    assert await backend.join_room(started, 6, "P6", max_players=6) == JOIN_STARTED
+
+    gone = _room(7)
+    assert await backend.join_room(gone, 8, "P8", max_players=6) == JOIN_MISSING
+    assert (await backend.find_user_room(3)).token == room.token
+
+
+async def test_remove_and_delete(backend):
+    room = await _created(backend, 1, 2)
+    await backend.remove_player(room, 2)
+    assert set(room.players) == {1}
+    assert await backend.find_user_room(2) is None
+
+    deleted = await backend.delete_room(room.token)
+    assert deleted is not None and deleted.token == room.token
+    assert await backend.delete_room(room.token) is None
+    assert await backend.get_room(room.token) is None
+    assert await backend.find_user_room(1) is None
+
+
+async def test_save_keeps_concurrent_join(backend):
+    room = await _created(backend, 1, 2)
+    stale = await backend.get_room(room.token)
+    assert await backend.join_room(room, 3, "P3", max_players=6) == JOIN_OK
+    stale.location = "Airport"
+    await backend.save_room(stale)
+    fresh = await backend.get_room(room.token)
+    assert fresh.location == "Airport"
+    assert set(fresh.players) == {1, 2, 3}
+
+
+async def test_count_rooms_by_phase(backend):
+    await _created(backend, 1)
+    await _created(backend, 2, game_started=True)
+    await _created(backend, 3, game_started=True, voting_started=True)
+    await _created(backend, 4, game_started=True, voting_started=True, spy_guessed=True)
+    await _created(backend, 5, game_started=True)
+    assert await backend.count_rooms_by_phase() == {"lobby": 1, "playing": 2, "voting": 1, "guessing": 1}
+
+
+# --- Голоси ---
+async def test_votes(backend):
+    room = await _created(backend, 1, 2, 3)
+    await backend.cast_vote(room, 1, 2)
+    await backend.cast_vote(room, 3, 2)
+    await backend.cast_vote(room, 3, 1)  # переголосування замінює голос
+    assert (await backend.get_room(room.token)).player_votes == {1: 2, 3: 1}
+    await backend.reset_votes(room)
+    assert room.player_votes == {}
+    assert (await backend.get_room(room.token)).player_votes == {}
+
+
+async def test_early_votes(backend):
+    room = await _created(backend, 1, 2, 3)
+    await backend.cast_early_vote(room, 1, True)
+    await backend.cast_early_vote(room, 1, True)
+    await backend.cast_early_vote(room, 2, False)
+    fresh = await backend.get_room(room.token)
+    assert fresh.votes_yes == {1} and fresh.votes_no == {2}
+    await backend.reset_early_votes(room)
+    fresh = await backend.get_room(room.token)
+    assert fresh.votes_yes == set() and fresh.votes_no == set()
+
+
+# --- Завершення гри і оренда ---
+async def test_finish_game_once(backend):
+    room = await _created(backend, 1, 2, game_started=True)
+    other = await backend.get_room(room.token)
+    results = await asyncio.gather(backend.finish_game(room), backend.finish_game(other))
+    assert sorted(results) == [False, True]
+    assert not (await backend.get_room(room.token)).game_started
+    assert not await backend.finish_game(room)
+
+
+async def test_start_game_once(backend):
+    room = await _created(backend, 1, 2)
+    other = await backend.get_room(room.token)
+    room.location = "Airport"
+    assert await backend.start_game(room)
+    assert not await backend.start_game(other)
+    fresh = await backend.get_room(room.token)
+    assert fresh.game_started and fresh.location == "Airport"
+
+
+async def test_stale_save_keeps_finish(backend):
+    room = await _created(backend, 1, 2, game_started=True)
+    stale = await backend.get_room(room.token)
+    assert await backend.finish_game(room)
+    stale.voting_started = True
+    await backend.save_room(stale)
+    assert not (await backend.get_room(room.token)).game_started
+
+
+async def test_claim_rooms(backend):
+    now = time.time()
+    room = _room(1)
+    assert await backend.create_room(room, "a", int(now) + 60)
+    assert [r.token for r in await backend.claim_rooms("a", int(now) + 60, now)] == [room.token]
+    assert await backend.claim_rooms("b", int(now) + 60, now) == []
+    # Оренда "a" прострочена - кімнату забирає "b"
+    later = now + 120
+    assert [r.token for r in await backend.claim_rooms("b", int(later) + 60, later)] == [room.token]
+    assert await backend.claim_rooms("a", int(later) + 60, later) == []
+
+
+async def test_touch_is_visible(backend):
+    registry = RoomRegistry(backend)
+    room = await _created(backend, 1, last_activity=int(time.time()) - 600)
+    room = await registry.get(room.token)
+    await registry.touch(room)
+    assert (await registry.get(room.token)).last_activity >= int(time.time()) - 1
+
+
+# --- Черга ---
+async def test_queue(backend):
+    assert await backend.queue_push(1, 10, 100.0)
+    assert not await backend.queue_push(1, 11, 101.0)
+    assert await backend.queue_push(2, 20, 102.0)
+    assert await backend.queue_push(3, 30, 103.0)
+    assert await backend.queue_len() == 3
+    assert await backend.queue_head() == (1, 100.0, 10)
+    assert await backend.queue_contains(2)
+
+    assert await backend.queue_take(3, 4) == []
+    assert await backend.queue_remove(2)
+    assert not await backend.queue_remove(2)
+    assert await backend.queue_entries() == [(1, 100.0, 10), (3, 103.0, 30)]
+    assert await backend.queue_take(5, 2) == [1, 3]
+    assert await backend.queue_len() == 0
+
+
+# --- FSM ---
+async def test_fsm(backend):
+    assert await backend.fsm_get("k") == (None, {})
+    await backend.fsm_set_state("k", "PlayerState:in_room")
+    await backend.fsm_set_data("k", {"room": "abc"})
+    assert await backend.fsm_get("k") == ("PlayerState:in_room", {"room": "abc"})
+    await backend.fsm_set_state("k", None)
+    assert await backend.fsm_get("k") == (None, {"room": "abc"})
+    await backend.fsm_set_data("k", {})
+    assert await backend.fsm_get("k") == (None, {})
+
+
+async def test_fsm_drops_empty_rows(backend):
+    await backend.fsm_set_data("k", {"room": "abc"})
+    await backend.fsm_set_data("k", {})
+    if isinstance(backend, MemoryStateBackend):
+        assert "k" not in backend._fsm
+    else:
+        from database import crud
+        async with crud.pool.acquire() as conn:
+            assert await conn.fetchval("SELECT count(*) FROM state_fsm WHERE key = 'k'") == 0
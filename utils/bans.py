@@ -0,0 +1,109 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import BAN_REFRESH_INTERVAL
+from database.crud import get_banned_users
+
+logger = logging.getLogger(__name__)
+
+PERMANENT = -1  # banned_until = -1 у БД означає бан назавжди
+
+
+class BanIndex:
+    """Бани в пам'яті: перевірка в middleware без жодного запиту до БД.
+
+    Тимчасові бани лежать у heap за часом закінчення; одна фонова задача
+    спить до найближчого і прибирає прострочені. Бани і розбани з інших
+    воркерів підтягуються перечитуванням з БД раз на refresh_interval.
+    """
+
+    def __init__(self, refresh_interval: float) -> None:
+        self.refresh_interval = refresh_interval
+        self._until: Dict[int, int] = {}
+        self._heap: List[Tuple[int, int]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Зміни, зроблені під час перечитування: накладаються на прочитане
+        self._pending: Optional[List[Tuple[int, Optional[int]]]] = None
+
+    async def load(self) -> None:
+        await self.reload()
+        logger.info(f"Loaded {len(self._until)} active bans")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._expiry_loop())
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def reload(self) -> None:
+        self._pending = []
+        try:
+            rows = await get_banned_users(int(time.time()))
+        finally:
+            pending, self._pending = self._pending, None
+        self._until = {}
+        self._heap = []
+        for user_id, until in rows:
+            self.ban(user_id, until)
+        for user_id, until in pending:
+            if until is None:
+                self.unban(user_id)
+            else:
+                self.ban(user_id, until)
+        self._wakeup.set()
+
+    def ban(self, user_id: int, until: int) -> None:
+        if self._pending is not None:
+            self._pending.append((user_id, until))
+        self._until[user_id] = until
+        if until != PERMANENT:
+            if not self._heap or until < self._heap[0][0]:
+                self._wakeup.set()
+            heapq.heappush(self._heap, (until, user_id))
+
+    def unban(self, user_id: int) -> None:
+        # Запис у heap лишається і просто ігнорується, коли до нього дійде черга
+        if self._pending is not None:
+            self._pending.append((user_id, None))
+        self._until.pop(user_id, None)
+
+    def remaining(self, user_id: int) -> Optional[int]:
+        """None - не забанений, PERMANENT - назавжди, інакше секунд до кінця."""
+        until = self._until.get(user_id)
+        if until is None:
+            return None
+        if until == PERMANENT:
+            return PERMANENT
+        left = until - int(time.time())
+        return left if left > 0 else None
+
+    def __len__(self) -> int:
+        return len(self._until)
+
+    async def _expiry_loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = int(time.time())
+            while self._heap and self._heap[0][0] <= now:
+                until, user_id = heapq.heappop(self._heap)
+                if self._until.get(user_id) == until:
+                    del self._until[user_id]
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error(f"Ban index refresh failed: {e}")
+
+
+ban_index = BanIndex(BAN_REFRESH_INTERVAL)
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+from contextlib import suppress
+from typing import Any, Dict
+
+from aiogram.exceptions import TelegramBadRequest
+
+from bot import bot
+from config import BROADCAST_MSG_PER_SEC, BROADCAST_BATCH_SIZE, BROADCAST_LEASE_SECONDS, WORKER_ID
+from database.crud import (
+    iter_user_ids, claim_broadcast_jobs, save_broadcast_progress, renew_broadcast_lease, set_broadcast_status,
+    cancel_running_broadcasts
+)
+from utils.scheduler import scheduler
+from utils.sender import sender
+
+logger = logging.getLogger(__name__)
+
+# job_id -> задача, що зараз розсилає (лише розсилки, орендовані цим воркером)
+_jobs: Dict[int, asyncio.Task] = {}
+
+_TAKEOVER_TIMER = ("broadcast", "takeover")
+# Оренду продовжуємо втричі частіше, ніж вона спливає
+_RENEW_EVERY = BROADCAST_LEASE_SECONDS / 3
+
+
+def _lease_until() -> int:
+    return int(time.time()) + BROADCAST_LEASE_SECONDS
+
+
+def _progress_text(job: Dict[str, Any], done: bool = False) -> str:
+    sent, failed, total = job['sent'], job['failed'], job['total']
+    if done:
+        return f"✅ Розсилку #{job['id']} завершено. Отримали: {sent} (помилок: {failed})"
+    return f"🚀 Розсилка #{job['id']}: {sent + failed}/{total} (отримали: {sent})\nСкасувати: /broadcast_cancel"
+
+
+async def _update_status_message(job: Dict[str, Any], text: str) -> None:
+    if not job.get('admin_chat_id') or not job.get('status_message_id'):
+        return
+    with suppress(TelegramBadRequest, Exception):
+        await bot.edit_message_text(text=text, chat_id=job['admin_chat_id'], message_id=job['status_message_id'])
+
+
+async def _run_job(job: Dict[str, Any]) -> None:
+    """Розсилає по пачках з БД, зберігаючи курсор після кожної пачки.
+
+    Після рестарту продовжуємо з last_user_id, тож повтор можливий лише
+    для однієї незбереженої пачки. Збереження і продовження оренди (і
+    посеред довгої пачки) перевіряють, що розсилка досі наша і не скасована -
+    інакше зупиняємось.
+    """
+    job_id = job['id']
+    text = f"📢 <b>ОГОЛОШЕННЯ:</b>\n\n{job['text']}"
+    renew_at = time.monotonic() + _RENEW_EVERY
+    try:
+        async for batch in iter_user_ids(job['last_user_id'], BROADCAST_BATCH_SIZE):
+            for i in range(0, len(batch), BROADCAST_MSG_PER_SEC):
+                if time.monotonic() >= renew_at:
+                    if not await renew_broadcast_lease(job_id, WORKER_ID, _lease_until()):
+                        logger.info(f"Broadcast #{job_id} stopped: cancelled or taken over by another worker")
+                        return
+                    renew_at = time.monotonic() + _RENEW_EVERY
+                chunk = batch[i:i + BROADCAST_MSG_PER_SEC]
+                started = time.monotonic()
+                delivered = await sender.send_many(chunk, text, parse_mode="HTML")
+                job['sent'] += delivered
+                job['failed'] += len(chunk) - delivered
+                # Не більше BROADCAST_MSG_PER_SEC на секунду, решту ліміту лишаємо іграм
+                await asyncio.sleep(max(0.0, 1.0 - (time.monotonic() - started)))
+            job['last_user_id'] = batch[-1]
+            if not await _save(job):
+                logger.info(f"Broadcast #{job_id} stopped: cancelled or taken over by another worker")
+                return
+            renew_at = time.monotonic() + _RENEW_EVERY
+            await _update_status_message(job, _progress_text(job))
+        if await set_broadcast_status(job_id, 'done', WORKER_ID):
+            await _update_status_message(job, _progress_text(job, done=True))
+    except asyncio.CancelledError:
+        with suppress(Exception):
+            await _save(job)
+        raise
+    except Exception as e:
+        logger.error(f"Broadcast #{job_id} failed: {e}")
+    finally:
+        _jobs.pop(job_id, None)
+
+
+async def _save(job: Dict[str, Any]) -> bool:
+    return await save_broadcast_progress(
+        job['id'], WORKER_ID, _lease_until(), job['last_user_id'], job['sent'], job['failed']
+    )
+
+
+def start_broadcast_job(job: Dict[str, Any]) -> None:
+    if job['id'] in _jobs:
+        return
+    _jobs[job['id']] = asyncio.create_task(_run_job(job))
+
+
+async def resume_broadcast_jobs() -> int:
+    """Підхоплює незавершені розсилки без живої оренди: після рестарту або
+    покинуті іншим воркером. Кожну веде лише той воркер, що її орендував.
+
+    Далі повторюється власним таймером, поза прибиральником.
+    """
+    if scheduler.deadline(_TAKEOVER_TIMER) is None:
+        scheduler.schedule(_TAKEOVER_TIMER, time.time() + _RENEW_EVERY, _take_over_jobs)
+    resumed = 0
+    for job in await claim_broadcast_jobs(WORKER_ID, _lease_until()):
+        if job['id'] in _jobs:
+            continue  # уже розсилаємо; claim лише продовжив оренду
+        logger.info(f"Resuming broadcast #{job['id']} after user {job['last_user_id']}")
+        start_broadcast_job(job)
+        resumed += 1
+    return resumed
+
+
+async def cancel_broadcast_jobs() -> int:
+    """Скасовує всі активні розсилки. Повертає кількість скасованих.
+
+    Локальні задачі зупиняємо одразу, розсилки інших воркерів - на їхньому
+    наступному збереженні прогресу.
+    """
+    cancelled = await cancel_running_broadcasts()
+    for job_id in cancelled:
+        task = _jobs.pop(job_id, None)
+        if task:
+            task.cancel()
+    return len(cancelled)
+
+
+async def _take_over_jobs():
+    try:
+        await resume_broadcast_jobs()
+    except Exception as e:
+        logger.error(f"Broadcast takeover failed: {e}")
+    return time.time() + _RENEW_EVERY
@@ -0,0 +1,69 @@
+from typing import Dict, NamedTuple, Optional, Union
+
+from aiogram.filters import Filter
+from aiogram.types import CallbackQuery
+
+from config import LOCATIONS
+
+# Коди дій у callback_data: "<код>:<token>[:<число>]", напр. "v:K3F9QZ:123456789"
+START_GAME = "s"
+ADD_BOT = "b"
+EARLY_YES = "y"
+EARLY_NO = "n"
+VOTE = "v"  # число - user_id того, за кого голос (не індекс: склад може змінитись між показом і кліком)
+GUESS = "g"  # число - індекс у LOCATIONS
+
+ACTION_NAMES: Dict[str, str] = {
+    START_GAME: "start_game", ADD_BOT: "add_bot", EARLY_YES: "early_vote_yes",
+    EARLY_NO: "early_vote_no", VOTE: "vote", GUESS: "guess",
+}
+_WITH_ARG = {VOTE, GUESS}
+# Старий формат ("vote:TOKEN:ID", "guess:TOKEN:Назва", ...) - для кнопок, надісланих до оновлення
+_LEGACY = {
+    "start_game": START_GAME, "add_bot_btn": ADD_BOT, "early_vote_yes": EARLY_YES,
+    "early_vote_no": EARLY_NO, "vote": VOTE, "guess": GUESS,
+}
+LOCATION_INDEX = {name: i for i, name in enumerate(LOCATIONS)}
+
+
+class GameCallback(NamedTuple):
+    action: str
+    token: str
+    arg: Optional[int] = None
+
+
+def encode(action: str, token: str, arg: Optional[int] = None) -> str:
+    return f"{action}:{token}" if arg is None else f"{action}:{token}:{arg}"
+
+
+def decode(data: Optional[str]) -> Optional[GameCallback]:
+    """Розбирає callback_data за один split; None - чужий або зіпсований payload."""
+    if not data:
+        return None
+    parts = data.split(":")
+    action = parts[0]
+    if action not in ACTION_NAMES:
+        action = _LEGACY.get(action)
+        if action is None:
+            return None
+        if action == GUESS and len(parts) == 3:
+            parts[2] = str(LOCATION_INDEX.get(parts[2], -1))
+    if action in _WITH_ARG:
+        if len(parts) != 3:
+            return None
+        try:
+            arg = int(parts[2])
+        except ValueError:
+            return None
+        if action == GUESS and not 0 <= arg < len(LOCATIONS):
+            return None
+        return GameCallback(action, parts[1], arg)
+    return GameCallback(action, parts[1]) if len(parts) == 2 else None
+
+
+class GameCallbackFilter(Filter):
+    """Пропускає ігрові callback-и і передає хендлеру вже розібраний payload."""
+
+    async def __call__(self, callback: CallbackQuery) -> Union[bool, Dict[str, GameCallback]]:
+        payload = decode(callback.data)
+        return {"payload": payload} if payload else False
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from config import GAME_LOG_BATCH_SIZE, GAME_LOG_FLUSH_INTERVAL, GAME_LOG_MAX_BUFFER
+from database.crud import write_game_logs
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Рядок game_logs у порядку crud.GAME_LOG_COLUMNS
+GameLogRow = Tuple[str, str, int, List[int], str, int]
+
+
+class GameLogWriter:
+    """Буферизований запис історії ігор у game_logs.
+
+    end_game лише додає рядок у буфер; фонова задача пише накопичене одним
+    COPY, коли набралось batch_size рядків або минуло flush_interval секунд.
+    Якщо запис не вдався, рядки повертаються в буфер до наступної спроби
+    (не більше max_buffer - найстаріші відкидаються).
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_buffer: int) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: List[GameLogRow] = []
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.written = 0
+        self.dropped = 0
+
+    def add(self, room_token: str, location: str, spy_id: int, players: Iterable[int], winner: str,
+            timestamp: Optional[int] = None) -> None:
+        self._buffer.append((room_token, location, spy_id, list(players), winner, timestamp or int(time.time())))
+        self._trim()
+        if len(self._buffer) >= self.batch_size:
+            self._full.set()
+
+    def _trim(self) -> None:
+        excess = len(self._buffer) - self.max_buffer
+        if excess > 0:
+            del self._buffer[:excess]
+            self.dropped += excess
+            logger.warning(f"Game log buffer full, dropped {excess} oldest rows")
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Дає фоновій задачі дописати поточну пачку (не скасовує її посеред COPY) і пише решту."""
+        if self._task:
+            self._stopping = True
+            self._full.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _loop(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Game log flush failed, {len(self._buffer)} rows kept for retry: {e}")
+
+    async def flush(self) -> int:
+        """Пише весь буфер. Повертає кількість записаних рядків."""
+        async with self._lock:
+            if not self._buffer:
+                return 0
+            rows, self._buffer = self._buffer, []
+            try:
+                await write_game_logs(rows)
+            except BaseException:
+                # І при скасуванні посеред COPY: пачка лишається в буфері
+                self._buffer[:0] = rows
+                self._trim()
+                raise
+            self.written += len(rows)
+            return len(rows)
+
+
+game_log = GameLogWriter(GAME_LOG_BATCH_SIZE, GAME_LOG_FLUSH_INTERVAL, GAME_LOG_MAX_BUFFER)
+
+
+async def _collect_buffered():
+    return [((), len(game_log))]
+
+async def _collect_rows():
+    return [(("written",), game_log.written), (("dropped",), game_log.dropped)]
+
+metrics.gauge("game_log_buffered_rows", "Finished games waiting to be written to game_logs", collector=_collect_buffered)
+metrics.counter("game_log_rows_total", "game_logs rows by outcome", ("result",), collector=_collect_rows)
@@ -57,6 +57,9 @@ def compute_ban_until(duration_sec: int) -> int:
 
 
 def generate_room_token(length: int = 6) -> str:
-    """Генерує унікальний токен кімнати у форматі A-Z0-9."""
+    """Генерує випадковий токен кімнати у форматі A-Z0-9.
+
+    Унікальність серед живих кімнат перевіряє room_registry.create_room.
+    """
     alphabet = string.ascii_uppercase + string.digits
     return ''.join(random.choices(alphabet, k=length))
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import LEADERBOARD_SIZE, LEADERBOARD_TTL, LEADERBOARD_RANK_LIMIT
+from database.crud import get_leaderboard, get_leaderboard_rank
+from database.models import season_keys
+
+logger = logging.getLogger(__name__)
+
+BOARDS = ("xp", "spy", "week", "month")
+
+
+class Leaderboards:
+    """Топ N кожної таблиці лідерів у пам'яті процесу з коротким TTL.
+
+    Поки запис свіжий, /top не йде в БД зовсім; коли протух, його
+    перечитує один запит, навіть якщо /top надіслали кілька людей одночасно.
+    Ключ кешу містить сезон, тож на межі тижня/місяця топ просто
+    перечитується під новим ключем.
+    """
+
+    def __init__(self, size: int, ttl: float, rank_limit: int) -> None:
+        self.size = size
+        self.ttl = ttl
+        self.rank_limit = rank_limit
+        self._cache: Dict[str, Tuple[str, float, List[Tuple[int, str, int]]]] = {}
+        self._loading: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    @staticmethod
+    def season(board: str, now: float) -> str:
+        week, month = season_keys(now)
+        return {"week": week, "month": month}.get(board, "")
+
+    async def top(self, board: str, now: Optional[float] = None) -> List[Tuple[int, str, int]]:
+        """[(user_id, username, значення)] - не більше size рядків."""
+        now = time.time() if now is None else now
+        season = self.season(board, now)
+        cached = self._cache.get(board)
+        if cached and cached[0] == season and now - cached[1] < self.ttl:
+            return cached[2]
+        key = (board, season)
+        task = self._loading.get(key)
+        if task is None:
+            task = self._loading[key] = asyncio.create_task(self._load(board, season, now))
+            task.add_done_callback(lambda _: self._loading.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, board: str, season: str, now: float) -> List[Tuple[int, str, int]]:
+        rows = await get_leaderboard(board, self.size, season)
+        self._cache[board] = (season, now, rows)
+        return rows
+
+    async def rank(self, board: str, user_id: int, now: Optional[float] = None) -> Optional[Tuple[int, int]]:
+        """(місце, значення) гравця або None, якщо його на дошці немає.
+
+        Місце - 1 + скільки гравців мають строго більше значення, тож рівні
+        ділять місце (1, 2, 2, 4) однаково в топі і поза ним. Місце понад
+        rank_limit не уточнюється: повертається rank_limit + 1.
+        """
+        now = time.time() if now is None else now
+        rows = await self.top(board, now)
+        for uid, _, value in rows:
+            if uid == user_id:
+                return 1 + sum(1 for _, _, other in rows if other > value), value
+        found = await get_leaderboard_rank(board, user_id, self.rank_limit, self.season(board, now))
+        if found is None:
+            return None
+        value, ahead = found
+        return ahead + 1, value
+
+
+leaderboards = Leaderboards(LEADERBOARD_SIZE, LEADERBOARD_TTL, LEADERBOARD_RANK_LIMIT)
@@ -1,23 +1,26 @@
 import asyncio
 import time
 import logging
-from typing import List, Dict, Optional
-from contextlib import suppress
+from typing import Dict, List
 
 from aiogram.exceptions import TelegramBadRequest
 
 from bot import bot
-from config import matchmaking_queue, rooms
+from database.state_backend import state_backend
 from keyboards.keyboards import in_lobby_menu, main_menu, get_in_lobby_keyboard, in_queue_menu
-from utils.helpers import generate_room_token
-from database.models import Room
+from utils.room_registry import room_registry
+from utils.scheduler import scheduler
+from utils.sender import sender
+from utils.reaper import reaper
+from utils.metrics import metrics, WAIT_BUCKETS
 
 logger = logging.getLogger(__name__)
 
-# --- ВНУТРІШНІЙ СТАН ---
-_enqueued_at: Dict[int, float] = {}
-_queue_messages: Dict[int, int] = {}
-_processor_task: Optional[asyncio.Task] = None
+# Сама черга живе в state_backend (у пам'яті - OrderedDict у порядку приходу,
+# у Postgres - таблиця state_queue), тож її бачать усі воркери. Таймери
+# таймауту і неповної гри - у scheduler воркера, що прийняв гравця; якщо він
+# упав, їх підхоплює _take_over_queue будь-якого воркера: дедлайни
+# виводяться з enqueued_at, а зняття з черги атомарне.
 
 # НАЛАШТУВАННЯ
 MM_MIN = 3
@@ -25,34 +28,130 @@ MM_MAX = 6
 MM_TIMEOUT = 120 
 MM_WAIT_IF_NOT_FULL = 15
 
-async def enqueue_user(user_id: int, message_id: int) -> None:
-    """Додає гравця в чергу і МИТТЄВО оновлює всім лічильник."""
-    if user_id not in matchmaking_queue:
-        matchmaking_queue.append(user_id)
-        _enqueued_at[user_id] = time.time()
-        _queue_messages[user_id] = message_id
-        
-        # Миттєво оновлюємо всім статус, щоб не чекати циклу
-        await _update_queue_status()
-
-def dequeue_user(user_id: int) -> None:
-    """Прибирає гравця і оновлює лічильник іншим."""
-    if user_id in matchmaking_queue:
-        matchmaking_queue.remove(user_id)
-    _enqueued_at.pop(user_id, None)
-    _queue_messages.pop(user_id, None)
-    
-    # Запускаємо оновлення для тих, хто залишився (у фоні)
-    asyncio.create_task(_update_queue_status())
+MM_STATUS_DEBOUNCE = 0.5  # секунд: зміни черги за цей час дають одне оновлення статусу
+
+_FILL_TIMER = ("mm", "fill")
+_STATUS_TIMER = ("mm", "status")
+
+# Останній текст статусу, який бачить кожен гравець (щоб не редагувати без змін)
+_last_status: Dict[int, str] = {}
+# Чи змінилась черга з початку останнього оновлення статусу
+_status_pending = False
+queue_status_stats: Dict[str, int] = {"flushes": 0, "edits_sent": 0, "edits_skipped": 0, "edits_failed": 0}
 
-def is_in_queue(user_id: int) -> bool:
-    return user_id in matchmaking_queue
+async def _collect_queue_len():
+    return [((), await state_backend.queue_len())]
 
-async def _update_queue_status():
-    """Оновлює повідомлення ВСІМ гравцям у черзі."""
-    count = len(matchmaking_queue)
-    if count == 0: return
+metrics.gauge("matchmaking_queue_length", "Players waiting for a match", collector=_collect_queue_len)
+async def _collect_status_stats():
+    return [((name,), count) for name, count in queue_status_stats.items()]
 
+metrics.counter(
+    "matchmaking_status_updates_total", "Queue status flushes and message edits by outcome", ("event",),
+    collector=_collect_status_stats
+)
+_mm_wait = metrics.histogram("matchmaking_wait_seconds", "Time in queue before leaving it", ("outcome",), buckets=WAIT_BUCKETS)
+
+async def enqueue_user(user_id: int, message_id: int) -> None:
+    """Додає гравця в чергу; якщо набралась повна кімната - одразу створює її."""
+    now = time.time()
+    if not await state_backend.queue_push(user_id, message_id, now):
+        return
+    scheduler.schedule(("mm", "timeout", user_id), now + MM_TIMEOUT, _on_timeout, user_id, group="mm")
+
+    batches = await _take_full_batches()
+    await _arm_fill_timer()
+    if batches:
+        await asyncio.gather(*(_create_room_for_users(players) for players in batches))
+    _request_status_update()
+
+async def dequeue_user(user_id: int, outcome: str = "left") -> bool:
+    """Прибирає гравця і оновлює лічильник іншим. False, якщо його не було в черзі."""
+    if not await state_backend.queue_remove(user_id):
+        return False
+    _observe_wait(user_id, outcome)
+    _forget(user_id)
+    await _arm_fill_timer()
+    _request_status_update()
+    return True
+
+async def is_in_queue(user_id: int) -> bool:
+    return await state_backend.queue_contains(user_id)
+
+async def queue_size() -> int:
+    return await state_backend.queue_len()
+
+async def _prune_last_status(now: float) -> int:
+    """Прибирає статуси тих, кого вже немає в черзі (напр. забрав інший воркер)."""
+    stale = [uid for uid in list(_last_status) if not await state_backend.queue_contains(uid)]
+    for uid in stale:
+        _last_status.pop(uid, None)
+    return len(stale)
+
+async def _take_over_queue(now: float) -> int:
+    """Знімає гравців, чий таймаут мав спрацювати на іншому (можливо, мертвому) воркері."""
+    expired = 0
+    for uid, enqueued_at, _ in await state_backend.queue_entries():
+        if enqueued_at + MM_TIMEOUT <= now and await _expire(uid):
+            expired += 1
+    await _arm_fill_timer()
+    return expired
+
+def _forget(user_id: int) -> None:
+    scheduler.cancel(("mm", "timeout", user_id))
+    _last_status.pop(user_id, None)
+
+async def _take(count: int, min_count: int) -> List[int]:
+    """Атомарно забирає з голови черги до count гравців (якщо їх не менше min_count)."""
+    players = await state_backend.queue_take(count, min_count)
+    for uid in players:
+        _observe_wait(uid, "matched")
+        _forget(uid)
+    return players
+
+def _observe_wait(user_id: int, outcome: str) -> None:
+    # Час входу в чергу = дедлайн таймауту мінус MM_TIMEOUT
+    deadline = scheduler.deadline(("mm", "timeout", user_id))
+    if deadline is not None:
+        _mm_wait.observe(time.time() - (deadline - MM_TIMEOUT), outcome)
+
+async def _take_full_batches() -> List[List[int]]:
+    """Під час сплеску формує одразу стільки повних кімнат, скільки можна."""
+    batches = []
+    while True:
+        players = await _take(MM_MAX, MM_MAX)
+        if not players:
+            return batches
+        batches.append(players)
+
+async def _arm_fill_timer() -> None:
+    """Якщо є мінімум гравців - стартуємо неповну гру через MM_WAIT_IF_NOT_FULL від першого в черзі."""
+    first = await state_backend.queue_head()
+    if first and await state_backend.queue_len() >= MM_MIN:
+        _, enqueued_at, _ = first
+        scheduler.schedule(_FILL_TIMER, enqueued_at + MM_WAIT_IF_NOT_FULL, _on_fill_wait, group="mm")
+    else:
+        scheduler.cancel(_FILL_TIMER)
+
+async def _on_fill_wait():
+    # Якщо чекаємо вже довго - запускаємо тих хто є
+    players = await _take(MM_MAX, MM_MIN)
+    await _arm_fill_timer()
+    if players:
+        await _create_room_for_users(players)
+    return None
+
+async def _on_timeout(user_id: int):
+    await _expire(user_id)
+    return None
+
+async def _expire(user_id: int) -> bool:
+    if not await dequeue_user(user_id, "timeout"):
+        return False  # уже пішов, зіграв або його зняв інший воркер
+    await sender.send(user_id, "⏰ Час вийшов. Людей замало.", reply_markup=main_menu)
+    return True
+
+def _render_status(count: int) -> str:
     # Різний текст для атмосфери
     if count == 1:
         status = "⏳ Чекаємо інших гравців..."
@@ -61,91 +160,81 @@ async def _update_queue_status():
     else:
         status = "🚀 Скоро старт! Формуємо гру..."
 
-    text = (
+    return (
         f"🔍 <b>Пошук гри...</b>\n"
         f"👥 У черзі: <b>{count}/{MM_MAX}</b>\n"
         f"<i>{status}</i>"
     )
-    
-    for uid in list(matchmaking_queue):
-        msg_id = _queue_messages.get(uid)
-        if msg_id:
-            # Використовуємо suppress, щоб ігнорувати помилки "message not modified"
-            with suppress(TelegramBadRequest, Exception):
-                await bot.edit_message_text(
-                    text=text,
-                    chat_id=uid,
-                    message_id=msg_id,
-                    parse_mode="HTML",
-                    reply_markup=in_queue_menu # Важливо: лишаємо кнопку скасування
-                )
+
+def _request_status_update() -> None:
+    """Збирає зміни черги за MM_STATUS_DEBOUNCE і оновлює статус один раз.
+
+    Якщо оновлення саме йде, зміна не губиться: _flush_queue_status побачить
+    прапорець і перезапуститься ще раз.
+    """
+    global _status_pending
+    _status_pending = True
+    if scheduler.deadline(_STATUS_TIMER) is None:
+        scheduler.schedule(_STATUS_TIMER, time.time() + MM_STATUS_DEBOUNCE, _flush_queue_status, group="mm")
+
+async def _edit_status(uid: int, msg_id: int, text: str) -> None:
+    try:
+        await sender.call(uid, lambda: bot.edit_message_text(
+            text=text,
+            chat_id=uid,
+            message_id=msg_id,
+            parse_mode="HTML",
+            reply_markup=in_queue_menu # Важливо: лишаємо кнопку скасування
+        ))
+    except TelegramBadRequest as e:
+        # "message is not modified" означає, що в чаті вже цей текст
+        if "not modified" not in str(e):
+            queue_status_stats["edits_failed"] += 1
+            return
+    except Exception:
+        queue_status_stats["edits_failed"] += 1
+        return
+    queue_status_stats["edits_sent"] += 1
+    _last_status[uid] = text
+
+async def _flush_queue_status():
+    """Редагує статус лише тим, у кого текст справді змінився, і паралельно."""
+    global _status_pending
+    _status_pending = False
+    queue_status_stats["flushes"] += 1
+    entries = await state_backend.queue_entries()
+    if not entries: return _rearm_status()
+    text = _render_status(len(entries))
+    jobs = []
+    for uid, _, message_id in entries:
+        if not message_id or _last_status.get(uid) == text:
+            queue_status_stats["edits_skipped"] += 1
+            continue
+        jobs.append(_edit_status(uid, message_id, text))
+    if jobs:
+        await asyncio.gather(*jobs)
+    return _rearm_status()
+
+def _rearm_status():
+    # Черга змінилась, поки йшло оновлення - таймер перезапуститься на ще одне
+    return time.time() + MM_STATUS_DEBOUNCE if _status_pending else None
 
 async def _create_room_for_users(players: List[int]):
-    token = generate_room_token()
-    
-    room = Room(
-        token=token,
-        admin_id=players[0],
-        players={uid: f"Гравець-{uid}" for uid in players},
-        player_roles={}, player_votes={}, early_votes=set()
-    )
-    room.player_callsigns = {}
-    room.votes_yes = set()
-    room.votes_no = set()
-    rooms[token] = room
+    room = await room_registry.create_room(players[0], {uid: f"Гравець-{uid}" for uid in players})
+    token = room.token
     
+    # Гравців уже забрано з черги (_take), статус їм більше не оновлюємо
+    messages = []
     for uid in players:
-        # Важливо: видаляємо з черги БЕЗ виклику update_status (бо вони вже в грі)
-        if uid in matchmaking_queue: matchmaking_queue.remove(uid)
-        _enqueued_at.pop(uid, None)
-        _queue_messages.pop(uid, None)
-        
-        try:
-            is_adm = (uid == players[0])
-            await bot.send_message(
-                uid,
-                f"✅ <b>Гру знайдено!</b>\n🔑 Кімната: <code>{token}</code>\n👥 Гравців: {len(players)}",
-                parse_mode="HTML",
-                reply_markup=in_lobby_menu
-            )
-            await bot.send_message(uid, "Меню:", reply_markup=get_in_lobby_keyboard(is_adm, token))
-        except Exception as e:
-            logger.error(f"Notify error {uid}: {e}")
-
-async def _processor_loop() -> None:
-    while True:
-        try:
-            await asyncio.sleep(2)
-            now = time.time()
-            
-            # 1. Timeout check
-            for uid in list(matchmaking_queue):
-                start_time = _enqueued_at.get(uid, 0)
-                if now - start_time > MM_TIMEOUT:
-                    dequeue_user(uid)
-                    with suppress(Exception):
-                        await bot.send_message(uid, "⏰ Час вийшов. Людей замало.", reply_markup=main_menu)
-
-            # 2. Match logic
-            q_len = len(matchmaking_queue)
-            if q_len == 0: continue
-                
-            if q_len >= MM_MAX:
-                await _create_room_for_users(matchmaking_queue[:MM_MAX])
-                continue
-            
-            if q_len >= MM_MIN:
-                first_user = matchmaking_queue[0]
-                # Якщо чекаємо вже довго - запускаємо тих хто є
-                if now - _enqueued_at.get(first_user, now) > MM_WAIT_IF_NOT_FULL:
-                    await _create_room_for_users(matchmaking_queue[:])
-                    continue
-
-        except Exception as e:
-            logger.error(f"MM Loop: {e}")
-            await asyncio.sleep(5)
-
-def start_matchmaking_processor() -> None:
-    global _processor_task
-    if _processor_task and not _processor_task.done(): return
-    _processor_task = asyncio.create_task(_processor_loop())
\ No newline at end of file
+        is_adm = (uid == players[0])
+        messages.append((
+            uid,
+            f"✅ <b>Гру знайдено!</b>\n🔑 Кімната: <code>{token}</code>\n👥 Гравців: {len(players)}",
+            {"parse_mode": "HTML", "reply_markup": in_lobby_menu}
+        ))
+        messages.append((uid, "Меню:", {"reply_markup": get_in_lobby_keyboard(is_adm, token)}))
+    # У межах одного чату sender зберігає порядок, тож "Меню" прийде другим
+    await sender.send_each(messages)
+
+reaper.register("queue_status", _prune_last_status)
+reaper.register("queue_timeouts", _take_over_queue)
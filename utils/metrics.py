@@ -0,0 +1,151 @@
+import logging
+import math
+from bisect import bisect_left
+from typing import Awaitable, Callable, Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Стандартні межі для латентності, секунди
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Для очікування в черзі пошуку гри, секунди
+WAIT_BUCKETS = (1, 5, 10, 15, 30, 60, 90, 120, 300)
+
+Labels = Tuple[str, ...]
+# Колектор читає значення в момент запиту /metrics: повертає [(label_values, value)]
+Collector = Callable[[], Awaitable[Iterable[Tuple[Labels, float]]]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def _labelstr(self, values: Labels, extra: str = "") -> str:
+        parts = [f'{k}="{_escape(v)}"' for k, v in zip(self.labels, values)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+    async def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class _Simple(_Metric):
+    """Одне число на набір міток; замість збереження можна дати колектор."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), collector: Collector = None) -> None:
+        super().__init__(name, help, labels)
+        self._values: Dict[Labels, float] = {}
+        self.collector = collector
+
+    async def render(self) -> List[str]:
+        items = self._values.items()
+        if self.collector:
+            items = await self.collector()
+        return [f"{self.name}{self._labelstr(k)} {_fmt(v)}" for k, v in items]
+
+
+class Counter(_Simple):
+    """Лічильник, що лише зростає. Мітки передаються позиційно: inc("text")."""
+
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Simple):
+    type = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Гістограма з фіксованими межами: observe() - один bisect і два додавання."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [лічильники по межах (без кумуляції) + останній для +Inf, сума]
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    async def render(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in self._values.items():
+            acc = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                acc += count
+                le = 'le="' + _fmt(bound) + '"'
+                lines.append(f"{self.name}_bucket{self._labelstr(labels, le)} {acc}")
+            lines.append(f"{self.name}_sum{self._labelstr(labels)} {_fmt(total[0])}")
+            lines.append(f"{self.name}_count{self._labelstr(labels)} {acc}")
+        return lines
+
+
+class MetricsRegistry:
+    """Мінімальний реєстр метрик без prometheus_client.
+
+    Запис - це словник і кілька додавань у процесі, без блокувань (усе в
+    одному event loop); дорожчі значення (кімнати, пул БД) рахують колектори
+    лише коли Prometheus читає /metrics.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _add(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = (), collector: Collector = None) -> Counter:
+        return self._add(Counter(name, help, labels, collector))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (), collector: Collector = None) -> Gauge:
+        return self._add(Gauge(name, help, labels, collector))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    async def render(self) -> str:
+        """Текстовий формат Prometheus (version 0.0.4)."""
+        out = []
+        for metric in self._metrics.values():
+            try:
+                lines = await metric.render()
+            except Exception as e:
+                logger.warning(f"Metric {metric.name} failed to collect: {e}")
+                continue
+            out.extend(metric.header())
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,164 @@
+import asyncio
+import heapq
+import signal
+import time
+from collections import Counter
+from typing import Any, Coroutine, Dict, Generator, List, Tuple
+
+
+class HoldTimer:
+    """Обгортка корутини, що рахує, скільки часу вона реально тримала event loop.
+
+    Кожен крок корутини (від відновлення до наступного await, що віддає
+    керування циклу) міряється окремо; очікування мережі/БД сюди не входить.
+    """
+
+    __slots__ = ("coro", "hold")
+
+    def __init__(self, coro: Coroutine) -> None:
+        self.coro = coro
+        self.hold = 0.0
+
+    def __await__(self) -> Generator[Any, Any, Any]:
+        coro, clock = self.coro, time.perf_counter
+        value, error = None, None
+        while True:
+            start = clock()
+            try:
+                yielded = coro.send(value) if error is None else coro.throw(error)
+            except StopIteration as stop:
+                self.hold += clock() - start
+                return stop.value
+            except BaseException:
+                self.hold += clock() - start
+                raise
+            self.hold += clock() - start
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:  # напр. CancelledError - прокидаємо в корутину
+                value, error = None, e
+
+
+class _HandlerRow:
+    __slots__ = ("calls", "errors", "wall", "hold", "max_wall", "max_hold")
+
+    def __init__(self) -> None:
+        self.calls = self.errors = 0
+        self.wall = self.hold = self.max_wall = self.max_hold = 0.0
+
+
+class HandlerStats:
+    """Накопичені часи по хендлерах і N найповільніших окремих викликів."""
+
+    def __init__(self, top_n: int = 10) -> None:
+        self.top_n = top_n
+        self.rows: Dict[str, _HandlerRow] = {}
+        self._slowest: List[Tuple[float, float, str, float]] = []  # min-heap (wall, hold, name, when)
+        self.since = time.time()
+
+    def record(self, name: str, wall: float, hold: float, failed: bool = False) -> None:
+        row = self.rows.get(name)
+        if row is None:
+            row = self.rows[name] = _HandlerRow()
+        row.calls += 1
+        row.errors += failed
+        row.wall += wall
+        row.hold += hold
+        if wall > row.max_wall: row.max_wall = wall
+        if hold > row.max_hold: row.max_hold = hold
+        item = (wall, hold, name, time.time())
+        if len(self._slowest) < self.top_n:
+            heapq.heappush(self._slowest, item)
+        elif wall > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def reset(self) -> None:
+        self.rows.clear()
+        self._slowest.clear()
+        self.since = time.time()
+
+    def top(self, key: str = "hold") -> List[Tuple[str, _HandlerRow]]:
+        return sorted(self.rows.items(), key=lambda kv: getattr(kv[1], key), reverse=True)[:self.top_n]
+
+    def slowest(self) -> List[Tuple[float, float, str, float]]:
+        return sorted(self._slowest, reverse=True)
+
+    def render(self) -> str:
+        lines = [f"Since {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.since))}"]
+        for key, title in (("hold", "loop hold"), ("wall", "wall time")):
+            lines.append(f"\nTop {self.top_n} by total {title}:")
+            lines.append(f"{'handler':<28} {'calls':>6} {'err':>4} {'wall ms':>9} {'hold ms':>9} {'avg wall':>9} {'max wall':>9} {'max hold':>9}")
+            for name, r in self.top(key):
+                lines.append(
+                    f"{name[:28]:<28} {r.calls:>6} {r.errors:>4} {r.wall * 1e3:>9.0f} {r.hold * 1e3:>9.1f} "
+                    f"{r.wall / r.calls * 1e3:>9.1f} {r.max_wall * 1e3:>9.1f} {r.max_hold * 1e3:>9.1f}"
+                )
+        lines.append(f"\nSlowest {self.top_n} calls:")
+        for wall, hold, name, when in self.slowest():
+            lines.append(f"{time.strftime('%H:%M:%S', time.localtime(when))} {name[:28]:<28} wall {wall * 1e3:.1f} ms, hold {hold * 1e3:.1f} ms")
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """Семплюючий профайлер на SIGPROF: раз на `interval` секунд CPU-часу
+    обробник сигналу знімає стек головного потоку (того, де крутиться event loop).
+
+    Рахується лише час CPU, тож простій у select() не заважає бачити гарячі
+    місця. Результат - collapsed stacks ("a;b;c N") для speedscope або
+    flamegraph.pl, плюс коротка таблиця найгарячіших функцій.
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.running = False
+        self._stacks: Counter = Counter()
+        self._samples = 0
+
+    async def profile(self, seconds: float) -> Tuple[Counter, int]:
+        """Збирає семпли `seconds` секунд; викликати з головного потоку."""
+        if not hasattr(signal, "SIGPROF"):
+            raise RuntimeError("SIGPROF is not available on this platform")
+        if self.running:
+            raise RuntimeError("Profiler is already running")
+        self.running = True
+        self._stacks, self._samples = Counter(), 0
+        previous = signal.signal(signal.SIGPROF, self._on_signal)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, previous)
+            self.running = False
+        return self._stacks, self._samples
+
+    def _on_signal(self, signum, frame) -> None:
+        if frame is not None:
+            self._stacks[self._collapse(frame)] += 1
+            self._samples += 1
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({code.co_filename.rsplit('/', 2)[-1]}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+    @staticmethod
+    def report(stacks: Counter, samples: int, seconds: float, top: int = 30) -> str:
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, n in stacks.items():
+            funcs = stack.split(";")
+            own[funcs[-1]] += n
+            for func in set(funcs):
+                total[func] += n
+        lines = [f"# {samples} CPU samples in {seconds:.0f}s", "", f"# Top {top} by own samples:"]
+        lines += [f"# {n / samples:6.1%}  {func}" for func, n in own.most_common(top)] if samples else []
+        lines += ["", f"# Top {top} by inclusive samples:"]
+        lines += [f"# {n / samples:6.1%}  {func}" for func, n in total.most_common(top)] if samples else []
+        lines += ["", "# Collapsed stacks (speedscope / flamegraph.pl):"]
+        lines += [f"{stack} {n}" for stack, n in stacks.most_common()]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,167 @@
+import asyncio
+import heapq
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+
+class TokenBucket:
+    """Класичний token bucket: `rate` токенів за секунду, не більше `capacity`."""
+
+    __slots__ = ("rate", "capacity", "_tokens", "_updated")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, now: float = None) -> float:
+        """Забирає один токен (можна в борг) і повертає, скільки секунд чекати."""
+        self._refill(time.monotonic() if now is None else now)
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+    def try_take(self, now: float = None) -> bool:
+        """Забирає токен тільки якщо він є зараз."""
+        self._refill(time.monotonic() if now is None else now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def is_full(self, now: float = None) -> bool:
+        self._refill(time.monotonic() if now is None else now)
+        return self._tokens >= self.capacity
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# Результати SpamGuard.hit()
+ALLOW = 0
+BLOCK = 1  # щойно перевищив ліміт - треба попередити
+COOLDOWN = 2  # уже в кулдауні - мовчки відкидаємо
+
+
+class _SpamState:
+    __slots__ = ("tokens", "updated", "until")
+
+    def __init__(self, tokens: float, now: float) -> None:
+        self.tokens = tokens
+        self.updated = now
+        self.until = 0.0
+
+
+class SpamGuard:
+    """Антиспам: token bucket на користувача і один спільний прибиральник.
+
+    На користувача - три числа. Вхід у кулдаун кладе запис у heap; одна
+    фонова задача спить до найближчої події: кінця кулдауну (викликає
+    `on_release(user_id)`) або моменту, коли найдавніше активний користувач
+    простоїть `idle` секунд - тоді його стан видаляється. Користувачі лежать
+    в OrderedDict у порядку останньої активності, тож прибирання не
+    переглядає всіх. Пам'ять - лише на тих, хто писав за останні `idle` секунд.
+    """
+
+    def __init__(self, rate: float, cooldown: float, idle: float = 60.0, on_release=None) -> None:
+        self.rate = float(rate)
+        self.capacity = float(rate)
+        self.cooldown = cooldown
+        self.idle = max(idle, cooldown)
+        self.on_release = on_release
+        self._users: "OrderedDict[int, _SpamState]" = OrderedDict()
+        self._heap: List[Tuple[float, int]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def hit(self, user_id: int, now: float = None) -> int:
+        if now is None:
+            now = time.monotonic()
+        state = self._users.get(user_id)
+        if state is None:
+            self._users[user_id] = state = _SpamState(self.capacity, now)
+            if len(self._users) == 1:
+                self._wake()
+        else:
+            self._users.move_to_end(user_id)
+            if state.until:
+                if state.until > now:
+                    state.until = now + self.cooldown  # продовжуємо, поки спамить
+                    state.updated = now
+                    return COOLDOWN
+        tokens = state.tokens + (now - state.updated) * self.rate
+        state.updated = now
+        if tokens >= 1:
+            state.tokens = (tokens if tokens < self.capacity else self.capacity) - 1
+            return ALLOW
+        state.tokens = 0.0
+        state.until = now + self.cooldown
+        heapq.heappush(self._heap, (state.until, user_id))
+        if self._heap[0][1] == user_id:
+            self._wake()
+        return BLOCK
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def _wake(self) -> None:
+        if self._task is None or self._task.done():
+            try:
+                self._wakeup = asyncio.Event()
+                self._task = asyncio.get_running_loop().create_task(self._sweeper())
+            except RuntimeError:
+                pass  # немає циклу подій (напр. у бенчмарку) - прибирання вручну через sweep()
+        else:
+            self._wakeup.set()
+
+    def sweep(self, now: float = None) -> Optional[float]:
+        """Знімає кулдауни, що закінчились, і видаляє неактивних.
+
+        Повертає, через скільки секунд буде наступна подія (None - подій немає).
+        """
+        if now is None:
+            now = time.monotonic()
+        heap, users = self._heap, self._users
+        while heap and heap[0][0] <= now:
+            _, user_id = heapq.heappop(heap)
+            state = users.get(user_id)
+            if state is None or not state.until:
+                continue
+            if state.until > now:
+                heapq.heappush(heap, (state.until, user_id))  # кулдаун продовжили
+                continue
+            state.until = 0.0
+            if self.on_release:
+                self.on_release(user_id)
+        while users:
+            user_id, state = next(iter(users.items()))
+            if state.updated + self.idle > now:
+                break
+            del users[user_id]
+        events = []
+        if heap:
+            events.append(heap[0][0])
+        if users:
+            events.append(next(iter(users.values())).updated + self.idle)
+        return max(0.0, min(events) - now) if events else None
+
+    async def _sweeper(self) -> None:
+        while True:
+            self._wakeup.clear()
+            timeout = self.sweep()
+            if timeout is None:
+                self._task = None
+                return
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
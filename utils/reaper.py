@@ -0,0 +1,100 @@
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from config import ROOM_EXPIRY, REAP_INTERVAL, ACTIVE_USER_TTL, prune_active_users
+from database.models import Room
+from keyboards.keyboards import main_menu, keyboard_cache
+from utils.room_registry import room_registry
+from utils.metrics import metrics
+from utils.scheduler import scheduler
+from utils.sender import sender
+
+logger = logging.getLogger(__name__)
+
+# Джерело прибирання: отримує поточний time.time(), повертає кількість звільнених об'єктів
+Sweeper = Callable[[float], Awaitable[int]]
+
+_REAPER_TIMER = ("reaper",)
+
+
+def _idle_since(room: Room) -> float:
+    """Остання дія в кімнаті; запущена гра не простоює, поки не вийшов її час."""
+    if room.game_started:
+        return max(room.last_activity, room.end_time)
+    return room.last_activity
+
+
+class Reaper:
+    """Періодично прибирає неактивні кімнати і застарілі записи по користувачах.
+
+    Модулі з власними словниками реєструють свою функцію прибирання через
+    register(); один таймер у scheduler раз на REAP_INTERVAL проходить по
+    всіх і логує, скільки об'єктів повернув кожен.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._sweepers: List[Tuple[str, Sweeper]] = [
+            ("rooms", self._reap_rooms), ("active_users", self._reap_active_users), ("keyboards", self._reap_keyboards)
+        ]
+        self.last_report: Dict[str, int] = {}
+        self.totals: Dict[str, int] = {}
+
+    def register(self, name: str, sweeper: Sweeper) -> None:
+        self._sweepers.append((name, sweeper))
+
+    def start(self) -> None:
+        scheduler.schedule(_REAPER_TIMER, time.time() + self.interval, self.sweep)
+
+    async def sweep(self) -> float:
+        now = time.time()
+        report = {}
+        for name, sweeper in self._sweepers:
+            try:
+                report[name] = await sweeper(now)
+            except Exception as e:
+                logger.error(f"Reaper '{name}' failed: {e}")
+                report[name] = 0
+        for name, count in report.items():
+            self.totals[name] = self.totals.get(name, 0) + count
+        self.last_report = report
+        if any(report.values()):
+            logger.info("Reaped " + ", ".join(f"{name}={count}" for name, count in report.items()))
+        return now + self.interval
+
+    @staticmethod
+    async def _reap_rooms(now: float) -> int:
+        cutoff = now - ROOM_EXPIRY
+        reaped = 0
+        for room in await room_registry.list_rooms():
+            if _idle_since(room) >= cutoff:
+                continue
+            scheduler.cancel_group(room.token)
+            if await room_registry.delete_room(room.token) is None:
+                continue  # уже видалив хтось інший
+            reaped += 1
+            await sender.send_many(
+                (uid for uid in room.players if uid > 0),
+                f"⌛ Кімнату {room.token} закрито через неактивність.", reply_markup=main_menu
+            )
+        return reaped
+
+    @staticmethod
+    async def _reap_active_users(now: float) -> int:
+        return prune_active_users(now - ACTIVE_USER_TTL)
+
+    @staticmethod
+    async def _reap_keyboards(now: float) -> int:
+        # Кімнати, видалені іншим воркером, локальний кеш клавіатур не бачить
+        live = {room.token for room in await room_registry.list_rooms()}
+        return keyboard_cache.prune(live)
+
+
+reaper = Reaper(REAP_INTERVAL)
+
+
+async def _collect_reaped():
+    return [((name,), count) for name, count in reaper.totals.items()]
+
+metrics.counter("reaper_reclaimed_total", "Objects reclaimed by the idle reaper", ("source",), collector=_collect_reaped)
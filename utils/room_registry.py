@@ -0,0 +1,162 @@
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import ROOM_LEASE_SECONDS, WORKER_ID
+from database.models import Room
+from database.state_backend import PHASES, StateBackend, state_backend
+from keyboards.keyboards import keyboard_cache
+from utils.helpers import generate_room_token
+from utils.metrics import metrics
+
+# Не частіше ніж раз на стільки секунд пишемо в бекенд активність без зміни стану
+TOUCH_INTERVAL = 30
+
+
+class RoomRegistry:
+    """Реєстр кімнат поверх StateBackend.
+
+    Усі зміни складу кімнати і голосів мають іти через реєстр: бекенд тримає
+    індекс user_id -> token і виконує ці зміни атомарно. Інші поля кімнати
+    змінюються на об'єкті і зберігаються через save().
+    Реєстр також запам'ятовує, які кімнати змінились з останнього знімка,
+    і які кімнати орендує цей воркер (їхні таймери веде саме він).
+    """
+
+    def __init__(self, backend: StateBackend) -> None:
+        self.backend = backend
+        self._dirty: Set[str] = set()
+        self._owned: Set[str] = set()
+
+    def _touch(self, room: Room) -> None:
+        room.last_activity = int(time.time())
+        self._dirty.add(room.token)
+
+    async def touch(self, room: Room) -> None:
+        """Позначає активність у кімнаті без зміни стану (напр. повідомлення в чаті).
+
+        room.last_activity уже враховує останню зміну в бекенді, тож запис
+        іде раз на TOUCH_INTERVAL на кімнату, а не на кожне повідомлення.
+        """
+        now = int(time.time())
+        if now - room.last_activity >= TOUCH_INTERVAL:
+            await self.backend.touch_room(room.token, now)
+        room.last_activity = now
+        self._dirty.add(room.token)
+
+    def take_dirty(self) -> Set[str]:
+        """Забирає токени кімнат, змінених з попереднього виклику."""
+        dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def mark_dirty(self, tokens: Set[str]) -> None:
+        """Повертає токени, забрані take_dirty(), якщо їх не вдалося зберегти."""
+        self._dirty |= tokens
+
+    # --- Читання ---
+    async def get(self, token: str) -> Optional[Room]:
+        return await self.backend.get_room(token)
+
+    async def find_user_room(self, user_id: int) -> Tuple[Optional[str], Optional[Room]]:
+        """Повертає (token, room) кімнати гравця або (None, None)."""
+        room = await self.backend.find_user_room(user_id)
+        return (room.token, room) if room else (None, None)
+
+    async def list_rooms(self) -> List[Room]:
+        return await self.backend.list_rooms()
+
+    async def count(self) -> int:
+        return await self.backend.count_rooms()
+
+    async def count_by_phase(self) -> Dict[str, int]:
+        return await self.backend.count_rooms_by_phase()
+
+    async def user_count(self) -> int:
+        return await self.backend.count_room_users()
+
+    # --- Зміни ---
+    async def create_room(self, admin_id: int, players: Dict[int, str], length: int = 6) -> Room:
+        """Створює кімнату з токеном, якого ще немає серед кімнат."""
+        while True:
+            room = Room(
+                token=generate_room_token(length), admin_id=admin_id,
+                players=dict(players), last_activity=int(time.time())
+            )
+            if await self.backend.create_room(room, WORKER_ID, int(time.time()) + ROOM_LEASE_SECONDS):
+                self._dirty.add(room.token)
+                self._owned.add(room.token)
+                return room
+
+    async def restore(self, room: Room) -> bool:
+        """Повертає кімнату зі знімка; False, якщо такий токен уже зайнятий."""
+        return await self.backend.create_room(room)
+
+    async def claim(self, now: float) -> Tuple[List[Room], Set[str]]:
+        """Продовжує оренду своїх кімнат і підхоплює нічиї/покинуті.
+
+        Повертає (нові для цього воркера кімнати, токени кімнат, яких він більше не веде).
+        """
+        rooms = await self.backend.claim_rooms(WORKER_ID, int(now) + ROOM_LEASE_SECONDS, now)
+        owned = {room.token for room in rooms}
+        gained = [room for room in rooms if room.token not in self._owned]
+        lost = self._owned - owned
+        self._owned = owned
+        return gained, lost
+
+    async def save(self, room: Room) -> None:
+        self._touch(room)
+        await self.backend.save_room(room)
+
+    async def join(self, room: Room, user_id: int, name: str, max_players: int) -> str:
+        self._touch(room)
+        return await self.backend.join_room(room, user_id, name, max_players)
+
+    async def add_player(self, room: Room, user_id: int, name: str) -> None:
+        self._touch(room)
+        await self.backend.add_player(room, user_id, name)
+
+    async def remove_player(self, room: Room, user_id: int) -> None:
+        self._touch(room)
+        await self.backend.remove_player(room, user_id)
+
+    async def delete_room(self, token: str) -> Optional[Room]:
+        self._dirty.add(token)
+        self._owned.discard(token)
+        keyboard_cache.invalidate(token)
+        return await self.backend.delete_room(token)
+
+    async def cast_vote(self, room: Room, voter_id: int, target_id: int) -> None:
+        self._touch(room)
+        await self.backend.cast_vote(room, voter_id, target_id)
+
+    async def reset_votes(self, room: Room) -> None:
+        self._touch(room)
+        await self.backend.reset_votes(room)
+
+    async def cast_early_vote(self, room: Room, user_id: int, yes: bool) -> None:
+        self._touch(room)
+        await self.backend.cast_early_vote(room, user_id, yes)
+
+    async def reset_early_votes(self, room: Room) -> None:
+        self._touch(room)
+        await self.backend.reset_early_votes(room)
+
+    async def start_game(self, room: Room) -> bool:
+        """Атомарно запускає гру і зберігає кімнату. False, якщо гра вже йде."""
+        self._touch(room)
+        return await self.backend.start_game(room)
+
+    async def finish_game(self, room: Room) -> bool:
+        """True лише для одного з конкурентних викликів - він і підбиває підсумки гри."""
+        self._touch(room)
+        return await self.backend.finish_game(room)
+
+
+room_registry = RoomRegistry(state_backend)
+
+
+async def _collect_rooms():
+    # Лише лічильники з бекенду: scrape не читає самі кімнати
+    counts = await room_registry.count_by_phase()
+    return [((phase,), counts.get(phase, 0)) for phase in PHASES]
+
+metrics.gauge("rooms_active", "Rooms by game phase", ("phase",), collector=_collect_rooms)
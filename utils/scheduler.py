@@ -0,0 +1,151 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Колбек може повернути новий timestamp - тоді таймер перезапускається на цей час
+TimerCallback = Callable[..., Awaitable[Optional[float]]]
+
+# Heap чистимо від скасованих записів, лише коли він хоча б такого розміру
+_PURGE_MIN = 64
+
+
+class _Timer:
+    __slots__ = ("when", "seq", "callback", "args", "group", "cancelled")
+
+    def __init__(self, when: float, seq: int, callback: TimerCallback, args: tuple, group: Hashable) -> None:
+        self.when = when
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.group = group
+        self.cancelled = False
+
+
+class Scheduler:
+    """Один таймер-heap на всі дедлайни замість окремої задачі на кожен таймер.
+
+    Таймери адресуються ключем (напр. (token, "vote")) і можуть бути зібрані
+    в групу (напр. token кімнати), щоб скасувати всі разом. Час - time.time(),
+    тож дедлайни можна зберігати в кімнатах і відновлювати після рестарту.
+    Кожен колбек виконується окремою задачею, щоб повільний не тримав інші.
+    """
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._timers: Dict[Hashable, _Timer] = {}
+        self._groups: Dict[Hashable, Set[Hashable]] = {}
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Задачі колбеків, що зараз працюють: без посилання їх може зібрати GC
+        self._running: Set[asyncio.Task] = set()
+
+    # --- Публічне API ---
+    def schedule(self, key: Hashable, when: float, callback: TimerCallback, *args: Any, group: Hashable = None) -> None:
+        """Ставить (або переставляє) таймер `key` на момент `when`."""
+        self.cancel(key)
+        timer = _Timer(when, next(self._seq), callback, args, group)
+        self._timers[key] = timer
+        if group is not None:
+            self._groups.setdefault(group, set()).add(key)
+        self._push(key, timer)
+
+    def reschedule(self, key: Hashable, when: float) -> bool:
+        """Переносить існуючий таймер на інший час."""
+        timer = self._timers.get(key)
+        if timer is None or timer.cancelled:
+            return False
+        timer.when = when
+        timer.seq = next(self._seq)
+        self._push(key, timer)
+        return True
+
+    def cancel(self, key: Hashable) -> bool:
+        timer = self._timers.pop(key, None)
+        if timer is None:
+            return False
+        timer.cancelled = True
+        if timer.group is not None:
+            keys = self._groups.get(timer.group)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._groups[timer.group]
+        self._maybe_purge()
+        return True
+
+    def cancel_group(self, group: Hashable) -> int:
+        keys = list(self._groups.get(group, ()))
+        for key in keys:
+            self.cancel(key)
+        return len(keys)
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        timer = self._timers.get(key)
+        return timer.when if timer else None
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    # --- Внутрішнє ---
+    def _maybe_purge(self) -> None:
+        # Скасовані/перенесені записи лежать у heap до свого часу; коли їх більше,
+        # ніж живих таймерів, перебудовуємо heap лише з живих
+        if len(self._heap) < _PURGE_MIN or len(self._heap) <= 2 * len(self._timers):
+            return
+        self._heap = [(t.when, t.seq, key) for key, t in self._timers.items() if t.seq != -1]
+        heapq.heapify(self._heap)
+
+    def _push(self, key: Hashable, timer: _Timer) -> None:
+        # Старі записи в heap не видаляємо: вони відкидаються по seq при витягуванні
+        heapq.heappush(self._heap, (timer.when, timer.seq, key))
+        self._maybe_purge()
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        elif self._heap[0][1] == timer.seq:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, seq, key = heapq.heappop(self._heap)
+                timer = self._timers.get(key)
+                if timer is None or timer.seq != seq:
+                    continue  # скасований або перенесений
+                timer.seq = -1  # поки колбек працює, старих записів у heap для нього немає
+                task = asyncio.create_task(self._fire(key, timer))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, key: Hashable, timer: _Timer) -> None:
+        next_when = None
+        try:
+            next_when = await timer.callback(*timer.args)
+        except Exception as e:
+            logger.exception(f"Timer {key!r} failed: {e}")
+        if self._timers.get(key) is not timer or timer.cancelled:
+            return  # таймер скасували або замінили, поки працював колбек
+        if timer.seq != -1:
+            return  # колбек сам переставив таймер через reschedule()
+        if next_when is None:
+            self.cancel(key)
+        else:
+            timer.when = next_when
+            timer.seq = next(self._seq)
+            self._push(key, timer)
+
+
+scheduler = Scheduler()
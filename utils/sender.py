@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Tuple
+
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+
+from bot import bot
+from config import TG_GLOBAL_MSG_PER_SEC, TG_CHAT_MSG_PER_SEC, TG_CHAT_BURST, TG_SEND_RETRIES
+from utils.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class _ChatSlot:
+    __slots__ = ("lock", "bucket", "pending")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.bucket = TokenBucket(TG_CHAT_MSG_PER_SEC, TG_CHAT_BURST)
+        self.pending = 0
+
+
+class FanoutSender:
+    """Паралельна відправка в багато чатів з урахуванням лімітів Telegram.
+
+    - глобальний token bucket на весь бот;
+    - в кожен чат повідомлення йдуть строго по черзі (asyncio.Lock видає доступ FIFO);
+    - на RetryAfter ставимо на паузу всю відправку і повторюємо той самий виклик.
+    """
+
+    def __init__(self) -> None:
+        self._global = TokenBucket(TG_GLOBAL_MSG_PER_SEC, TG_GLOBAL_MSG_PER_SEC)
+        self._chats: Dict[int, _ChatSlot] = {}
+        self._paused_until = 0.0
+        self._prune_at = 1024
+
+    def _slot(self, chat_id: int) -> _ChatSlot:
+        slot = self._chats.get(chat_id)
+        if slot is None:
+            if len(self._chats) >= self._prune_at:
+                self._prune()
+            slot = self._chats[chat_id] = _ChatSlot()
+        return slot
+
+    def _prune(self) -> None:
+        """Прибирає чати без черги, чий bucket уже повністю відновився."""
+        now = time.monotonic()
+        for chat_id in [c for c, s in self._chats.items() if not s.pending and s.bucket.is_full(now)]:
+            del self._chats[chat_id]
+        self._prune_at = max(1024, len(self._chats) * 2)
+
+    async def _wait_turn(self, slot: _ChatSlot) -> None:
+        delay = max(slot.bucket.reserve(), self._global.reserve(), self._paused_until - time.monotonic())
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def call(self, chat_id: int, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Виконує довільний запит до API (send/edit/...) в черзі чату `chat_id`.
+
+        `factory` викликається заново на кожну спробу. Помилки API, крім RetryAfter,
+        прокидаються нагору.
+        """
+        slot = self._slot(chat_id)
+        slot.pending += 1
+        try:
+            async with slot.lock:
+                attempt = 0
+                while True:
+                    await self._wait_turn(slot)
+                    try:
+                        return await factory()
+                    except TelegramRetryAfter as e:
+                        attempt += 1
+                        self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                        logger.warning(f"RetryAfter {e.retry_after}s (chat {chat_id}, attempt {attempt})")
+                        if attempt > TG_SEND_RETRIES:
+                            raise
+        finally:
+            slot.pending -= 1
+
+    async def send(self, chat_id: int, text: str, **kwargs) -> bool:
+        """Надсилає одне повідомлення. Повертає False, якщо не вдалося."""
+        try:
+            await self.call(chat_id, lambda: bot.send_message(chat_id, text, **kwargs))
+            return True
+        except TelegramAPIError as e:
+            logger.debug(f"Send to {chat_id} failed: {e}")
+        except Exception as e:
+            logger.error(f"Send to {chat_id} failed: {e}")
+        return False
+
+    async def send_each(self, messages: Iterable[Tuple[int, str, Dict[str, Any]]]) -> int:
+        """Паралельно надсилає (chat_id, text, kwargs). Боти (ID <= 0) пропускаються.
+
+        Повертає кількість доставлених повідомлень.
+        """
+        jobs = [self.send(chat_id, text, **kwargs) for chat_id, text, kwargs in messages if chat_id > 0]
+        if not jobs:
+            return 0
+        return sum(await asyncio.gather(*jobs))
+
+    async def send_many(self, chat_ids: Iterable[int], text: str, **kwargs) -> int:
+        """Один і той самий текст для багатьох чатів."""
+        return await self.send_each((chat_id, text, kwargs) for chat_id in chat_ids)
+
+
+sender = FanoutSender()
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import ROOMS_SNAPSHOT_PATH, SAVE_INTERVAL, ROOM_EXPIRY, SNAPSHOT_COMPACT_MIN
+from database.models import Room
+from utils.room_registry import RoomRegistry, room_registry
+
+logger = logging.getLogger(__name__)
+
+# Запис журналу: (token, room.to_dict()) або (token, None), якщо кімнату видалено
+Record = Tuple[str, Optional[dict]]
+
+
+def _encode(records: List[Record]) -> str:
+    return "".join(
+        json.dumps({"t": token, "room": data}, ensure_ascii=False, separators=(",", ":")) + "\n"
+        for token, data in records
+    )
+
+
+class RoomSnapshotter:
+    """Інкрементальні знімки кімнат у JSON-lines журналі.
+
+    Раз на SAVE_INTERVAL у кінець файлу дописуються лише кімнати, змінені з
+    минулого знімка, і мітки видалених - вартість залежить від кількості змін,
+    а не від кількості кімнат. Коли журнал стає в кілька разів довшим за
+    кількість живих кімнат, його переписують начисто. JSON і запис на диск
+    виконуються в потоці, поза event loop.
+    """
+
+    def __init__(self, path: str, registry: RoomRegistry) -> None:
+        self.path = path
+        self.registry = registry
+        self._live: Set[str] = set()
+        self._lines = 0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Відновлення ---
+    async def restore(self) -> List[Room]:
+        """Читає журнал і повертає в реєстр кімнати, що ще не протухли."""
+        latest = await asyncio.to_thread(self._read)
+        cutoff = int(time.time()) - ROOM_EXPIRY
+        restored = []
+        for token, data in latest.items():
+            try:
+                room = Room.from_dict(data)
+            except Exception as e:
+                logger.warning(f"Skipping broken snapshot of room {token}: {e}")
+                continue
+            if room.last_activity < cutoff:
+                continue
+            if await self.registry.restore(room):
+                restored.append(room)
+        self.registry.take_dirty()
+        async with self._lock:
+            await self._compact()
+        logger.info(f"Restored {len(restored)} rooms from {self.path}")
+        return restored
+
+    def _read(self) -> Dict[str, dict]:
+        latest: Dict[str, dict] = {}
+        try:
+            f = open(self.path, encoding="utf-8")
+        except FileNotFoundError:
+            return latest
+        with f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    token, data = rec["t"], rec["room"]
+                except (ValueError, KeyError, TypeError):
+                    continue  # напр. обірваний останній рядок після падіння
+                if data is None:
+                    latest.pop(token, None)
+                else:
+                    latest[token] = data
+        return latest
+
+    # --- Запис ---
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(SAVE_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Room snapshot failed: {e}")
+
+    async def flush(self) -> int:
+        """Дописує в журнал змінені кімнати. Повертає кількість записів."""
+        async with self._lock:
+            dirty = self.registry.take_dirty()
+            if not dirty:
+                return 0
+            try:
+                records: List[Record] = []
+                live = set(self._live)
+                for token in dirty:
+                    room = await self.registry.get(token)
+                    if room:
+                        live.add(token)
+                        records.append((token, room.to_dict()))
+                    elif token in live:
+                        live.discard(token)
+                        records.append((token, None))
+                if self._lines + len(records) > max(SNAPSHOT_COMPACT_MIN, 4 * len(live)):
+                    await self._compact()
+                elif records:
+                    await asyncio.to_thread(self._append, records)
+                    self._live = live
+                    self._lines += len(records)
+            except BaseException:
+                # Запис не вдався - ці кімнати підуть у наступний знімок
+                self.registry.mark_dirty(dirty)
+                raise
+            return len(records)
+
+    async def _compact(self) -> None:
+        # to_dict() робить копії, тож далі з ними можна працювати в потоці
+        records = [(room.token, room.to_dict()) for room in await self.registry.list_rooms()]
+        await asyncio.to_thread(self._rewrite, records)
+        self._live = {token for token, _ in records}
+        self._lines = len(records)
+
+    def _append(self, records: List[Record]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(_encode(records))
+
+    def _rewrite(self, records: List[Record]) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(_encode(records))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+room_snapshots = RoomSnapshotter(ROOMS_SNAPSHOT_PATH, room_registry)
@@ -0,0 +1,19 @@
+from aiogram import Bot
+from aiogram.types import Update
+
+try:
+    import orjson
+except ImportError:  # orjson необов'язковий, без нього працює вбудований парсер pydantic
+    orjson = None
+
+
+def decode_update(raw: bytes, bot: Bot) -> Update:
+    """Розбирає тіло вебхука в Update, одразу прив'язаний до `bot`.
+
+    З context={"bot": bot} dp.feed_update не мусить пересоздавати апдейт
+    через model_dump() + model_validate(), щоб працювали message.answer() тощо.
+    Без orjson JSON розбирає pydantic-core, минаючи проміжний dict зі stdlib json.
+    """
+    if orjson:
+        return Update.model_validate(orjson.loads(raw), context={"bot": bot})
+    return Update.model_validate_json(raw, context={"bot": bot})
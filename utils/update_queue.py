@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from config import WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, WEBHOOK_ENQUEUE_TIMEOUT
+from utils.metrics import metrics
+
+_queue_wait = metrics.histogram("webhook_queue_wait_seconds", "Time an update waits in the queue before a worker takes it")
+
+logger = logging.getLogger(__name__)
+
+
+def _chat_key(update: Update) -> int:
+    """Ключ черговості: користувач, інакше чат, інакше сам апдейт."""
+    try:
+        event = update.event
+    except Exception:
+        return update.update_id
+    user = getattr(event, "from_user", None)
+    if user:
+        return user.id
+    chat = getattr(event, "chat", None)
+    return chat.id if chat else update.update_id
+
+
+class UpdateQueue:
+    """Черга вхідних апдейтів вебхука з пулом воркерів.
+
+    Вебхук лише кладе апдейт у чергу і одразу відповідає Telegram.
+    Черга поділена на шарди за ключем користувача: кожен шард обробляє
+    один воркер, тож апдейти одного користувача йдуть строго по порядку,
+    а різні користувачі - паралельно. Коли шард заповнений, put() чекає
+    місця до `timeout` і повертає False - вебхук відповідає 503, і
+    Telegram повторить доставку пізніше.
+    """
+
+    def __init__(self, workers: int, max_size: int, timeout: float) -> None:
+        self.workers = max(1, workers)
+        self.shard_size = max(1, max_size // self.workers)
+        self.timeout = timeout
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._bot: Optional[Bot] = None
+        self._dp: Optional[Dispatcher] = None
+        # Метрики
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def start(self, bot: Bot, dp: Dispatcher) -> None:
+        if self._tasks:
+            return
+        self._bot, self._dp = bot, dp
+        self._queues = [asyncio.Queue(self.shard_size) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._worker(q)) for q in self._queues]
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Дає воркерам дообробити чергу (не довше `timeout`) і зупиняє їх."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self.depth()} queued updates on shutdown")
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def put(self, update: Update) -> bool:
+        queue = self._queues[_chat_key(update) % self.workers]
+        item: Tuple[float, Update] = (time.monotonic(), update)
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(queue.put(item), self.timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+        self.accepted += 1
+        return True
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self) -> Dict[str, Any]:
+        done = self.processed + self.failed
+        return {
+            "workers": self.workers,
+            "depth": self.depth(),
+            "max_shard_depth": max((q.qsize() for q in self._queues), default=0),
+            "capacity": self.shard_size * self.workers,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "wait_avg_ms": round(self.wait_total / done * 1000, 2) if done else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 2),
+        }
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            enqueued_at, update = await queue.get()
+            wait = time.monotonic() - enqueued_at
+            _queue_wait.observe(wait)
+            self.wait_total += wait
+            if wait > self.wait_max:
+                self.wait_max = wait
+            try:
+                await self._dp.feed_update(self._bot, update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.exception(f"Update {update.update_id} failed: {e}")
+            finally:
+                queue.task_done()
+
+
+update_queue = UpdateQueue(WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, WEBHOOK_ENQUEUE_TIMEOUT)
+
+
+async def _collect_depth():
+    return [((), update_queue.depth())]
+
+async def _collect_results():
+    q = update_queue
+    return [(("accepted",), q.accepted), (("rejected",), q.rejected), (("processed",), q.processed), (("failed",), q.failed)]
+
+metrics.gauge("webhook_queue_depth", "Updates waiting for a worker", collector=_collect_depth)
+metrics.counter("webhook_updates_total", "Webhook updates by queue outcome", ("result",), collector=_collect_results)